@@ -0,0 +1,198 @@
+# Пакетный рендер сцен без окна: python batch.py scenes.jsonl [-j N] [--report report.jsonl]
+#
+# Каждая строка JSONL — сцена:
+#   {"size": [w, h], "bg": [r, g, b], "out": "out/0001.png", "ops": [...]}
+# Операции — те же, что в интерфейсе (цвета — [r, g, b], точки — [x, y]):
+#   {"op": "bresenham", "points": [[x, y], ...], "color": c, "closed": false}
+#   {"op": "wu",        "points": [[x, y], ...], "color": c, "closed": false}
+#   {"op": "triangle",  "points": [A, B, C], "colors": [cA, cB, cC]}
+#   {"op": "fill",      "seed": [x, y], "color": c, "tolerance": 0, "metric": "channel", "antialias": false}
+#   {"op": "fill_img",  "seed": [x, y], "pattern": "pattern.png", "mode": "tile", "anchor": "center",
+#                       "tolerance": 0, "metric": "channel", "antialias": false}
+#   {"op": "boundary",  "seed": [x, y], "color": c, "mode": "fill" | "trace" | "rings", "count": 1, "step": 1}
+#   {"op": "mesh",      "path": "model.obj"}
+#   {"op": "clear"}
+#   {"op": "save",      "path": "step.png"}
+# Сцены распределяются по пулу процессов; ошибка в сцене не роняет остальные.
+import os, sys, json, time, argparse, traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from raster import (
+    BG, BORDER_COLOR, BORDER_COLORS, Canvas, RingCache,
+    bresenham_polyline, wu_polyline, fill_triangle_barycentric,
+    scanline_fill_color, scanline_fill_pattern, pattern_pixels, pattern_anchor, checker_pattern,
+    inner_contour_from_inside, trace_contour, draw_points,
+    load_mesh, fit_mesh, render_mesh,
+)
+from saver import save_array
+
+_patterns = {}   # кэш рисунков процесса: путь -> массив (ph, pw, 3)
+
+def load_pattern(path):
+    if path is None:
+        return checker_pattern()
+    if path not in _patterns:
+        import pygame   # только для чтения картинки
+        _patterns[path] = pattern_pixels(pygame.image.load(path))
+    return _patterns[path]
+
+def _color(c):
+    return tuple(int(v) for v in c[:3])
+
+def apply_op(cv, op, rings, bg):
+    kind = op["op"]
+    if kind in ("bresenham", "wu"):
+        draw = bresenham_polyline if kind == "bresenham" else wu_polyline
+        draw(cv, op["points"], _color(op.get("color", (0, 0, 0))), op.get("closed", False))
+    elif kind == "triangle":
+        A, B, C = (tuple(map(int, p)) for p in op["points"])
+        cols = op.get("colors", [(255, 0, 0), (0, 255, 0), (0, 128, 255)])
+        fill_triangle_barycentric(cv, A, B, C, *(_color(c) for c in cols))
+    elif kind == "fill":
+        x, y = op["seed"]
+        if not cv.in_bounds(x, y):   # затравка мимо холста — заливки нет (cv.get упал бы)
+            return
+        with cv:
+            target = cv.get(x, y)
+        scanline_fill_color(cv, (x, y), target, _color(op["color"]),
+                            op.get("tolerance", 0), op.get("metric", "channel"), op.get("antialias", False))
+    elif kind == "fill_img":
+        x, y = op["seed"]
+        if not cv.in_bounds(x, y):
+            return
+        pat = load_pattern(op.get("pattern"))
+        mode = op.get("mode", "tile")
+        anchor = pattern_anchor((x, y), (pat.shape[1], pat.shape[0]), mode, op.get("anchor", "center"))
+        with cv:
+            target = cv.get(x, y)
+        scanline_fill_pattern(cv, (x, y), target, pat, anchor, tiled=mode != "stamp",
+                              tolerance=op.get("tolerance", 0), metric=op.get("metric", "channel"),
+                              antialias=op.get("antialias", False))
+    elif kind == "boundary":
+        seed, color = tuple(op["seed"]), _color(op["color"])
+        mode = op.get("mode", "fill")
+        if mode == "rings":
+            rings.peel(cv, seed, color, op.get("count", 1), op.get("step", 1))
+        else:
+            pts = trace_contour(cv, seed) if mode == "trace" else inner_contour_from_inside(cv, seed)
+            draw_points(cv, pts, color)
+            if color != bg:
+                BORDER_COLORS.add(color)
+    elif kind == "mesh":
+        verts, colors, faces = load_mesh(op["path"])
+        render_mesh(cv, fit_mesh(verts, cv.w, cv.h), colors, faces, workers=op.get("workers", 1))
+    elif kind == "clear":
+        with cv:
+            cv.will_write(0, 0, cv.w - 1, cv.h - 1)
+            cv.px[...] = bg
+            cv.touch(0, 0, cv.w - 1, cv.h - 1)
+        rings.reset()
+    elif kind == "save":
+        save_array(cv.arr, op["path"])
+    else:
+        raise ValueError(f"unknown op: {kind!r}")
+
+def render_scene(scene):
+    """Отрисовать сцену на холсте-массиве; -> (h, w, 3) uint8."""
+    w, h = scene.get("size", (1000, 600))
+    bg = _color(scene.get("bg", BG))
+    cv = Canvas.blank(w, h, bg)
+    # состояние инструмента «Граница» — своё у каждой сцены
+    BORDER_COLORS.clear()
+    BORDER_COLORS.update(_color(c) for c in scene.get("border_colors", [BORDER_COLOR]))
+    rings = RingCache()
+    for op in scene.get("ops", []):
+        apply_op(cv, op, rings, bg)
+    return cv.arr
+
+def run_job(job):
+    """Задача пула: одна сцена. Исключения не выпускаются — возвращаются в отчёте."""
+    index, scene = job
+    t0 = time.perf_counter()
+    rep = {"index": index, "out": scene.get("out"), "ops": len(scene.get("ops", [])), "ok": True}
+    try:
+        arr = render_scene(scene)
+        if scene.get("out"):
+            save_array(arr, scene["out"])
+    except Exception as e:
+        rep.update(ok=False, error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+    rep["seconds"] = time.perf_counter() - t0
+    return rep
+
+def read_scenes(path, out_dir=None):
+    scenes = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            scene = json.loads(line)
+            scene.setdefault("out", f"scene_{n:05d}.png")
+            if out_dir and scene["out"] and not os.path.isabs(scene["out"]):
+                scene["out"] = os.path.join(out_dir, scene["out"])
+            scenes.append((n, scene))
+    return scenes
+
+def run_batch(scenes, jobs=None, report=None, verbose=True):
+    """
+    Отрисовать сцены в пуле из jobs процессов (None — по числу ядер, 1 и меньше — в текущем).
+    -> список отчётов по сценам.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = max(jobs, 1)   # -j 0 — в текущем процессе, а не «все ядра»
+    t0 = time.perf_counter()
+    results = []
+
+    def done(rep):
+        results.append(rep)
+        if verbose:
+            status = "ok " if rep["ok"] else "ERR"
+            extra = "" if rep["ok"] else f"  {rep['error']}"
+            print(f"[{status}] line {rep['index']}: {rep['out']}  {rep['seconds']*1000:.1f} ms{extra}")
+        if report:
+            report.write(json.dumps({k: v for k, v in rep.items() if k != "traceback"}) + "\n")
+
+    if jobs == 1:
+        for job in scenes:
+            done(run_job(job))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(run_job, job): job for job in scenes}
+            for fut in as_completed(futures):
+                try:
+                    done(fut.result())
+                except BrokenProcessPool as e:   # процесс упал целиком (напр. нехватка памяти)
+                    index, scene = futures[fut]
+                    done({"index": index, "out": scene.get("out"), "ops": len(scene.get("ops", [])),
+                          "ok": False, "error": f"worker crashed: {e}", "seconds": 0.0})
+
+    wall = time.perf_counter() - t0
+    ok = sum(r["ok"] for r in results)
+    busy = sum(r["seconds"] for r in results)
+    if verbose:
+        print(f"scenes: {len(results)}, ok: {ok}, failed: {len(results) - ok}; "
+              f"wall {wall:.2f} s, render {busy:.2f} s, {len(results) / max(wall, 1e-9):.1f} scenes/s, "
+              f"processes: {jobs}")
+    return sorted(results, key=lambda r: r["index"])
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Render JSONL scene scripts headlessly across a process pool.")
+    ap.add_argument("scenes", help="JSONL file, one scene per line")
+    ap.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count; 0 or 1: in-process)")
+    ap.add_argument("-o", "--out-dir", default=None, help="directory for relative output paths")
+    ap.add_argument("--report", default=None, help="write per-scene results as JSON lines")
+    args = ap.parse_args(argv)
+
+    scenes = read_scenes(args.scenes, args.out_dir)
+    report = open(args.report, "w", encoding="utf-8") if args.report else None
+    try:
+        results = run_batch(scenes, args.jobs, report)
+    finally:
+        if report:
+            report.close()
+    return 0 if all(r["ok"] for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+# Бенчмарк растровых алгоритмов (без окна):
+#   python bench.py [--sizes 320x240,1000x600] [--only fill] [--repeat 3] [--out bench.json]
+#                   [--baseline old.json --threshold 0.25 --min-delta 2]
+# Каждый алгоритм гоняется на матрице размеров холста и сцен (пустой холст, лабиринт, спираль,
+# много мелких областей, длинные диагонали, большие треугольники). Для каждого случая
+# пишутся время, пиксели/с, пиковая память (tracemalloc, отдельным прогоном) и контрольная
+# сумма итогового изображения — ускорение, поменявшее пиксели, видно при сравнении с базой.
+import sys, json, time, hashlib, argparse, platform, statistics, tracemalloc
+import numpy as np
+
+from raster import (
+    BORDER_COLOR, BORDER_COLORS, Canvas, RingCache, RegionIndex,
+    bresenham_line, bresenham_segments, wu_line, wu_segments,
+    fill_triangle_barycentric, render_mesh,
+    scanline_fill_color, scanline_fill_pattern, checker_pattern, pattern_anchor,
+    inner_contour_from_inside, trace_contour, draw_points,
+)
+
+WHITE, BLACK, RED = (255, 255, 255), (0, 0, 0), (255, 0, 0)
+MIN_DELTA = 0.002   # с. — меньшая разница с базой не регрессия (шум), см. compare
+
+# -------------------- Сцены --------------------
+# сцена: (w, h) -> холст с содержимым; линии стен рисуются пакетным Брезенхемом
+
+def scene_open(w, h):
+    cv = Canvas.blank(w, h)
+    bresenham_segments(cv, [(0, 0, w-1, 0), (w-1, 0, w-1, h-1), (w-1, h-1, 0, h-1), (0, h-1, 0, 0)], BLACK)
+    return cv
+
+def scene_maze(w, h, cell=4):
+    """Змейка: вертикальные стены через одну, проход попеременно сверху и снизу."""
+    cv = Canvas.blank(w, h)
+    segs = []
+    for i, x in enumerate(range(cell, w, 2*cell)):
+        segs.append((x, 0, x, h-1-cell) if i % 2 == 0 else (x, cell, x, h-1))
+    bresenham_segments(cv, segs, BLACK)
+    return cv
+
+def scene_spiral(w, h, gap=4):
+    """Квадратная спираль стен: одна длинная извилистая область шириной gap-1."""
+    cv = Canvas.blank(w, h)
+    pts = [(0, 0)]
+    l, t, r, b = 0, 0, w-1, h-1
+    while r - l > 2*gap and b - t > 2*gap:
+        pts.append((r, t)); t += gap
+        pts.append((r, b)); r -= gap
+        pts.append((l, b)); b -= gap
+        pts.append((l, t)); l += gap
+    bresenham_segments(cv, [(a[0], a[1], b[0], b[1]) for a, b in zip(pts, pts[1:])], BLACK)
+    return cv
+
+def scene_cells(w, h, cell=8):
+    """Сетка мелких клеток."""
+    cv = Canvas.blank(w, h)
+    segs = [(x, 0, x, h-1) for x in range(0, w, cell)] + [(0, y, w-1, y) for y in range(0, h, cell)]
+    bresenham_segments(cv, segs, BLACK)
+    return cv
+
+def diagonals(w, h, n=64):
+    """Длинные отрезки через весь холст."""
+    return [(int(i*(w-1)/n), 0, w-1-int(i*(w-1)/n), h-1) for i in range(n)] + \
+           [(0, int(i*(h-1)/n), w-1, h-1-int(i*(h-1)/n)) for i in range(n)]
+
+def mesh_grid(w, h, step=16):
+    """Регулярная сетка треугольников с цветами вершин и наклонной глубиной."""
+    xs, ys = np.meshgrid(np.arange(0, w + step, step), np.arange(0, h + step, step))
+    verts = np.stack([xs.ravel(), ys.ravel(), (xs + ys).ravel()], axis=1).astype(np.float64)
+    colors = np.stack([xs.ravel() * 255 / w, ys.ravel() * 255 / h, np.full(xs.size, 128)], axis=1)
+    nx = xs.shape[1]
+    faces = []
+    for j in range(xs.shape[0] - 1):
+        for i in range(nx - 1):
+            a, b, c, d = j*nx + i, j*nx + i + 1, (j+1)*nx + i, (j+1)*nx + i + 1
+            faces += [(a, b, d), (a, d, c)]
+    return verts, np.clip(colors, 0, 255), np.array(faces)
+
+# -------------------- Случаи --------------------
+# случай: (алгоритм, сцена, подготовка(w, h) -> холст, прогон(cv) -> None)
+
+def _fill_cells(cv, cell=8, n=200, index=None):
+    for k in range(n):
+        x = 1 + (k * cell) % (cv.w - cell)
+        y = 1 + ((k * cell) // (cv.w - cell)) * cell % (cv.h - cell)
+        scanline_fill_color(cv, (x + 2, y + 2), WHITE, RED, index=index)
+
+def _fill_cells_indexed(cv):
+    # разметка холста входит в замер (первый запрос строит карту)
+    index = RegionIndex()
+    index.watch(cv)
+    _fill_cells(cv, index=index)
+
+def _fill_pattern(cv, seed):
+    pat = checker_pattern()
+    scanline_fill_pattern(cv, seed, WHITE, pat, pattern_anchor(seed, (8, 8)))
+
+def _boundary(cv, seed):
+    draw_points(cv, inner_contour_from_inside(cv, seed), RED)
+
+def _trace(cv, seed):
+    draw_points(cv, trace_contour(cv, seed), RED)
+
+def _rings(cv, seed, n=10):
+    rings = RingCache()
+    for _ in range(n):
+        rings.peel(cv, seed, RED)
+
+def _lines_each(draw, cv):
+    for s in diagonals(cv.w, cv.h):
+        draw(cv, *s, BLACK)
+
+def _triangles(cv):
+    w, h = cv.w, cv.h
+    fill_triangle_barycentric(cv, (0, 0), (w-1, 0), (0, h-1), RED, (0, 255, 0), (0, 128, 255))
+    fill_triangle_barycentric(cv, (w-1, 0), (w-1, h-1), (0, h-1), RED, (0, 255, 0), (0, 128, 255))
+
+CASES = [
+    ("bresenham_line",             "diagonals", scene_open,   lambda cv: _lines_each(bresenham_line, cv)),
+    ("bresenham_segments",         "diagonals", scene_open,   lambda cv: bresenham_segments(cv, diagonals(cv.w, cv.h), BLACK)),
+    ("wu_line",                    "diagonals", scene_open,   lambda cv: _lines_each(wu_line, cv)),
+    ("wu_segments",                "diagonals", scene_open,   lambda cv: wu_segments(cv, diagonals(cv.w, cv.h), BLACK)),
+    ("fill_triangle_barycentric",  "large",     scene_open,   _triangles),
+    ("render_mesh",                "grid",      scene_open,   lambda cv: render_mesh(cv, *mesh_grid(cv.w, cv.h), workers=1)),
+    ("scanline_fill_color",        "open",      scene_open,   lambda cv: scanline_fill_color(cv, (cv.w//2, cv.h//2), WHITE, RED)),
+    ("scanline_fill_color",        "maze",      scene_maze,   lambda cv: scanline_fill_color(cv, (1, 1), WHITE, RED)),
+    ("scanline_fill_color",        "spiral",    scene_spiral, lambda cv: scanline_fill_color(cv, (1, 1), WHITE, RED)),
+    ("scanline_fill_color",        "cells",     scene_cells,  _fill_cells),
+    ("scanline_fill_color+index",  "cells",     scene_cells,  _fill_cells_indexed),
+    ("scanline_fill_pattern",      "open",      scene_open,   lambda cv: _fill_pattern(cv, (cv.w//2, cv.h//2))),
+    ("scanline_fill_pattern",      "maze",      scene_maze,   lambda cv: _fill_pattern(cv, (1, 1))),
+    ("scanline_fill_pattern",      "spiral",    scene_spiral, lambda cv: _fill_pattern(cv, (1, 1))),
+    ("inner_contour_from_inside",  "open",      scene_open,   lambda cv: _boundary(cv, (cv.w//2, cv.h//2))),
+    ("inner_contour_from_inside",  "maze",      scene_maze,   lambda cv: _boundary(cv, (1, 1))),
+    ("inner_contour_from_inside",  "spiral",    scene_spiral, lambda cv: _boundary(cv, (1, 1))),
+    ("trace_contour",              "open",      scene_open,   lambda cv: _trace(cv, (cv.w//2, cv.h//2))),
+    ("trace_contour",              "maze",      scene_maze,   lambda cv: _trace(cv, (1, 1))),
+    ("ring_cache",                 "open",      scene_open,   lambda cv: _rings(cv, (cv.w//2, cv.h//2))),
+]
+
+# -------------------- Прогон --------------------
+def run_case(run, prepare, w, h, repeat):
+    # сначала прогон под tracemalloc — он же прогрев (импорты, кэши numpy)
+    cv = _fresh(prepare, w, h)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    run(cv)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    times = []
+    for _ in range(repeat):
+        cv = _fresh(prepare, w, h)
+        before = cv.arr.copy()
+        t0 = time.perf_counter()
+        run(cv)
+        times.append(time.perf_counter() - t0)
+    changed = int((cv.arr != before).any(axis=2).sum())
+    checksum = hashlib.sha1(cv.arr.tobytes()).hexdigest()
+    best = min(times)
+    return {"seconds": best, "median": statistics.median(times), "pixels": changed,
+            "pixels_per_s": changed / best if best > 0 else 0.0, "peak_bytes": peak, "checksum": checksum}
+
+def _fresh(prepare, w, h):
+    # состояние инструмента «Граница» — как при запуске приложения
+    BORDER_COLORS.clear()
+    BORDER_COLORS.add(BORDER_COLOR)
+    return prepare(w, h)
+
+def compare(results, baseline, threshold, min_delta=MIN_DELTA):
+    """
+    Сравнить с базой: -> список строк-замечаний (регрессии времени и изменённые пиксели).
+    Время — медианы прогонов; регрессия — медленнее и на долю threshold, и на min_delta секунд:
+    миллисекундные случаи от шума планировщика «замедляются» вдвое.
+    """
+    base = {(r["algo"], r["scene"], r["size"]): r for r in baseline["results"]}
+    notes = []
+    for r in results:
+        b = base.get((r["algo"], r["scene"], r["size"]))
+        if b is None:
+            continue
+        t, bt = r.get("median", r["seconds"]), b.get("median", b["seconds"])
+        if t > bt*(1 + threshold) and t - bt > min_delta:
+            notes.append(f"REGRESSION {r['algo']}/{r['scene']} {r['size']}: "
+                         f"{bt*1000:.1f} -> {t*1000:.1f} ms median (x{t/bt:.2f})")
+        if r["checksum"] != b["checksum"]:
+            notes.append(f"PIXELS CHANGED {r['algo']}/{r['scene']} {r['size']}")
+    return notes
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark rasterization and fill algorithms headlessly.")
+    ap.add_argument("--sizes", default="320x240,1000x600", help="comma-separated WxH list")
+    ap.add_argument("--only", default=None, help="substring filter on algorithm or scene name")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", default=None, help="save results as JSON")
+    ap.add_argument("--baseline", default=None, help="JSON from a previous run to compare against")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    ap.add_argument("--min-delta", type=float, default=MIN_DELTA*1000,
+                    help="ignore slowdowns smaller than this many ms (timer and scheduler noise)")
+    args = ap.parse_args(argv)
+
+    sizes = [tuple(int(v) for v in s.split("x")) for s in args.sizes.split(",")]
+    results = []
+    print(f"{'algorithm':28} {'scene':10} {'size':>10} {'ms':>10} {'Mpx/s':>8} {'peak MB':>8}  checksum")
+    for algo, scene, prepare, run in CASES:
+        if args.only and args.only not in algo and args.only not in scene:
+            continue
+        for w, h in sizes:
+            r = run_case(run, prepare, w, h, args.repeat)
+            r.update(algo=algo, scene=scene, size=f"{w}x{h}")
+            results.append(r)
+            print(f"{algo:28} {scene:10} {r['size']:>10} {r['seconds']*1000:10.1f} "
+                  f"{r['pixels_per_s']/1e6:8.2f} {r['peak_bytes']/2**20:8.1f}  {r['checksum'][:12]}")
+            sys.stdout.flush()
+
+    report = {"python": platform.python_version(), "numpy": np.__version__,
+              "machine": platform.machine(), "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+              "results": results}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            notes = compare(results, json.load(f), args.threshold, args.min_delta / 1000)
+        for n in notes:
+            print(n)
+        if notes:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
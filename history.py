@@ -0,0 +1,140 @@
+# Отмена/повтор операций (без окна):
+#   history.begin(cv); <операция>; history.end(cv, rect)   — или history.add(cv, before, rect)
+#   history.undo(cv) / history.redo(cv)
+# begin не копирует холст: открывается raster.Backup, и прежние пиксели сохраняются
+# плитками при первой записи в них (Canvas.will_write*) — O(тронутого), а не O(холста).
+# Запись хранит только изменённые пиксели внутри области операции: прогоны (RLE) по плоскому
+# индексу холста и цвета до/после. Заливка — несколько прогонов на строку, линия — по прогону
+# на пиксель; отмена и повтор — одна запись по индексам, O(изменённых пикселей).
+# Записи сверх бюджета памяти вытесняются, начиная с самых старых.
+# tag — метка холста, на котором сделана запись (у плиточного изображения — окно (x, y, w, h),
+# см. tiles.py): отменять её нужно на холсте с той же меткой.
+import numpy as np
+
+from raster import BORDER_COLORS, Backup
+
+UNDO_BUDGET = 16 << 20    # байт на всю историю (отмена + повтор)
+
+class Delta:
+    """Изменение холста: прогоны (starts, lengths) по индексу y*w + x, цвета до/после, охват rect."""
+    def __init__(self, starts, lengths, before, after, rect, borders=None):
+        self.starts, self.lengths = starts, lengths
+        self.before, self.after = before, after
+        self.rect = rect
+        self.borders = borders      # (BORDER_COLORS до, после) — если операция их меняла
+        self.tag = None
+
+    @classmethod
+    def between(cls, before, after, rect):
+        """Разница двух кадров (h, w, 3) внутри rect = (x, y, w, h); None — ничего не изменилось."""
+        x, y, w, h = rect
+        b = before[y:y + h, x:x + w]
+        a = after[y:y + h, x:x + w]
+        changed = (a != b).any(axis=2)
+        ys, xs = np.nonzero(changed)
+        if not len(ys):
+            return None
+        idx = (ys + y) * before.shape[1] + (xs + x)
+        return cls.from_changes(idx, b[changed], a[changed], before.shape[1])
+
+    @classmethod
+    def from_changes(cls, idx, before, after, w):
+        """Изменённые пиксели: плоские индексы idx (подряд идущие — одним прогоном), цвета до/после."""
+        if not len(idx):
+            return None
+        first = np.flatnonzero(np.r_[True, np.diff(idx) != 1])
+        starts = idx[first].astype(np.int32)
+        lengths = np.diff(np.r_[first, len(idx)]).astype(np.int32)
+        ys, xs = np.divmod(idx, w)
+        rect = (int(xs.min()), int(ys.min()), int(xs.max() - xs.min()) + 1, int(ys.max() - ys.min()) + 1)
+        return cls(starts, lengths, before, after, rect)
+
+    @property
+    def nbytes(self):
+        return self.starts.nbytes + self.lengths.nbytes + self.before.nbytes + self.after.nbytes
+
+    def apply(self, cv, colors):
+        # развернуть прогоны в индексы: start_k, start_k+1, ..., start_k+len_k-1
+        n = len(colors)
+        offs = np.repeat(self.starts - np.r_[0, np.cumsum(self.lengths)[:-1]], self.lengths)
+        ys, xs = np.divmod(offs + np.arange(n), cv.w)
+        with cv:
+            cv.will_write_points(xs, ys)
+            cv.px[ys, xs] = colors
+            x, y, w, h = self.rect
+            cv.touch(x, y, x + w - 1, y + h - 1)
+
+class History:
+    def __init__(self, budget=UNDO_BUDGET):
+        self.budget = budget
+        self.undos = []
+        self.redos = []
+        self.nbytes = 0
+        self._backup = None
+        self._borders = None
+        self.tag = None             # метка для новых записей
+
+    def begin(self, cv):
+        """Начать запись операции (кисть — на весь мазок): прежние пиксели сохранит Backup."""
+        if self._backup is not None:
+            self._backup.close()
+        self._backup = Backup(cv)
+        self._borders = set(BORDER_COLORS)
+
+    def end(self, cv, rect=None):
+        """Записать операцию, начатую begin; rect — где искать изменения (None — везде, куда писали)."""
+        if self._backup is None:
+            return
+        backup, self._backup = self._backup, None
+        backup.close()
+        with cv:
+            d = Delta.from_changes(*backup.changes(rect), cv.w)
+        self._push(d, self._borders)
+
+    def add(self, cv, before, rect=None, borders=None):
+        """Записать разницу between(before, холст) внутри rect; borders — BORDER_COLORS до операции."""
+        with cv:
+            d = Delta.between(before, cv.px, rect or (0, 0, cv.w, cv.h))
+        self._push(d, borders)
+
+    def _push(self, d, borders):
+        if borders is not None and borders != BORDER_COLORS:
+            if d is None:
+                d = Delta(np.zeros(0, np.int32), np.zeros(0, np.int32),
+                          np.zeros((0, 3), np.uint8), np.zeros((0, 3), np.uint8), (0, 0, 0, 0))
+            d.borders = (set(borders), set(BORDER_COLORS))
+        if d is None:
+            return
+        d.tag = self.tag
+        self.undos.append(d)
+        self.nbytes += d.nbytes
+        for r in self.redos:
+            self.nbytes -= r.nbytes
+        self.redos.clear()
+        while self.nbytes > self.budget and len(self.undos) > 1:
+            self.nbytes -= self.undos.pop(0).nbytes
+
+    def peek(self, redo=False):
+        """Запись, которую применит следующий undo (redo=True — redo), или None."""
+        stack = self.redos if redo else self.undos
+        return stack[-1] if stack else None
+
+    def _step(self, cv, src, dst, colors, borders):
+        if not src:
+            return False
+        d = src.pop()
+        if len(d.starts):
+            d.apply(cv, getattr(d, colors))
+        if d.borders:
+            BORDER_COLORS.clear()
+            BORDER_COLORS.update(d.borders[borders])
+        dst.append(d)
+        return True
+
+    def undo(self, cv):
+        """Отменить последнюю операцию. -> False, если отменять нечего."""
+        return self._step(cv, self.undos, self.redos, "before", 0)
+
+    def redo(self, cv):
+        """Повторить отменённую операцию. -> False, если повторять нечего."""
+        return self._step(cv, self.redos, self.undos, "after", 1)
@@ -0,0 +1,213 @@
+# Фоновые операции над холстом (без окна):
+#   job = CanvasJob("fill", cv, scanline_fill_color, (seed, target, repl))
+#   каждый кадр: if job.commit(): job = None        — перенос готового результата полосами строк
+#   Esc / новый клик: job.cancel()
+#   CanvasJob(..., process=True) — чистый питон (BFS границы, обход контура) считать в процессе
+# Операция считается в отдельном потоке на копии холста, поэтому цикл событий не замирает;
+# холст меняет только главный поток — в commit, по BAND_ROWS строк, не дольше COMMIT_BUDGET за кадр.
+import os, time, threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from raster import Canvas, BORDER_COLORS, Cancelled
+
+BAND_ROWS = 16            # строк в одной полосе переноса
+COMMIT_BUDGET = 0.004     # секунд на перенос полос за кадр
+STOP_POLL = 0.005         # как часто поток, ждущий процесс, смотрит на отмену
+PROCESS_NICE = 5          # приоритет процесса операций ниже окна: на одном ядре кадр не ждёт его
+
+# операции выполняются строго по одной: инструменты делят кэш колец
+_serial = threading.Lock()
+
+# -------------------- операции в процессе --------------------
+# Поток с циклом на чистом питоне держит GIL десятки миллисекунд подряд (рост set/dict
+# на сотни тысяч точек — одна операция C), и окно пропускает кадры. Такие операции
+# считаются в процессе: копия холста — в общей памяти, байт перед ней — флаг отмены,
+# его видит Canvas.check_stop процесса. fn должна быть функцией модуля (передаётся pickle).
+
+_pool = None   # один процесс на все операции: _serial всё равно пускает их по одной
+
+def _lower_priority():
+    if hasattr(os, "nice"):
+        os.nice(PROCESS_NICE)
+
+def _process_pool():
+    global _pool
+    if _pool is None:
+        # трекер общей памяти — до запуска процесса, чтобы он был общим: буферы удаляет (unlink)
+        # главный процесс, а свой трекер процесса счёл бы их утёкшими
+        resource_tracker.ensure_running()
+        _pool = ProcessPoolExecutor(max_workers=1, initializer=_lower_priority)
+    return _pool
+
+def start_processes():
+    """Запустить процесс операций заранее (при старте окна): первый клик не ждёт его создания."""
+    _process_pool().submit(int).result()
+
+class _SharedStop:
+    """Флаг отмены в общей памяти — для процесса вместо threading.Event."""
+    def __init__(self, buf):
+        self.buf = buf
+
+    def is_set(self):
+        return self.buf[0] != 0
+
+def _process_op(name, shape, borders, fn, args):
+    """Задача процесса: fn над холстом из общей памяти. -> (изменённый прямоугольник, границы)."""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        shared = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=1)
+        # своя копия: на Cancelled кадры трассировки держат холст, а с видом на буфер не закрыть shm
+        work = Canvas(shared.copy())
+        del shared
+        work.borders = set(borders)
+        work.stop = _SharedStop(shm.buf)
+        fn(work, *args)
+        rect = work.take_dirty()
+        if rect is not None:
+            x, y, w, h = rect
+            shared = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=1)
+            shared[y:y + h, x:x + w] = work.arr[y:y + h, x:x + w]
+            del shared   # до close(): на буфер не должно остаться ссылок
+        return rect, work.borders
+    finally:
+        shm.close()
+
+def _run_in_process(work, fn, args, stop):
+    """fn(work, *args) в процессе пула; изменения переносятся в work с will_write/touch."""
+    global _pool
+    h, w = work.h, work.w
+    shm = shared_memory.SharedMemory(create=True, size=h*w*3 + 1)
+    arr = None
+    try:
+        shm.buf[0] = 0
+        arr = np.ndarray((h, w, 3), dtype=np.uint8, buffer=shm.buf, offset=1)
+        arr[:] = work.arr
+        future = _process_pool().submit(_process_op, shm.name, (h, w, 3), work.borders, fn, args)
+        while True:
+            try:
+                rect, borders = future.result(timeout=STOP_POLL)   # ждём без GIL
+                break
+            except FutureTimeout:
+                if stop.is_set():
+                    shm.buf[0] = 1   # процесс прервётся на ближайшей проверке
+            except BrokenProcessPool:
+                _pool = None         # процесс умер — следующая операция поднимет новый
+                raise
+        work.borders = borders
+        if rect is not None:
+            x, y, rw, rh = rect
+            with work:
+                work.will_write(x, y, x + rw - 1, y + rh - 1)
+                work.px[y:y + rh, x:x + rw] = arr[y:y + rh, x:x + rw]
+                work.touch(x, y, x + rw - 1, y + rh - 1)
+    finally:
+        arr = None   # до close(): на буфер не должно остаться ссылок
+        shm.close()
+        shm.unlink()
+
+class CanvasJob:
+    """
+    fn(canvas, *args) над копией холста cv в фоновом потоке.
+    У копии свой набор цветов-границ (Canvas.borders): операция не трогает общий
+    BORDER_COLORS, он обновляется в commit вместе с последней полосой.
+    cancel() — в любой момент: длинные циклы операции видят флаг (Canvas.stop), прерываются
+    исключением raster.Cancelled и отпускают _serial; посчитанный результат отбрасывается,
+    уже перенесённые полосы возвращаются как были. Исключение операции поднимается
+    в главном потоке из commit().
+    process=True — fn считается в процессе (см. _run_in_process): для операций на чистом
+    питоне, которые иначе держат GIL и подтормаживают окно.
+    """
+    def __init__(self, name, cv, fn, args=(), profiler=None, info=None, process=False):
+        self.name = name
+        self.cv = cv
+        with cv:
+            self.orig = cv.px.copy()
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.cancelled = False
+        self.ready = False       # посчитана (или упала) и не отменена
+        self.error = None
+        self.work = None         # результат (h, w, 3)
+        self.rect = None         # (x, y, w, h) изменённого или None
+        self.row = 0             # сколько строк rect уже перенесено
+        self.borders = set(BORDER_COLORS)   # BORDER_COLORS до операции
+        self.new_borders = None  # цвета-границы после операции — в BORDER_COLORS из commit
+        self.process = process
+        threading.Thread(target=self._run, args=(fn, args, profiler, info or {}),
+                         name=f"canvas-job-{name}", daemon=True).start()
+
+    def _run(self, fn, args, profiler, info):
+        with _serial:
+            if self.stop.is_set():
+                return
+            work = Canvas(self.orig.copy())
+            work.borders = set(self.borders)
+            work.stop = self.stop
+            error = None
+            try:
+                with profiler.op(self.name, work, **info) if profiler else nullcontext():
+                    if self.process:
+                        _run_in_process(work, fn, args, self.stop)
+                    else:
+                        fn(work, *args)
+            except Cancelled:
+                return
+            except Exception as e:
+                error = e
+            with self.lock:
+                if self.cancelled:
+                    return
+                self.work, self.rect, self.error = work.arr, work.take_dirty(), error
+                self.new_borders = work.borders
+                self.ready = True
+
+    def commit(self, budget=COMMIT_BUDGET):
+        """Перенести на холст очередные полосы. -> True, когда операция закончена (или отменена)."""
+        if self.cancelled:
+            return True
+        if not self.ready:
+            return False
+        if self.error is not None:
+            raise self.error
+        if self.rect is None:
+            self._apply_borders()
+            return True
+        x, y, w, h = self.rect
+        t0 = time.perf_counter()
+        with self.cv:
+            while self.row < h:
+                y0 = y + self.row
+                y1 = min(y + h, y0 + BAND_ROWS)
+                self.cv.will_write(x, y0, x + w - 1, y1 - 1)
+                self.cv.px[y0:y1, x:x + w] = self.work[y0:y1, x:x + w]
+                self.cv.touch(x, y0, x + w - 1, y1 - 1)
+                self.row = y1 - y
+                if time.perf_counter() - t0 > budget:
+                    break
+        if self.row < h:
+            return False
+        self._apply_borders()
+        return True
+
+    def _apply_borders(self):
+        BORDER_COLORS.clear()
+        BORDER_COLORS.update(self.new_borders)
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            self.stop.set()
+            ready = self.ready
+        if not ready:
+            return   # поток прервётся на ближайшей проверке и ничего не отдаст
+        if self.row:
+            x, y, w, _ = self.rect
+            with self.cv:
+                self.cv.will_write(x, y, x + w - 1, y + self.row - 1)
+                self.cv.px[y:y + self.row, x:x + w] = self.orig[y:y + self.row, x:x + w]
+                self.cv.touch(x, y, x + w - 1, y + self.row - 1)
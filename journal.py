@@ -0,0 +1,357 @@
+# Журнал сессии: каждое действие инструмента — короткая двоичная запись (без окна):
+#   j = Journal("session.journal", w, h); j.keyframe(cv, pattern)   — новый журнал и начальный снимок
+#   j.record("fill_color", (x, y, r, g, b, tolerance, metric, antialias), BORDER_COLORS)
+#   end = restore("session.journal", cv)     — последний снимок + хвост действий -> на холст
+#   python journal.py session.journal [--verify] [--out final.png] [--repeat 3]
+#                                            — воспроизвести весь журнал без окна как нагрузку
+# Файл: заголовок MAGIC, w, h; дальше записи [код B, длина I] данные [длина I, код B] —
+# длина в конце записи позволяет читать журнал с конца: восстановление читает только записи
+# после последнего снимка (раз в keyframe_every действий), а не всю сессию.
+# Снимок — холст (zlib), BORDER_COLORS и рисунок заливки; действие — поля инструмента и
+# BORDER_COLORS после него. Отмена/повтор пишутся готовыми пикселями (patch, zlib), а не командой,
+# поэтому хвост после снимка воспроизводится без истории. Кэш колец («Граница», rings) в снимок
+# не входит: после восстановления он строится заново.
+# При запуске журнал переписывается заново — заголовок и снимок восстановленного холста,
+# так что файл не растёт от сессии к сессии.
+import os, sys, zlib, struct, time, argparse
+import numpy as np
+
+from raster import (
+    BG, BORDER_COLORS, Canvas, RingCache,
+    bresenham_line, wu_line, fill_triangle_barycentric,
+    scanline_fill_color, scanline_fill_pattern, checker_pattern,
+    inner_contour_from_inside, trace_contour, draw_points,
+)
+
+MAGIC = b"RJRN\x01"
+KEYFRAME_EVERY = 200      # действий между снимками: столько максимум воспроизводится при восстановлении
+KEYFRAME_LEVEL = 1        # сжатие zlib снимков и patch: быстро, штриховой рисунок и так жмётся в десятки раз
+
+_HEAD = struct.Struct("<BI")
+_TAIL = struct.Struct("<IB")
+_SIZE = struct.Struct("<II")
+
+KEYFRAME, PATCH = 1, 2
+# действие: код, struct-формат полей (цвета — три байта подряд)
+ACTIONS = {
+    "dot":        (16, "<hh3B"),        # кисть: точка x, y, цвет (круг радиуса 1)
+    "stroke":     (17, "<4h3B"),        # кисть: отрезок x0, y0, x1, y1, цвет (толщина 3)
+    "bresenham":  (18, "<4h3B"),        # x0, y0, x1, y1, цвет
+    "wu":         (19, "<4h3B"),
+    "triangle":   (20, "<6h9B"),        # A, B, C, цвета вершин
+    "fill_color": (21, "<hh3BdB?"),     # seed, цвет, допуск, метрика, сглаживание
+    "fill_img":   (22, "<4h?dB?"),      # seed, якорь рисунка, плиткой, допуск, метрика, сглаживание
+    "boundary":   (23, "<hh3BBhh"),     # seed, цвет, режим, колец за клик (-1 — все), шаг колец
+    "clear":      (24, "<3B"),          # цвет фона
+}
+_NAMES = {code: (name, struct.Struct(fmt)) for name, (code, fmt) in ACTIONS.items()}
+METRICS = ("channel", "euclid")
+BOUNDARY_MODES = ("fill", "trace", "rings")
+
+# -------------------- Кодирование --------------------
+def _pack_colors(colors):
+    colors = sorted(colors)
+    return struct.pack("<H", len(colors)) + bytes(c for rgb in colors for c in rgb[:3])
+
+def _unpack_colors(data, pos):
+    n, = struct.unpack_from("<H", data, pos)
+    pos += 2
+    raw = data[pos:pos + 3*n]
+    return {tuple(raw[i:i + 3]) for i in range(0, 3*n, 3)}, pos + 3*n
+
+def decode(kind, data, w, h):
+    """Запись -> (имя, поля, BORDER_COLORS после). Снимок: поля — (пиксели (h, w, 3), рисунок)."""
+    if kind == KEYFRAME:
+        borders, pos = _unpack_colors(data, 0)
+        ph, pw = struct.unpack_from("<HH", data, pos)
+        pos += 4
+        pattern = np.frombuffer(data, np.uint8, ph*pw*3, pos).reshape(ph, pw, 3)
+        pixels = np.frombuffer(zlib.decompress(data[pos + ph*pw*3:]), np.uint8).reshape(h, w, 3)
+        return "keyframe", (pixels, pattern), borders
+    if kind == PATCH:
+        runs, n = _SIZE.unpack_from(data, 0)
+        borders, pos = _unpack_colors(data, _SIZE.size)
+        raw = zlib.decompress(data[pos:])
+        starts = np.frombuffer(raw, np.int32, runs, 0)
+        lengths = np.frombuffer(raw, np.int32, runs, 4*runs)
+        colors = np.frombuffer(raw, np.uint8, n*3, 8*runs).reshape(n, 3)
+        return "patch", (starts, lengths, colors), borders
+    name, st = _NAMES[kind]
+    borders, _ = _unpack_colors(data, st.size)
+    return name, st.unpack_from(data, 0), borders
+
+# -------------------- Запись --------------------
+class Journal:
+    """
+    Дописываемый журнал. append_at — продолжить существующий файл с этого смещения
+    (см. restore; недописанный хвост за ним отрезается), иначе файл создаётся заново:
+    рядом (path + ".new"), а прежний заменяется первым снимком — если запуск упадёт
+    раньше, прежний журнал цел.
+    Записи сбрасываются в файл сразу (flush): при падении теряется не больше последней.
+    """
+    def __init__(self, path, w, h, keyframe_every=KEYFRAME_EVERY, append_at=None):
+        self.path, self.w, self.h = path, w, h
+        self.keyframe_every = keyframe_every
+        self.since = 0            # действий после последнего снимка
+        self.fresh = None         # новый файл до первого снимка
+        if append_at is None:
+            self.fresh = path + ".new"
+            self.f = open(self.fresh, "wb")
+            self.f.write(MAGIC + _SIZE.pack(w, h))
+        else:
+            self.f = open(path, "r+b")
+            self.f.truncate(append_at)
+            self.f.seek(append_at)
+        self.f.flush()
+
+    def _write(self, kind, data):
+        self.f.write(_HEAD.pack(kind, len(data)) + data + _TAIL.pack(len(data), kind))
+        self.f.flush()
+
+    def record(self, name, fields, borders):
+        """Действие name (см. ACTIONS) с полями fields; borders — BORDER_COLORS после действия.
+        name == "patch": fields = (starts, lengths, colors) — прогоны Delta и цвета по ним."""
+        if name == "patch":
+            starts, lengths, colors = fields
+            data = zlib.compress(starts.astype(np.int32).tobytes() + lengths.astype(np.int32).tobytes() +
+                                 np.ascontiguousarray(colors, np.uint8).tobytes(), KEYFRAME_LEVEL)
+            self._write(PATCH, _SIZE.pack(len(starts), len(colors)) + _pack_colors(borders) + data)
+        else:
+            code, fmt = ACTIONS[name]
+            self._write(code, struct.pack(fmt, *fields) + _pack_colors(borders))
+        self.since += 1
+
+    def due(self):
+        """Пора ли писать снимок."""
+        return self.since >= self.keyframe_every
+
+    def keyframe(self, cv, pattern):
+        """Снимок холста cv, BORDER_COLORS и рисунка заливки pattern (ph, pw, 3)."""
+        with cv:
+            pixels = np.ascontiguousarray(cv.px).tobytes()
+        ph, pw = pattern.shape[:2]
+        data = (_pack_colors(BORDER_COLORS) + struct.pack("<HH", ph, pw) +
+                np.ascontiguousarray(pattern[..., :3], np.uint8).tobytes() +
+                zlib.compress(pixels, KEYFRAME_LEVEL))
+        self._write(KEYFRAME, data)
+        self.since = 0
+        if self.fresh is not None:
+            # открытый файл переименовать нельзя (Windows) — закрыть, заменить, открыть снова
+            self.f.close()
+            os.replace(self.fresh, self.path)
+            self.fresh = None
+            self.f = open(self.path, "ab")
+
+    def close(self):
+        self.f.close()
+
+# -------------------- Чтение --------------------
+def _records_back(f, start, end):
+    # с конца назад до последнего снимка; None — хвост недописан или испорчен
+    out = []
+    pos = end
+    while pos > start:
+        if pos - start < _HEAD.size + _TAIL.size:
+            return None
+        f.seek(pos - _TAIL.size)
+        n, kind = _TAIL.unpack(f.read(_TAIL.size))
+        head = pos - _TAIL.size - n - _HEAD.size
+        if head < start:
+            return None
+        f.seek(head)
+        if _HEAD.unpack(f.read(_HEAD.size)) != (kind, n):
+            return None
+        out.append((kind, head + _HEAD.size, n))
+        pos = head
+        if kind == KEYFRAME:
+            break
+    return out[::-1]
+
+def _records_forward(f, start, end, last_only=True):
+    # с начала: целые записи (при last_only — от последнего снимка) и конец последней целой
+    out = []
+    pos = start
+    while pos + _HEAD.size + _TAIL.size <= end:
+        f.seek(pos)
+        kind, n = _HEAD.unpack(f.read(_HEAD.size))
+        stop = pos + _HEAD.size + n + _TAIL.size
+        if stop > end:
+            break
+        f.seek(stop - _TAIL.size)
+        if _TAIL.unpack(f.read(_TAIL.size)) != (n, kind):
+            break
+        if kind == KEYFRAME and last_only:
+            out.clear()
+        out.append((kind, pos + _HEAD.size, n))
+        pos = stop
+    return out, pos
+
+def read_journal(path, everything=False):
+    """-> (w, h, [(код, данные)], конец целых записей). Записи — от последнего снимка
+    (everything=True — все с начала). None — не журнал."""
+    with open(path, "rb") as f:
+        head = f.read(len(MAGIC) + _SIZE.size)
+        if len(head) < len(MAGIC) + _SIZE.size or not head.startswith(MAGIC):
+            return None
+        w, h = _SIZE.unpack_from(head, len(MAGIC))
+        start = len(head)
+        end = f.seek(0, 2)
+        recs = None if everything else _records_back(f, start, end)
+        if recs is None:   # весь журнал или хвост повреждён (падение посреди записи)
+            recs, end = _records_forward(f, start, end, last_only=not everything)
+        out = []
+        for kind, pos, n in recs:
+            f.seek(pos)
+            out.append((kind, f.read(n)))
+    return w, h, out, end
+
+# -------------------- Воспроизведение --------------------
+def apply_action(cv, name, fields, pattern, rings):
+    """Повторить действие на холсте — теми же вызовами, что и интерфейс (main.py)."""
+    if name in ("dot", "stroke"):
+        import pygame   # кисть рисуется pygame.draw, как в интерфейсе: холст должен быть Surface
+        if name == "dot":
+            r = pygame.draw.circle(cv.surf, fields[2:5], fields[:2], 1)
+        else:
+            r = pygame.draw.line(cv.surf, fields[4:7], fields[:2], fields[2:4], 3)
+        cv.touch(r.left, r.top, r.right - 1, r.bottom - 1)
+    elif name in ("bresenham", "wu"):
+        draw = bresenham_line if name == "bresenham" else wu_line
+        draw(cv, *fields[:4], fields[4:7])
+    elif name == "triangle":
+        f = fields
+        fill_triangle_barycentric(cv, f[0:2], f[2:4], f[4:6], f[6:9], f[9:12], f[12:15])
+    elif name == "fill_color":
+        x, y, r, g, b, tolerance, metric, antialias = fields
+        with cv:
+            target = cv.get(x, y)
+        scanline_fill_color(cv, (x, y), target, (r, g, b), tolerance, METRICS[metric], antialias)
+    elif name == "fill_img":
+        x, y, ax, ay, tiled, tolerance, metric, antialias = fields
+        with cv:
+            target = cv.get(x, y)
+        scanline_fill_pattern(cv, (x, y), target, pattern, (ax, ay), tiled,
+                              tolerance, METRICS[metric], antialias)
+    elif name == "boundary":
+        x, y, r, g, b, mode, count, step = fields
+        color = (r, g, b)
+        if BOUNDARY_MODES[mode] == "rings":
+            rings.peel(cv, (x, y), color, None if count < 0 else count, step)
+        else:
+            trace = BOUNDARY_MODES[mode] == "trace"
+            draw_points(cv, trace_contour(cv, (x, y)) if trace else inner_contour_from_inside(cv, (x, y)), color)
+            if color != BG:
+                BORDER_COLORS.add(color)
+    elif name == "clear":
+        with cv:
+            cv.will_write(0, 0, cv.w - 1, cv.h - 1)
+            cv.px[...] = fields
+            cv.touch(0, 0, cv.w - 1, cv.h - 1)
+        rings.reset()
+    elif name == "patch":
+        starts, lengths, colors = fields
+        offs = np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+        ys, xs = np.divmod(offs + np.arange(len(colors)), cv.w)
+        with cv:
+            cv.scatter(xs, ys, colors)
+    else:
+        raise ValueError(f"unknown journal action: {name!r}")
+
+def load_keyframe(cv, fields, borders):
+    pixels, pattern = fields
+    with cv:
+        cv.will_write(0, 0, cv.w - 1, cv.h - 1)
+        cv.px[...] = pixels
+        cv.touch(0, 0, cv.w - 1, cv.h - 1)
+    BORDER_COLORS.clear()
+    BORDER_COLORS.update(borders)
+    return pattern
+
+def restore(path, cv):
+    """
+    Восстановить сессию на холст cv того же размера: последний снимок + действия после него.
+    -> смещение конца целых записей (для Journal(append_at=...)) или None, если журнал
+    не подходит (не журнал, другой размер, нет снимка).
+    """
+    got = read_journal(path)
+    if got is None:
+        return None
+    w, h, recs, end = got
+    if (w, h) != (cv.w, cv.h) or not recs or recs[0][0] != KEYFRAME:
+        return None
+    rings = RingCache()
+    pattern = None
+    for kind, data in recs:
+        name, fields, borders = decode(kind, data, w, h)
+        if name == "keyframe":
+            pattern = load_keyframe(cv, fields, borders)
+            continue
+        apply_action(cv, name, fields, pattern, rings)
+        BORDER_COLORS.clear()
+        BORDER_COLORS.update(borders)
+    return end
+
+def replay(path, verify=False):
+    """
+    Весь журнал с первого снимка на новом холсте (Surface без окна). Следующие снимки
+    не загружаются — при verify с ними сверяется холст (детерминизм воспроизведения).
+    -> (Canvas, {действие: [секунды, ...]}, число расхождений со снимками).
+    """
+    import pygame
+    w, h, recs, _ = read_journal(path, everything=True)
+    cv = Canvas(pygame.Surface((w, h)))
+    rings = RingCache()
+    times = {}
+    pattern = checker_pattern()
+    mismatches = 0
+    first = True
+    for kind, data in recs:
+        name, fields, borders = decode(kind, data, w, h)
+        if name == "keyframe":
+            if first:
+                pattern = load_keyframe(cv, fields, borders)
+                first = False
+            else:
+                pattern = fields[1]
+                if verify:
+                    with cv:
+                        same = np.array_equal(cv.px, fields[0])
+                    mismatches += not same or BORDER_COLORS != borders
+            continue
+        t0 = time.perf_counter()
+        apply_action(cv, name, fields, pattern, rings)
+        times.setdefault(name, []).append(time.perf_counter() - t0)
+        BORDER_COLORS.clear()
+        BORDER_COLORS.update(borders)
+    return cv, times, mismatches
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay a session journal headlessly as a performance workload.")
+    ap.add_argument("journal", help="journal file written by main.py")
+    ap.add_argument("--verify", action="store_true", help="compare the canvas with every later keyframe")
+    ap.add_argument("--out", default=None, help="save the final canvas (.png/.npy/.rgb)")
+    ap.add_argument("--repeat", type=int, default=1, help="replay this many times, report the best")
+    args = ap.parse_args(argv)
+
+    best = None
+    for _ in range(max(1, args.repeat)):
+        t0 = time.perf_counter()
+        cv, times, mismatches = replay(args.journal, args.verify)
+        total = time.perf_counter() - t0
+        if best is None or total < best[0]:
+            best = (total, cv, times, mismatches)
+    total, cv, times, mismatches = best
+    print(f"{'action':<12} {'count':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9}")
+    for name, ts in sorted(times.items(), key=lambda kv: -sum(kv[1])):
+        print(f"{name:<12} {len(ts):>7} {sum(ts)*1000:>10.1f} {sum(ts)/len(ts)*1000:>9.2f} {max(ts)*1000:>9.2f}")
+    print(f"replay: {sum(map(len, times.values()))} actions, {total*1000:.1f} ms with decoding")
+    if args.verify:
+        print(f"keyframe mismatches: {mismatches}")
+    if args.out:
+        from saver import save_array
+        with cv:
+            save_array(cv.px.copy(), args.out)
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
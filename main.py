@@ -1,15 +1,61 @@
-import sys, math, pygame
-from collections import deque
+import os, sys, time, pygame
+from raster import (
+    BG, BORDER_COLORS, Canvas, RingCache, RegionIndex,
+    bresenham_line, wu_line, fill_triangle_barycentric,
+    scanline_fill_color, scanline_fill_pattern,
+    pattern_anchor, checker_pattern, pattern_pixels,
+    inner_contour_from_inside, trace_contour, draw_points, border_mask, borders_of,
+)
+from profiler import OpProfiler
+from jobs import CanvasJob, start_processes
+from saver import BackgroundSaver
+from history import History
+from tiles import TiledImage, region_window
+from journal import Journal, restore, METRICS, BOUNDARY_MODES
 
 # -------------------- Конфиг --------------------
 WIDTH, HEIGHT = 1000, 720
-CANVAS_RECT = pygame.Rect(0, 60, WIDTH, HEIGHT-60)
 UI_HEIGHT = 120
-BG = (255, 255, 255)
-BORDER_COLOR = (0, 0, 0)   # цвет «границы» для режима 1в (обход границы)
 # ---- Параметры заливки картинкой ----
 PATTERN_MODE = "tile"      # "stamp" | "tile" | "tile_fixed"
 PATTERN_ANCHOR = "center"  # "click" | "center"
+# ---- Допуск заливок (обе заливки) ----
+FILL_TOLERANCE = 0         # 0 — точное совпадение с цветом под кликом
+FILL_METRIC = "channel"    # "channel" (макс. разница по каналу) | "euclid" (расстояние в RGB)
+FILL_ANTIALIAS = False     # сглаживать край заливки
+# ---- Режим инструмента «Граница (1в)» ----
+BOUNDARY_MODE = "fill"     # "fill" — BFS по всей области | "trace" — обход контура за O(периметра)
+                           # | "rings" — кольца из кэша карты расстояний (см. RingCache)
+RING_COUNT = 1             # "rings": сколько колец за клик (None — все оставшиеся)
+RING_STEP = 1              # "rings": рисовать каждое RING_STEP-е кольцо
+# ---- Профилирование операций (см. profiler.py) ----
+PROFILE_OVERLAY = False    # показывать оверлей со временем операций и кадра (F3)
+PROFILE_MEMORY = False     # мерить пиковую память операций через tracemalloc (F4; замедляет операции)
+PROFILE_CPROFILE = False   # cProfile каждой операции, профиль самой медленной -> slowest_op.prof
+# ---- Фоновые операции (см. jobs.py) ----
+BACKGROUND_OPS = True      # заливки, границу и треугольник считать в потоке, на холст — полосами строк;
+                           # Esc или новый клик по холсту отменяет операцию
+BACKGROUND_PROCESS = True  # границу "fill"/"trace" (чистый питон, держит GIL) — в отдельном процессе
+# ---- Сохранение по ПКМ (см. saver.py) ----
+SAVE_BASE = "out"          # имя файла без расширения
+SAVE_FORMAT = "png"        # "png" | "npy" (numpy, без сжатия) | "raw" (сырые RGB-байты, .rgb)
+SAVE_NAMING = "numbered"   # "numbered" — out_0001.png, ... | "timestamp" | "fixed" — всегда out.png
+SAVE_PNG_LEVEL = 6         # сжатие PNG: 0 — без сжатия (быстро) ... 9 — максимум
+# ---- Отмена (Ctrl+Z) / повтор (Ctrl+Y, Ctrl+Shift+Z), см. history.py ----
+UNDO_BUDGET_MB = 16        # память под историю; старые записи вытесняются
+# ---- Большое изображение (см. tiles.py) ----
+CANVAS_SIZE = None         # None — холст размером с окно; (w, h) — изображение в файле плиток 256x256,
+                           # окно показывает его часть, стрелки — прокрутка
+CANVAS_FILE = "canvas.tiles"
+REGION_WINDOW_MAX = 4096 * 4096   # заливка/граница за окном просмотра: предел окна изображения (пикселей),
+                                  # области больше него не заливаются (окно читается в память целиком)
+# ---- Индекс областей (см. RegionIndex в raster.py) ----
+REGION_INDEX = False       # заливки без допуска и сглаживания — по готовой карте областей холста:
+                           # повторные заливки той же раскраски почти мгновенны (и идут сразу, не в фоне)
+# ---- Журнал сессии (см. journal.py) ----
+JOURNAL_PATH = "session.journal"   # None — не вести; для плиточного изображения не ведётся (оно само в файле)
+JOURNAL_RESTORE = True     # при запуске восстановить холст из журнала прошлой сессии
+JOURNAL_KEYFRAME_EVERY = 200   # действий между снимками холста в журнале
 # палитры
 PALETTE = [
     (0,0,0), (255,255,255), (255,0,0), (0,255,0), (0,0,255),
@@ -17,36 +63,66 @@ PALETTE = [
 ]
 
 # -------------------- Инициализация --------------------
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Raster tasks: fill (color/pattern), boundary (1в), Bresenham, Wu, triangle")
-font = pygame.font.SysFont("Consolas", 16)
-
-canvas = pygame.Surface((WIDTH, HEIGHT-UI_HEIGHT)).convert()
-canvas.fill(BG)
-
-# Паттерн
-try:
-    pattern_img = pygame.image.load("pattern.png").convert_alpha()
-except:
-    pattern_img = pygame.Surface((8, 8), pygame.SRCALPHA)
-    for y in range(8):
-        for x in range(8):
-            c = (220, 220, 220, 255) if (x+y) % 2 == 0 else (180, 180, 180, 255)
-            pattern_img.set_at((x, y), c)
-
-# -------------------- Утилиты --------------------
-def in_canvas(x, y):
-    return 0 <= x < CANVAS_RECT.w and 0 <= y < CANVAS_RECT.h
-
-def get_px(surf, x, y):
-    return surf.get_at((x, y))[:3]
-
-def set_px(surf, x, y, color):
-    surf.set_at((x, y), color)
-
+# Окно, шрифт, холст и рисунок создаются только при запуске приложения (init_app из main),
+# импорт модуля ничего не открывает — алгоритмы живут в raster.py.
+screen = None
+font = None
+canvas = None
+cv = None              # Canvas над canvas — с ним работают все инструменты
+pattern_img = None
+saver = None           # фоновая запись файлов (BackgroundSaver)
+image = None           # TiledImage при CANVAS_SIZE; тогда canvas — окно просмотра на него
+journal = None         # Journal — запись действий сессии
+view = None            # (x, y, w, h) окна просмотра в координатах изображения
+
+def init_app():
+    global screen, font, canvas, cv, pattern_img, saver, image, view, journal
+    if BACKGROUND_OPS and BACKGROUND_PROCESS:
+        start_processes()   # до pygame.init: процесс не наследует окно
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Raster tasks: fill (color/pattern), boundary (1в), Bresenham, Wu, triangle")
+    font = pygame.font.SysFont("Consolas", 16)
+
+    cw, ch = WIDTH, HEIGHT-UI_HEIGHT
+    if CANVAS_SIZE:
+        image = TiledImage(CANVAS_FILE, *CANVAS_SIZE, BG)
+        cw, ch = min(cw, image.w), min(ch, image.h)
+    canvas = pygame.Surface((cw, ch)).convert()
+    canvas.fill(BG)
+    cv = Canvas(canvas)
+    view = (0, 0, cw, ch)
+    if region_index is not None:
+        region_index.watch(cv)
+    if image is not None:
+        load_view(0, 0)
+    saver = BackgroundSaver(SAVE_BASE, SAVE_FORMAT, SAVE_NAMING, SAVE_PNG_LEVEL)
+
+    # Паттерн
+    try:
+        pattern_img = pygame.image.load("pattern.png").convert_alpha()
+    except:
+        pattern_img = pygame.surfarray.make_surface(checker_pattern().transpose(1, 0, 2))
+
+    # журнал: восстановить прошлую сессию (снимок + хвост действий) и начать файл заново —
+    # с одного снимка восстановленного холста, чтобы журнал не рос от запуска к запуску
+    if JOURNAL_PATH and image is None:
+        if JOURNAL_RESTORE and os.path.exists(JOURNAL_PATH):
+            t0 = time.perf_counter()
+            if restore(JOURNAL_PATH, cv) is not None:
+                print(f"Restored session from {JOURNAL_PATH} ({(time.perf_counter() - t0)*1000:.0f} ms)")
+        journal = Journal(JOURNAL_PATH, cw, ch, JOURNAL_KEYFRAME_EVERY)
+        journal.keyframe(cv, pattern_pixels(pattern_img))
+
+# отрисованные надписи: font.render — самое дорогое в кадре, а надписи почти не меняются
+_text_cache = {}
 def draw_text(s, x, y, color=(0,0,0)):
-    screen.blit(font.render(s, True, color), (x, y))
+    img = _text_cache.get((s, color))
+    if img is None:
+        if len(_text_cache) > 256:   # строки профиля каждый раз новые — не копим
+            _text_cache.clear()
+        img = _text_cache[(s, color)] = font.render(s, True, color)
+    screen.blit(img, (x, y))
 
 # -------------------- Инструменты --------------------
 TOOL_DRAW        = "draw"
@@ -65,293 +141,172 @@ last_pos = None           # для непрерывного рисования
 line_pts = []             # 2 точки для линий
 tri_pts = []             # 3 точки для треугольника
 
-# -------------------- Рисование линий --------------------
-def bresenham_line(surface, x0, y0, x1, y1, color):
-    dx = abs(x1 - x0)
-    dy = abs(y1 - y0)
-
-    sx = 1 if x1 > x0 else -1
-    sy = 1 if y1 > y0 else -1
-
-    if dy <= dx:
-        d = 2 * dy - dx
-        y = y0
-
-        for x in range(x0, x1 + sx, sx):
-            surface.set_at((x, y), color)
-
-            if d >= 0:  # if di ≥ 0 then yi+1 = yi + 1
-                y += sy
-                d += 2 * (dy - dx)  # di+1 = di + 2(dy - dx)
-            else:  # if di < 0 then yi+1 = yi
-                d += 2 * dy  # di+1 = di + 2dy
-    else:
-        d = 2 * dx - dy
-        x = x0
-
-        for y in range(y0, y1 + sy, sy):
-            surface.set_at((x, y), color)
-
-            if d >= 0:  # if di ≥ 0 then xi+1 = xi + 1
-                x += sx
-                d += 2 * (dx - dy)  # di+1 = di + 2(dx - dy)
-            else:  # if di < 0 then xi+1 = xi
-                d += 2 * dx  # di+1 = di + 2dx
-
-def wu_line(surf, x0, y0, x1, y1, color):
-    def ipart(x):
-        return int(math.floor(x))
-
-    def fpart(x):
-        return x - math.floor(x)
-
-    def rfpart(x):
-        return 1 - fpart(x)
-
-    def plot(x, y, a):
-        if in_canvas(x,y):
-            r,g,b = get_px(surf, x,y)
-            rr = int(r*(1-a) + color[0]*a)
-            gg = int(g*(1-a) + color[1]*a)
-            bb = int(b*(1-a) + color[2]*a)
-            set_px(surf, x,y,(rr, gg, bb))
-
-    steep = abs(y1-y0) > abs(x1-x0)
-    if steep:
-        x0, y0, x1, y1 = y0, x0, y1, x1
-    if x0 > x1:
-        x0, x1, y0, y1 = x1, x0, y1, y0
-
-    dx = x1-x0
-    dy = y1-y0
-    gradient = dy/dx if dx else 0.0
-    xend = round(x0)
-    yend = y0 + gradient*(xend-x0)
-    xpxl1 = int(xend)
-    ypxl1 = ipart(yend)
-    if steep:
-        plot(ypxl1,   xpxl1, rfpart(yend))
-        plot(ypxl1+1, xpxl1, fpart(yend))
-    else:
-        plot(xpxl1, ypxl1,   rfpart(yend))
-        plot(xpxl1, ypxl1+1, fpart(yend))
-    intery = yend + gradient
-    xend = round(x1)
-    yend = y1 + gradient*(xend-x1)
-    xpxl2 = int(xend)
-    ypxl2 = ipart(yend)
-    for x in range(xpxl1+1, xpxl2):
-        if steep:
-            plot(ipart(intery),   x, rfpart(intery))
-            plot(ipart(intery)+1, x, fpart(intery))
-        else:
-            plot(x, ipart(intery),   rfpart(intery))
-            plot(x, ipart(intery)+1, fpart(intery))
-        intery += gradient
-    if steep:
-        plot(ypxl2,   xpxl2, rfpart(yend))
-        plot(ypxl2+1, xpxl2, fpart(yend))
-    else:
-        plot(xpxl2, ypxl2,   rfpart(yend))
-        plot(xpxl2, ypxl2+1, fpart(yend))
-
-# -------------------- Треугольник (градиент) --------------------
-def area2(a,b,c):
-    return (b[0]-a[0])*(c[1]-a[1]) - (c[0]-a[0])*(b[1]-a[1])
-
-def fill_triangle_barycentric(surf, A, B, C, colA, colB, colC):
-    S = area2(A, B, C)
-    if S == 0:
-        return
-    xmin = max(0, min(A[0], B[0], C[0]))
-    xmax = min(surf.get_width()-1, max(A[0], B[0], C[0]))
-    ymin = max(0, min(A[1], B[1], C[1]))
-    ymax = min(surf.get_height()-1, max(A[1], B[1], C[1]))
-
-    for y in range(ymin, ymax+1):
-        for x in range(xmin, xmax+1):
-            P = (x, y)
-            a = area2(B, C, P)/S
-            b = area2(C, A, P)/S
-            c = area2(A, B, P)/S
-            if a >= 0 and b >= 0 and c >= 0:
-                r = int(colA[0]*a + colB[0]*b + colC[0]*c)
-                g = int(colA[1]*a + colB[1]*b + colC[1]*c)
-                bcol = int(colA[2]*a + colB[2]*b + colC[2]*c)
-                set_px(surf, x, y, (max(0, min(255, r)), max(0,min(255, g)), max(0, min(255, bcol))))
-
-# -------------------- Заливки (scanline) --------------------
-def scanline_fill_color(surf, seed, target, repl):
-    if repl == target:
-        return
-    x0, y0 = seed
-    if not in_canvas(x0, y0):
-        return
-    if get_px(surf, x0, y0) != target:
-        return
+SCROLL_KEYS = {pygame.K_LEFT: (-1, 0), pygame.K_RIGHT: (1, 0), pygame.K_UP: (0, -1), pygame.K_DOWN: (0, 1)}
 
-    # расширяемся по строке
-    xl = x0
-    while xl-1 >= 0 and get_px(surf, xl-1, y0) == target:
-        xl -= 1
-    xr = x0
-    while xr+1 < surf.get_width() and get_px(surf, xr+1, y0) == target:
-        xr += 1
-    for x in range(xl, xr+1):
-        set_px(surf, x, y0, repl)
-
-    # строки выше/ниже
-    for ny in (y0-1, y0+1):
-        if 0 <= ny < surf.get_height():
-            x = xl
-            while x <= xr:
-                if get_px(surf, x, ny) == target:
-                    scanline_fill_color(surf, (x, ny), target, repl)
-                    while x <= xr and get_px(surf, x, ny) == repl:
-                        x += 1
-                x += 1
-
-def scanline_fill_pattern(surf, seed, target, pattern, anchor, tiled=True, visited=None):
-    """
-    Итеративная scanline-заливка рисунком:
-    - Находим на строке сплошной сегмент target [xl..xr], закрашиваем (или помечаем).
-    - На строках y-1 и y+1 ищем все сегменты target и кладём их в стек.
-    - Без рекурсии => нет RecursionError на больших областях.
-    """
-    x0, y0 = seed
-    w, h = surf.get_width(), surf.get_height()
-    if not in_canvas(x0, y0):
-        return
-    if visited is None:
-        visited = [[False] * w for _ in range(h)]
+# долгие инструменты — в фоне при BACKGROUND_OPS; линии и кисть быстрые, рисуются сразу
+BACKGROUND_TOOLS = {TOOL_FILL_COLOR, TOOL_FILL_IMG, TOOL_BOUNDARY, TOOL_TRIANGLE}
+
+ring_cache = RingCache()   # кэш колец для BOUNDARY_MODE == "rings"
+profiler = OpProfiler(trace_memory=PROFILE_MEMORY, cprofile=PROFILE_CPROFILE)
+show_profile = PROFILE_OVERLAY
+job = None                 # фоновая операция в работе (CanvasJob)
+job_rec = None             # её запись для журнала: (действие, поля)
+history = History(UNDO_BUDGET_MB << 20)
+region_index = RegionIndex() if REGION_INDEX else None
 
-    # Быстрая проверка старта
-    if get_px(surf, x0, y0) != target:
-        visited[y0][x0] = True
+def boundary_tool(c, seed, color):
+    if BOUNDARY_MODE == "rings":
+        # кольца из кэша: цвет в цвета-границы добавляет сам peel
+        n = ring_cache.peel(c, seed, color, RING_COUNT, RING_STEP)
+        print(f"ring points: {n}; barrier colors: {len(borders_of(c))}")
         return
 
-    pw, ph = pattern.get_width(), pattern.get_height()
-    ax, ay = anchor
-
-    stack = [(x0, y0)]
-    while stack:
-        sx, sy = stack.pop()
-        if not (0 <= sx < w and 0 <= sy < h):
-            continue
-        if visited[sy][sx] or get_px(surf, sx, sy) != target:
-            visited[sy][sx] = True
-            continue
-
-        # --- 1) расширяемся на текущей строке ---
-        xl = sx
-        while xl - 1 >= 0 and (not visited[sy][xl - 1]) and get_px(surf, xl - 1, sy) == target:
-            xl -= 1
-        xr = sx
-        while xr + 1 < w and (not visited[sy][xr + 1]) and get_px(surf, xr + 1, sy) == target:
-            xr += 1
-
-        # --- 2) красим [xl..xr] и помечаем visited ---
-        for x in range(xl, xr + 1):
-            if visited[sy][x]:
-                continue
-            if tiled:
-                ux = (x - ax) % pw
-                uy = (sy - ay) % ph
-                color = pattern.get_at((ux, uy))[:3]
-                set_px(surf, x, sy, color)
-            else:
-                ux = x - ax
-                uy = sy - ay
-                if 0 <= ux < pw and 0 <= uy < ph:
-                    color = pattern.get_at((ux, uy))[:3]
-                    set_px(surf, x, sy, color)
-                # если вышли за картинку — просто помечаем посещённым (но не красим)
-            visited[sy][x] = True
-
-        # --- 3) на строках сверху/снизу ищем все сегменты target и кладём их в стек ---
-        for ny in (sy - 1, sy + 1):
-            if not (0 <= ny < h):
-                continue
-            x = xl
-            while x <= xr:
-                # пропускаем не-target и уже посещённое
-                while x <= xr and (visited[ny][x] or get_px(surf, x, ny) != target):
-                    x += 1
-                if x > xr:
-                    break
-                # найден старт сегмента; расширяем влево/вправо до границ целой строки
-                seg_l = x
-                while seg_l - 1 >= 0 and (not visited[ny][seg_l - 1]) and get_px(surf, seg_l - 1, ny) == target:
-                    seg_l -= 1
-                seg_r = x
-                while seg_r + 1 < w and (not visited[ny][seg_r + 1]) and get_px(surf, seg_r + 1, ny) == target:
-                    seg_r += 1
-
-                # Кладём ЛЕВЫЙ край сегмента в стек (как и в рекурсивной версии)
-                stack.append((seg_l, ny))
-
-                # Продолжаем поиск после сегмента
-                x = seg_r + 1
-
-
-# -------------------- 1в: Выделение границы по клику внутри --------------------
-# Идея: BFS по внутренней области (все пиксели != BORDER_COLOR), параллельно набираем соседей == BORDER_COLOR — это граница.
-
-NBS4 = [(1,0),(-1,0),(0,1),(0,-1)]
-# все пиксели этих цветов считаем НЕДОСТУПНЫМИ (границей)
-BORDER_COLORS = {BORDER_COLOR}
-
-def is_border_color(rgb):
-    return rgb in BORDER_COLORS
-
-def inner_contour_from_inside(surf, seed):
-    """
-    Возвращает список пикселей ВНУТРИ области, прилегающих к ЛЮБОЙ границе из BORDER_COLORS.
-    Каждое последующее применение (после отрисовки) даёт следующее «кольцо».
-    """
-    w, h = surf.get_width(), surf.get_height()
-    sx, sy = seed
-    if not in_canvas(sx, sy):
-        return []
-
-    # если кликнули прямо по границе — сместимся в первый внутренний пиксель
-    if is_border_color(get_px(surf, sx, sy)):
-        for dx, dy in NBS4:
-            nx, ny = sx+dx, sy+dy
-            if 0 <= nx < w and 0 <= ny < h and not is_border_color(get_px(surf, nx, ny)):
-                sx, sy = nx, ny
-                break
-        else:
-            return []
-
-    from collections import deque
-    q = deque([(sx, sy)])
-    visited = [[False]*w for _ in range(h)]
-    visited[sy][sx] = True
-
-    inner_contour = set()
-
-    while q:
-        x, y = q.popleft()
-        adj_border = False
-        for dx, dy in NBS4:
-            nx, ny = x+dx, y+dy
-            if 0 <= nx < w and 0 <= ny < h:
-                c = get_px(surf, nx, ny)
-                if is_border_color(c):
-                    adj_border = True
-                else:
-                    if not visited[ny][nx]:
-                        visited[ny][nx] = True
-                        q.append((nx, ny))
-        if adj_border:
-            inner_contour.add((x, y))
-
-    return list(inner_contour)
-
-def draw_points(surf, pts, color=(255,0,0)):
-    for x,y in pts:
-        set_px(surf, x,y, color)
+    # "trace": упорядоченный контур (ломаная для экспорта — raster.contour_polyline)
+    inner = trace_contour(c, seed) if BOUNDARY_MODE == "trace" else inner_contour_from_inside(c, seed)
+
+    # рисуем обводку текущим цветом заливки (или любым вашим)
+    draw_points(c, inner, color)
+
+    # добавляем ЭТОТ цвет в множество границ, чтобы следующее нажатие рисовало ещё глубже
+    if color != BG:  # на всякий случай не добавляем белый фон
+        borders_of(c).add(color)   # у фоновой операции — свой набор, в общий он попадёт в commit
+
+    print(f"inner-contour points: {len(inner)}; barrier colors: {len(borders_of(c))}")
+
+# ---- Плиточное изображение: окно просмотра ----
+def sync_view():
+    # изменённое на холсте-окне -> в плитки
+    r = cv.dirty_rect()
+    if image is not None and r:
+        with cv:
+            image.write(view[0], view[1], cv.px, r)
+
+def load_view(x, y):
+    # сдвинуть окно просмотра; вызывающий перерисовывает экран целиком
+    global view
+    sync_view()
+    cv.take_dirty()
+    x = max(0, min(x, image.w - cv.w))
+    y = max(0, min(y, image.h - cv.h))
+    view = (x, y, cv.w, cv.h)
+    with cv:
+        cv.will_write(0, 0, cv.w - 1, cv.h - 1)
+        cv.px[...] = image.read(view)
+    history.tag = view
+    if region_index is not None:
+        region_index.watch(cv)   # окно перечитано целиком — разметить заново
+    ring_cache.reset()     # кэш колец — в координатах окна
+    line_pts.clear()
+    tri_pts.clear()
+    pygame.display.set_caption(f"Raster tasks: {image.w}x{image.h}, view at {x},{y}")
+
+def refresh_view(rect):
+    # перечитать из плиток часть окна просмотра, попавшую в rect (координаты изображения)
+    x, y, w, h = rect
+    vx, vy, vw, vh = view
+    x0, y0, x1, y1 = max(x, vx), max(y, vy), min(x + w, vx + vw), min(y + h, vy + vh)
+    if x0 < x1 and y0 < y1:
+        with cv:
+            cv.will_write(x0-vx, y0-vy, x1-vx-1, y1-vy-1)
+            cv.px[y0-vy:y1-vy, x0-vx:x1-vx] = image.read((x0, y0, x1-x0, y1-y0))
+            cv.touch(x0-vx, y0-vy, x1-vx-1, y1-vy-1)
+
+def run_window(name, pos, rect, win, fn, args):
+    # операция над окном изображения rect (Canvas win) шире окна просмотра: сразу, не в фоне
+    tag, history.tag = history.tag, rect
+    history.begin(win)
+    with profiler.op(name, win, x=pos[0], y=pos[1]):
+        fn(win, *args)
+    r = win.dirty_rect()
+    history.end(win, r or (0, 0, 0, 0))
+    history.tag = tag
+    if r:
+        image.write(rect[0], rect[1], win.arr, r)
+        refresh_view((rect[0] + r[0], rect[1] + r[1], r[2], r[3]))
+
+def run_region(name, pos, passable, fn, make_args, rec=None):
+    # заливки и граница: область может выходить за окно просмотра — тогда окно изображения
+    # растёт до охвата области (region_window). make_args(wx, wy) — аргументы fn для окна
+    # с левым верхним углом (wx, wy) в координатах изображения; rec — как у run_tool.
+    if image is not None:
+        sync_view()
+        rect, win = region_window(image, (view[0] + pos[0], view[1] + pos[1]), passable, view, cv,
+                                  REGION_WINDOW_MAX)
+        if rect is None:
+            print(f"{name}: region needs a window over {REGION_WINDOW_MAX} px, skipped")
+            return
+        if rect != view:
+            run_window(name, pos, rect, win, fn, make_args(rect[0], rect[1]))
+            return
+    run_tool(name, pos, fn, *make_args(view[0], view[1]), rec=rec)
+
+def log_action(name, *fields):
+    # действие -> журнал сессии; раз в JOURNAL_KEYFRAME_EVERY действий — снимок холста
+    if journal is None:
+        return
+    journal.record(name, fields, BORDER_COLORS)
+    if journal.due():
+        journal.keyframe(cv, pattern_pixels(pattern_img))
+
+def indexed_fill(name):
+    # заливка по карте областей — одна запись в массив, в фон её не отправляем
+    return (name in (TOOL_FILL_COLOR, TOOL_FILL_IMG) and region_index is not None
+            and region_index.usable(cv, FILL_TOLERANCE, FILL_ANTIALIAS))
+
+def run_tool(name, pos, fn, *args, rec=None):
+    # fn(холст, *args): сразу или фоновой операцией; профилируется в обоих случаях.
+    # rec — поля действия для журнала (см. journal.ACTIONS[name]); фоновое пишется, когда доделано
+    global job, job_rec
+    info = {"x": pos[0], "y": pos[1]}
+    if BACKGROUND_OPS and name in BACKGROUND_TOOLS and not indexed_fill(name):
+        # кольца — не в процесс: их кэш (ring_cache) живёт здесь
+        process = BACKGROUND_PROCESS and name == TOOL_BOUNDARY and BOUNDARY_MODE != "rings"
+        job = CanvasJob(name, cv, fn, args, profiler, info, process)
+        job_rec = (name, rec) if rec is not None else None
+        return
+    history.begin(cv)
+    with profiler.op(name, cv, **info):
+        fn(cv, *args)
+    history.end(cv, cv.dirty_rect() or (0, 0, 0, 0))
+    if rec is not None:
+        log_action(name, *rec)
+
+def cancel_job():
+    global job
+    if job is not None:
+        job.cancel()
+        job = None
+
+def finish_job():
+    # перенос полос фоновой операции; законченная — в историю
+    global job
+    if job.commit():
+        if not job.cancelled and job.rect is not None:
+            history.add(cv, job.orig, job.rect, job.borders)
+        if not job.cancelled and job_rec is not None:
+            log_action(job_rec[0], *job_rec[1])
+        job = None
+
+def undo_redo(redo=False):
+    cancel_job()
+    history.end(cv)   # незакрытый мазок кисти — отдельной записью
+    line_pts.clear()
+    tri_pts.clear()
+    d = history.peek(redo)
+    step = history.redo if redo else history.undo
+    with profiler.op("redo" if redo else "undo", cv):
+        if d is None or image is None or d.tag == view:
+            if step(cv):
+                log_action("patch", d.starts, d.lengths, d.after if redo else d.before)
+            return
+        # запись сделана в другом окне изображения — применяем к нему прямо в плитках
+        sync_view()
+        win = Canvas(image.read(d.tag))
+        step(win)
+        r = win.take_dirty()
+        if r:
+            image.write(d.tag[0], d.tag[1], win.arr, r)
+            refresh_view((d.tag[0] + r[0], d.tag[1] + r[1], r[2], r[3]))
 
 # -------------------- UI: кнопки и палитры --------------------
 class Button:
@@ -394,19 +349,90 @@ def draw_palette(x0, y0, label, current_color, rects_list):
         if c == current_color:
             pygame.draw.rect(screen, (0, 0, 0), r.inflate(4, 4), 2)
 
+def draw_toolbar():
+    # панель перерисовывается только при смене инструмента или цвета
+    screen.fill((235, 235, 235), (0, 0, WIDTH, UI_HEIGHT))
+    for b in buttons:
+        b.draw(active=(b.tool_id == tool))
+    draw_palette(10, 55, "Кисть:", brush_color, brush_palette_rects)
+    draw_palette(300, 55, "Заливка:", fill_color, fill_palette_rects)
+    draw_text("ЛКМ по холсту — действие текущего инструмента. ПКМ — сохранить. F3 — профиль",
+              10, 105, (40, 40, 40))
+
+def blit_canvas(r):
+    # участок холста r (в координатах холста) -> экран; -> прямоугольник экрана
+    r = pygame.Rect(r).clip(canvas.get_rect())
+    screen.blit(canvas, (r.x, r.y + UI_HEIGHT), r)
+    return r.move(0, UI_HEIGHT)
+
+def draw_profile():
+    # полупрозрачная плашка в левом нижнем углу холста; -> прямоугольник экрана
+    lines = profiler.lines()
+    h = 6 + 18*len(lines)
+    panel = pygame.Surface((WIDTH - 20, h), pygame.SRCALPHA)
+    panel.fill((0, 0, 0, 160))
+    y0 = HEIGHT - 10 - h
+    screen.blit(panel, (10, y0))
+    for i, s in enumerate(lines):
+        draw_text(s, 16, y0 + 3 + 18*i, (255, 255, 255))
+    return pygame.Rect(10, y0, WIDTH - 20, h)
+
 # -------------------- Главный цикл --------------------
 def main():
-    global tool, brush_color, fill_color, last_pos, line_pts, tri_pts
+    global tool, brush_color, fill_color, last_pos, line_pts, tri_pts, show_profile
 
+    init_app()
     clock = pygame.time.Clock()
     drawing = False
+    # экран хранит прошлый кадр: перерисовываются только изменившиеся прямоугольники
+    full_redraw = True
+    drawn_ui = None          # (инструмент, цвета), с которыми нарисована панель
+    profile_rect = None      # где сейчас оверлей профиля
+    drawn_ops = -1           # profiler.count на момент отрисовки оверлея
 
     while True:
-        for e in pygame.event.get():
+        events = pygame.event.get()
+        if not events and job is None:
+            # ничего не происходит и ничего не изменилось — спим до события
+            events = [pygame.event.wait()]
+        t_frame = time.perf_counter()
+        for e in events:
             if e.type == pygame.QUIT:
+                saver.close()   # дописать поставленные в очередь файлы
+                profiler.flush()
+                if journal is not None:
+                    journal.close()
+                if image is not None:
+                    sync_view()
+                    image.flush()
                 pygame.quit()
                 sys.exit()
 
+            elif e.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                full_redraw = True
+
+            elif e.type == pygame.KEYDOWN:
+                if e.key == pygame.K_F3:
+                    show_profile = not show_profile
+                    drawn_ops = -1
+                elif e.key == pygame.K_ESCAPE:
+                    cancel_job()
+                elif e.key == pygame.K_z and e.mod & pygame.KMOD_CTRL:
+                    undo_redo(redo=bool(e.mod & pygame.KMOD_SHIFT))
+                elif e.key == pygame.K_y and e.mod & pygame.KMOD_CTRL:
+                    undo_redo(redo=True)
+                elif e.key in SCROLL_KEYS and image is not None:
+                    # прокрутка на пол-окна; незаконченное (фон, мазок) завершается в старом окне
+                    cancel_job()
+                    history.end(cv)
+                    drawing = False
+                    dx, dy = SCROLL_KEYS[e.key]
+                    load_view(view[0] + dx*cv.w//2, view[1] + dy*cv.h//2)
+                    full_redraw = True
+                elif e.key == pygame.K_F4:
+                    profiler.trace_memory = not profiler.trace_memory
+                    print(f"profile memory: {profiler.trace_memory}")
+
             elif e.type == pygame.MOUSEBUTTONDOWN:
                 if e.button == 1:
                     # клик по UI?
@@ -415,7 +441,15 @@ def main():
                         for b in buttons:
                             if b.hit(e.pos):
                                 if b.tool_id is None:   # очистка
-                                    canvas.fill(BG)
+                                    cancel_job()
+                                    history.begin(cv)
+                                    with profiler.op("clear", cv):
+                                        with cv:
+                                            cv.will_write(0, 0, cv.w - 1, cv.h - 1)
+                                        canvas.fill(BG)
+                                        cv.touch(0, 0, cv.w - 1, cv.h - 1)
+                                    history.end(cv)
+                                    log_action("clear", *BG)
                                     line_pts.clear()
                                     tri_pts.clear()
                                 else:
@@ -431,69 +465,65 @@ def main():
                     else:
                         # клик по холсту
                         x, y = e.pos[0], e.pos[1]-UI_HEIGHT
+                        if not cv.in_bounds(x, y):   # изображение меньше окна
+                            continue
+                        ix, iy = view[0] + x, view[1] + y   # точка изображения (без плиток — та же)
+
+                        # новый клик по холсту отменяет незавершённую фоновую операцию
+                        cancel_job()
 
                         if tool == TOOL_DRAW:
-                            drawing = True
-                            last_pos = (x,y)
-                            pygame.draw.circle(canvas, brush_color, (x,y), 1)
+                            history.begin(cv)   # мазок целиком — одна запись, закрывается по отпусканию
+                            with profiler.op(tool, cv, x=x, y=y):
+                                drawing = True
+                                last_pos = (x,y)
+                                with cv:
+                                    cv.will_write(x - 1, y - 1, x + 1, y + 1)
+                                r = pygame.draw.circle(canvas, brush_color, (x,y), 1)
+                                cv.touch(r.left, r.top, r.right - 1, r.bottom - 1)
+                            log_action("dot", x, y, *brush_color)
 
                         elif tool == TOOL_FILL_COLOR:
-                            target = get_px(canvas, x,y)
-                            scanline_fill_color(canvas, (x,y), target, fill_color)
+                            with cv:
+                                target = cv.get(x,y)
+                            run_region(tool, (x, y), lambda c: c.match(target, FILL_TOLERANCE, FILL_METRIC),
+                                       scanline_fill_color,
+                                       lambda wx, wy: ((ix-wx, iy-wy), target, fill_color,
+                                                       FILL_TOLERANCE, FILL_METRIC, FILL_ANTIALIAS, region_index),
+                                       rec=(ix, iy, *fill_color, FILL_TOLERANCE, METRICS.index(FILL_METRIC),
+                                            FILL_ANTIALIAS))
 
 
                         elif tool == TOOL_FILL_IMG:
 
-                            target = get_px(canvas, x, y)
-
-                            # --- выбрать режим тайлинга ---
-
-                            if PATTERN_MODE == "stamp":
-
-                                tiled = False
-
-                            else:
-
-                                tiled = True
+                            with cv:
+                                target = cv.get(x, y)
 
-                            # --- задать якорь (anchor) ---
+                            # режим тайлинга и якорь (anchor) — см. pattern_anchor
+                            tiled = PATTERN_MODE != "stamp"
+                            ax, ay = pattern_anchor((ix, iy), pattern_img.get_size(), PATTERN_MODE, PATTERN_ANCHOR)
 
-                            ax, ay = x, y
-
-                            if PATTERN_ANCHOR == "center":
-                                ax = x - pattern_img.get_width() // 2
-
-                                ay = y - pattern_img.get_height() // 2
-
-                            if PATTERN_MODE == "tile_fixed":
-                                ax, ay = 0, 0  # узор «привязан» к левому верхнему углу холста
-
-                            scanline_fill_pattern(canvas, (x, y), target, pattern_img, (ax, ay), tiled=tiled)
+                            run_region(tool, (x, y), lambda c: c.match(target, FILL_TOLERANCE, FILL_METRIC),
+                                       scanline_fill_pattern,
+                                       lambda wx, wy: ((ix-wx, iy-wy), target, pattern_img, (ax-wx, ay-wy),
+                                                       tiled, FILL_TOLERANCE, FILL_METRIC, FILL_ANTIALIAS,
+                                                       region_index),
+                                       rec=(ix, iy, ax, ay, tiled, FILL_TOLERANCE, METRICS.index(FILL_METRIC),
+                                            FILL_ANTIALIAS))
 
                         elif tool == TOOL_BOUNDARY:
-
-                            inner = inner_contour_from_inside(canvas, (x, y))
-
-                            # рисуем обводку текущим цветом заливки (или любым вашим)
-
-                            draw_points(canvas, inner, fill_color)
-
-                            # добавляем ЭТОТ цвет в множество границ, чтобы следующее нажатие рисовало ещё глубже
-
-                            if fill_color != BG:  # на всякий случай не добавляем белый фон
-
-                                BORDER_COLORS.add(fill_color)
-
-                            print(f"inner-contour points: {len(inner)}; barrier colors: {len(BORDER_COLORS)}")
+                            run_region(tool, (x, y), lambda c: ~border_mask(c), boundary_tool,
+                                       lambda wx, wy: ((ix-wx, iy-wy), fill_color),
+                                       rec=(ix, iy, *fill_color, BOUNDARY_MODES.index(BOUNDARY_MODE),
+                                            -1 if RING_COUNT is None else RING_COUNT, RING_STEP))
 
                         elif tool in (TOOL_BRESENHAM, TOOL_WU):
                             line_pts.append((x, y))
                             if len(line_pts) >= 2:
                                 (x0,y0),(x1,y1) = line_pts[-2], line_pts[-1]
-                                if tool == TOOL_BRESENHAM:
-                                    bresenham_line(canvas, x0,y0,x1,y1, brush_color)
-                                else:
-                                    wu_line(canvas, x0,y0,x1,y1, brush_color)
+                                draw = bresenham_line if tool == TOOL_BRESENHAM else wu_line
+                                run_tool(tool, (x, y), draw, x0,y0,x1,y1, brush_color,
+                                         rec=(x0, y0, x1, y1, *brush_color))
                             if len(line_pts) > 2:
                                 line_pts = line_pts[-2:]
 
@@ -501,43 +531,75 @@ def main():
                             tri_pts.append((x, y))
                             if len(tri_pts) == 3:
                                 A, B, C = tri_pts[-3], tri_pts[-2], tri_pts[-1]
-                                fill_triangle_barycentric(canvas, A, B, C,
-                                                          (255, 0, 0), (0, 255, 0), (0, 128, 255))
+                                cols = ((255, 0, 0), (0, 255, 0), (0, 128, 255))
+                                run_tool(tool, (x, y), fill_triangle_barycentric, A, B, C, *cols,
+                                         rec=(*A, *B, *C, *cols[0], *cols[1], *cols[2]))
                                 tri_pts.clear()
 
                 elif e.button == 3:
-                    # ПКМ — сохранить PNG
-                    pygame.image.save(canvas, "out.png")
-                    print("Saved to out.png")
+                    # ПКМ — сохранить: здесь только снимок холста, запись — в потоке saver
+                    if image is None:
+                        saver.save(cv)
+                    else:   # всё изображение, полосами из плиток
+                        sync_view()
+                        saver.export(image)
 
             elif e.type == pygame.MOUSEBUTTONUP and e.button == 1:
+                if drawing:
+                    history.end(cv)
                 drawing = False
                 last_pos = None
 
             elif e.type == pygame.MOUSEMOTION and drawing and tool == TOOL_DRAW:
                 x, y = e.pos[0], e.pos[1]-UI_HEIGHT
                 if last_pos:
-                    pygame.draw.line(canvas, brush_color, last_pos, (x,y), 3)
+                    with profiler.op(TOOL_DRAW, cv, x=x, y=y):
+                        with cv:   # линия толщины 3 — не дальше 2 пикселей от концов по охвату
+                            cv.will_write(min(last_pos[0], x) - 2, min(last_pos[1], y) - 2,
+                                          max(last_pos[0], x) + 2, max(last_pos[1], y) + 2)
+                        r = pygame.draw.line(canvas, brush_color, last_pos, (x,y), 3)
+                        cv.touch(r.left, r.top, r.right - 1, r.bottom - 1)
+                    log_action("stroke", *last_pos, x, y, *brush_color)
                 last_pos = (x,y)
 
-        # рендер UI
-        screen.fill((235, 235, 235))
-        # кнопки
-        for b in buttons:
-            b.draw(active=(b.tool_id == tool))
-
-        # палитры
-        draw_palette(10, 55, "Кисть:", brush_color, brush_palette_rects)
-        draw_palette(300, 55, "Заливка:", fill_color, fill_palette_rects)
-
-        # холст
-        screen.blit(canvas, (0, UI_HEIGHT))
-        pygame.draw.rect(screen, (150,150,150), (0, UI_HEIGHT, WIDTH, HEIGHT-UI_HEIGHT), 1)
-
-        # подсказки
-        draw_text("ЛКМ по холсту — действие текущего инструмента. ПКМ — сохранить out.png", 10, 105, (40, 40, 40))
-
-        pygame.display.flip()
+        # готовый результат фоновой операции — на холст, по нескольку полос за кадр
+        if job is not None:
+            finish_job()
+
+        # рендер: панель — при смене состояния, холст — по изменённой области инструментов
+        dirty = []
+        if full_redraw or drawn_ui != (tool, brush_color, fill_color):
+            draw_toolbar()
+            drawn_ui = (tool, brush_color, fill_color)
+            dirty.append(pygame.Rect(0, 0, WIDTH, UI_HEIGHT))
+
+        sync_view()
+        r = cv.take_dirty()
+        if full_redraw:
+            r = canvas.get_rect()
+        if r:
+            r = blit_canvas(r)
+            dirty.append(r)
+            pygame.draw.rect(screen, (150,150,150), (0, UI_HEIGHT, WIDTH, HEIGHT-UI_HEIGHT), 1)
+
+        # оверлей профиля: после каждой операции или если холст под ним перерисован
+        if (show_profile and drawn_ops != profiler.count) or (profile_rect and not show_profile) or \
+                (show_profile and profile_rect and r and profile_rect.colliderect(r)):
+            if profile_rect:
+                dirty.append(blit_canvas(profile_rect.move(0, -UI_HEIGHT)))
+                profile_rect = None
+            if show_profile:
+                profile_rect = draw_profile()
+                drawn_ops = profiler.count
+                dirty.append(profile_rect)
+        full_redraw = False
+
+        if dirty:
+            if len(dirty) > 16:
+                dirty = [dirty[0].unionall(dirty[1:])]
+            pygame.display.update(dirty)
+            # время кадра — обработка событий и отрисовка, без ожидания в tick
+            profiler.frame(time.perf_counter() - t_frame)
         clock.tick(120)
 
 if __name__ == "__main__":
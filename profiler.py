@@ -0,0 +1,135 @@
+# Профилирование операций инструментов (без окна):
+#   with prof.op("fill_color", cv): ...   — время, тронутые пиксели, пиксели/с, пиковая память
+#   prof.frame(seconds)                   — время кадра цикла отрисовки
+#   prof.flush()                          — дописать накопленные записи (при выходе)
+# Каждая операция — строка JSONL-журнала (с ротацией по размеру); записи копятся в памяти
+# и дописываются пачкой по PROFILE_LOG_BATCH, а не открытием файла на каждое движение кисти.
+# Тронутые пиксели считаются по raster.Backup — только в плитках, куда операция писала.
+# При PROFILE_CPROFILE самая медленная операция сессии сохраняется в .prof для pstats/snakeviz.
+# Отменённая (raster.Cancelled) или упавшая операция пишется в журнал с полем status и не
+# попадает ни в последнюю, ни в самую медленную.
+import os, json, time, cProfile, threading, tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+from raster import Backup, Cancelled
+
+PROFILE_LOG = "ops_log.jsonl"        # None — не писать журнал
+PROFILE_LOG_MAX_BYTES = 1 << 20      # журнал больше — переименовывается в .1 и начинается заново
+PROFILE_LOG_BATCH = 64               # записей в памяти до дозаписи в журнал
+PROFILE_SLOWEST = "slowest_op.prof"  # куда сохранять cProfile самой медленной операции
+FRAME_WINDOW = 120                   # по скольким кадрам считать среднее/максимум
+
+class OpProfiler:
+    """Счётчики операций и кадров.
+
+    trace_memory — мерить пиковую память через tracemalloc (замедляет саму операцию),
+    cprofile     — гонять каждую операцию под cProfile и хранить профиль самой медленной.
+    """
+    def __init__(self, log_path=PROFILE_LOG, trace_memory=False, cprofile=False,
+                 slowest_path=PROFILE_SLOWEST, log_max_bytes=PROFILE_LOG_MAX_BYTES,
+                 log_batch=PROFILE_LOG_BATCH):
+        self.log_path = log_path
+        self.log_max_bytes = log_max_bytes
+        self.log_batch = log_batch
+        self.pending = []       # записи, ещё не дописанные в журнал
+        self.lock = threading.Lock()   # op бывает и в потоке фоновой операции
+        self.slowest_path = slowest_path
+        self.trace_memory = trace_memory
+        self.cprofile = cprofile
+        self.last = None        # запись последней операции
+        self.slowest = None     # запись самой медленной операции сессии
+        self.count = 0
+        self.frames = deque(maxlen=FRAME_WINDOW)
+
+    @contextmanager
+    def op(self, name, cv, **info):
+        """Замерить операцию над холстом cv; info — доп. поля записи (координаты, режим)."""
+        backup = Backup(cv)
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        prof = cProfile.Profile() if self.cprofile else None
+        t0 = time.perf_counter()
+        if prof:
+            prof.enable()
+        status = None
+        try:
+            yield
+        except Cancelled:
+            status = "cancelled"
+            raise
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            if prof:
+                prof.disable()
+            dt = time.perf_counter() - t0
+            backup.close()
+            peak = None
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            with cv:
+                changed = backup.count_changed(cv.dirty_rect())
+            rec = dict(info, op=name, t=round(time.time(), 3), seconds=dt, pixels=changed,
+                       pixels_per_s=changed / dt if dt > 0 else 0.0, peak_bytes=peak, size=[cv.w, cv.h])
+            if status:
+                rec["status"] = status
+            self._record(rec, prof)
+
+    def _record(self, rec, prof):
+        if "status" not in rec:   # недоделанная операция — только в журнал
+            self.count += 1
+            self.last = rec
+            if self.slowest is None or rec["seconds"] > self.slowest["seconds"]:
+                self.slowest = rec
+                if prof and self.slowest_path:
+                    prof.dump_stats(self.slowest_path)
+        if self.log_path:
+            with self.lock:
+                self.pending.append(rec)
+                if len(self.pending) >= self.log_batch:
+                    self._write()
+
+    def flush(self):
+        """Дописать в журнал накопленные записи."""
+        if self.log_path:
+            with self.lock:
+                self._write()
+
+    def _write(self):
+        if not self.pending:
+            return
+        try:
+            if os.path.getsize(self.log_path) > self.log_max_bytes:
+                os.replace(self.log_path, self.log_path + ".1")
+        except OSError:
+            pass
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in self.pending))
+        self.pending.clear()
+
+    def frame(self, seconds):
+        self.frames.append(seconds)
+
+    def frame_stats(self):
+        """-> (среднее, максимум) времени кадра в секундах по последним FRAME_WINDOW кадрам."""
+        if not self.frames:
+            return 0.0, 0.0
+        return sum(self.frames) / len(self.frames), max(self.frames)
+
+    def lines(self):
+        """Строки для оверлея."""
+        avg, worst = self.frame_stats()
+        out = [f"frame: {avg*1000:.1f} ms avg, {worst*1000:.1f} ms max; ops: {self.count}"]
+        for label, r in (("last", self.last), ("slowest", self.slowest)):
+            if r is None:
+                continue
+            s = (f"{label}: {r['op']} {r['seconds']*1000:.1f} ms, {r['pixels']} px, "
+                 f"{r['pixels_per_s']/1e6:.2f} Mpx/s")
+            if r["peak_bytes"] is not None:
+                s += f", peak {r['peak_bytes']/2**20:.1f} MB"
+            out.append(s)
+        return out
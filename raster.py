@@ -0,0 +1,1755 @@
+# Растровые алгоритмы без UI: линии (Брезенхем, Ву), градиентные треугольники и сетки,
+# заливки (цветом, рисунком) и индекс областей для повторных заливок, выделение границы (1в).
+# Импорт без побочных эффектов: ни pygame.init, ни окна — только numpy. pygame нужен,
+# лишь если работать с pygame.Surface (см. Canvas); холст может быть и массивом numpy.
+import os, math, time
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+BG = (255, 255, 255)
+BORDER_COLOR = (0, 0, 0)   # цвет «границы» для режима 1в (обход границы)
+BOUNDARY_SIMPLIFY_EPS = 1.5  # допуск Дугласа–Пекера для ломаной контура (пиксели)
+
+# -------------------- Утилиты --------------------
+def pack_rgb(color):
+    """(r, g, b) -> одно целое 0xRRGGBB: сравнивать числа дешевле, чем кортежи."""
+    return (color[0] << 16) | (color[1] << 8) | color[2]
+
+def color_distance(px, color, metric="channel"):
+    """Расстояние цветов (..., 3) до color: "channel" — max |разность| по каналам, "euclid" — в RGB."""
+    d = px.astype(np.int32) - np.asarray(color[:3], dtype=np.int32)
+    if metric == "euclid":
+        return np.sqrt((d*d).sum(axis=-1))
+    return np.abs(d).max(axis=-1)
+
+# -------------------- Доступ к пикселям --------------------
+class Canvas:
+    """
+    Массивный доступ к пикселям вместо get_at/set_at на каждый пиксель.
+    target — pygame.Surface (24/32 бит) или массив numpy (h, w, 3) uint8 (без pygame вовсе).
+    Поверхность блокируется один раз на операцию:  with cv: ...
+    (вложенные with не блокируют повторно).
+    Внутри блока cv.px[y, x] -> (r, g, b) uint8 — представление (view) пикселей,
+    запись в него сразу меняет Surface / массив.
+    Все записи отмечают изменённую область (touch*); take_dirty() отдаёт её
+    охватывающий прямоугольник — по нему интерфейс перерисовывает только нужное.
+    Перед записью — will_write*(область): открытые Backup сохраняют прежние пиксели.
+    """
+    def __init__(self, target):
+        if isinstance(target, np.ndarray):
+            self.surf, self.arr = None, target
+            self.h, self.w = target.shape[:2]
+        else:
+            self.surf, self.arr = target, None
+            self.w, self.h = target.get_size()
+        self.px = None
+        self._depth = 0
+        self.dirty = None      # [x0, y0, x1, y1] включительно — изменено с последнего take_dirty
+        self.watchers = []     # f(x0, y0, x1, y1) на каждую отметку (напр. RegionIndex)
+        self.backups = []      # открытые Backup: получают области до записи в них
+        self.borders = None    # свой набор цветов-границ (фоновая операция); None — общий BORDER_COLORS
+        self.stop = None       # threading.Event фоновой операции: длинные циклы бросают Cancelled
+
+    @classmethod
+    def blank(cls, w, h, color=BG):
+        """Холст-массив w x h, залитый color."""
+        return cls(np.full((h, w, 3), color[:3], dtype=np.uint8))
+
+    def __enter__(self):
+        if self._depth == 0:
+            if self.surf is None:
+                self.px = self.arr
+            else:
+                from pygame import surfarray   # pygame нужен только для Surface
+                # pixels3d даёт [x, y, c]; транспонируем в построчный [y, x, c] (тоже view)
+                self.px = surfarray.pixels3d(self.surf).transpose(1, 0, 2)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            self.px = None   # отпускаем view -> Surface разблокируется
+        return False
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.w and 0 <= y < self.h
+
+    def check_stop(self):
+        """Операцию отменили — прервать её (Cancelled). Фоновая операция заодно отдаёт GIL."""
+        if self.stop is not None:
+            if self.stop.is_set():
+                raise Cancelled()
+            time.sleep(0)
+
+    # --- до записи: прежнее содержимое для Backup (отмена, профиль) ---
+    def will_write(self, x0, y0, x1, y1):
+        """Сейчас будет записан прямоугольник [x0..x1] x [y0..y1] (включительно)."""
+        for b in self.backups:
+            b.save(x0, y0, x1, y1)
+
+    def will_write_points(self, xs, ys):
+        """Сейчас будут записаны точки (xs, ys); точки вне холста не в счёт."""
+        for b in self.backups:
+            b.save_points(xs, ys)
+
+    def will_write_spans(self, ys, xl, xr):
+        """Сейчас будут записаны отрезки строк [xl..xr] на ys (в пределах холста, xl <= xr)."""
+        for b in self.backups:
+            b.save_spans(ys, xl, xr)
+
+    def will_write_mask(self, mask, x=0, y=0):
+        """Сейчас будут записаны истинные пиксели mask (левый верхний угол — (x, y))."""
+        if not self.backups:
+            return
+        rows = np.flatnonzero(mask.any(axis=1))
+        if rows.size:
+            cols = np.flatnonzero(mask.any(axis=0))
+            self.will_write(x + cols[0], y + rows[0], x + cols[-1], y + rows[-1])
+
+    # --- изменённая область ---
+    def touch(self, x0, y0, x1, y1):
+        """Отметить изменённым прямоугольник [x0..x1] x [y0..y1] (включительно)."""
+        x0, y0 = max(int(x0), 0), max(int(y0), 0)
+        x1, y1 = min(int(x1), self.w - 1), min(int(y1), self.h - 1)
+        if x0 > x1 or y0 > y1:
+            return
+        d = self.dirty
+        if d is None:
+            self.dirty = [x0, y0, x1, y1]
+        else:
+            d[0], d[1], d[2], d[3] = min(d[0], x0), min(d[1], y0), max(d[2], x1), max(d[3], y1)
+        for f in self.watchers:
+            f(x0, y0, x1, y1)
+
+    def touch_points(self, xs, ys):
+        if len(xs):
+            self.touch(np.min(xs), np.min(ys), np.max(xs), np.max(ys))
+
+    def touch_mask(self, mask, x=0, y=0):
+        """Отметить охват истинных пикселей mask (левый верхний угол маски — (x, y))."""
+        rows = np.flatnonzero(mask.any(axis=1))
+        if rows.size:
+            cols = np.flatnonzero(mask.any(axis=0))
+            self.touch(x + cols[0], y + rows[0], x + cols[-1], y + rows[-1])
+
+    def dirty_rect(self):
+        """-> (x, y, w, h) изменённого с прошлого take_dirty или None."""
+        d = self.dirty
+        if d is None:
+            return None
+        return d[0], d[1], d[2] - d[0] + 1, d[3] - d[1] + 1
+
+    def take_dirty(self):
+        """То же, что dirty_rect, и сбросить отметку."""
+        r = self.dirty_rect()
+        self.dirty = None
+        return r
+
+    # --- одиночные пиксели (для редких обращений, напр. цвет под кликом) ---
+    def get(self, x, y):
+        return tuple(self.px[y, x].tolist())
+
+    def set(self, x, y, color):
+        self.will_write(x, y, x, y)
+        self.px[y, x] = color[:3]
+        self.touch(x, y, x, y)
+
+    # --- чтение массивами ---
+    def keys(self):
+        """Весь холст как (h, w) int32 упакованных 0xRRGGBB."""
+        return self.keys_of(self.px)
+
+    def match(self, color, tolerance=0, metric="channel"):
+        """Маска (h, w) пикселей, близких к color не дальше tolerance (см. color_distance)."""
+        if tolerance <= 0:   # поканально: без упакованных ключей int32 (4+ байта на пиксель)
+            m = self.px[..., 0] == color[0]
+            m &= self.px[..., 1] == color[1]
+            m &= self.px[..., 2] == color[2]
+            return m
+        return color_distance(self.px, color, metric) <= tolerance
+
+    @staticmethod
+    def keys_of(pixels):
+        """Упаковать массив цветов (..., 3) в 0xRRGGBB."""
+        p = pixels.astype(np.int32)
+        return (p[..., 0] << 16) | (p[..., 1] << 8) | p[..., 2]
+
+    def key_rows(self):
+        """Весь холст как список строк упакованных цветов (быстрый доступ из Python)."""
+        return self.keys().tolist()
+
+    def row(self, y):
+        """Строка y: view (w, 3)."""
+        return self.px[y]
+
+    def gather(self, xs, ys):
+        """Цвета набора точек: (n, 3)."""
+        return self.px[np.asarray(ys), np.asarray(xs)]
+
+    # --- запись массивами ---
+    def hspan(self, y, x0, x1, color):
+        """Закрасить отрезок строки [x0..x1] (включительно) одним цветом или (n, 3) цветами."""
+        self.will_write(x0, y, x1, y)
+        self.px[y, x0:x1 + 1] = color
+        self.touch(x0, y, x1, y)
+
+    def block(self, x, y, mask, colors):
+        """Записать цвета в прямоугольник с левым верхним углом (x, y) там, где mask истинна.
+        colors — один цвет, массив (mh, mw, 3) или (mask.sum(), 3)."""
+        mh, mw = mask.shape
+        self.will_write_mask(mask, x, y)
+        dst = self.px[y:y + mh, x:x + mw]
+        if isinstance(colors, np.ndarray) and colors.shape[:2] == mask.shape:
+            colors = colors[mask]
+        dst[mask] = colors
+        self.touch_mask(mask, x, y)
+
+    def scatter(self, xs, ys, colors):
+        """Записать цвета в набор точек; точки вне холста отбрасываются."""
+        xs = np.asarray(xs, dtype=np.intp)
+        ys = np.asarray(ys, dtype=np.intp)
+        ok = (xs >= 0) & (xs < self.w) & (ys >= 0) & (ys < self.h)
+        if isinstance(colors, np.ndarray) and colors.ndim == 2:
+            colors = colors[ok]
+        self.will_write_points(xs[ok], ys[ok])
+        self.px[ys[ok], xs[ok]] = colors
+        self.touch_points(xs[ok], ys[ok])
+
+class Cancelled(Exception):
+    """Фоновую операцию отменили посреди счёта (Canvas.stop)."""
+
+STOP_EVERY = 256   # длинные циклы проверяют отмену раз в столько шагов
+                   # и там же отдают GIL главному потоку (time.sleep(0)), чтобы окно не ждало кадр
+
+BACKUP_TILE = 64   # сторона плитки Backup
+
+class Backup:
+    """
+    Прежнее содержимое холста там, куда писали, пока Backup открыт:
+    плитка BACKUP_TILE x BACKUP_TILE копируется при первой записи в неё (Canvas.will_write*).
+    Вместо копии всего холста перед операцией — O(тронутых плиток).
+        b = Backup(cv); <операция>; b.close(); b.changes()
+    """
+    def __init__(self, cv, tile=BACKUP_TILE):
+        self.cv, self.tile = cv, tile
+        self.tiles = {}        # (ty, tx) -> прежние пиксели плитки
+        self.ntx = -(-cv.w // tile)
+        cv.backups.append(self)
+
+    def close(self):
+        if self in self.cv.backups:
+            self.cv.backups.remove(self)
+
+    def _copy(self, keys):
+        t, px = self.tile, self.cv.px
+        for k in keys:
+            if k not in self.tiles:
+                ty, tx = k
+                self.tiles[k] = px[ty*t:(ty+1)*t, tx*t:(tx+1)*t].copy()
+
+    def save(self, x0, y0, x1, y1):
+        t = self.tile
+        x0, y0 = max(int(x0), 0), max(int(y0), 0)
+        x1, y1 = min(int(x1), self.cv.w - 1), min(int(y1), self.cv.h - 1)
+        if x0 > x1 or y0 > y1:
+            return
+        self._copy((ty, tx) for ty in range(y0 // t, y1 // t + 1) for tx in range(x0 // t, x1 // t + 1))
+
+    def save_points(self, xs, ys):
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        ok = (xs >= 0) & (xs < self.cv.w) & (ys >= 0) & (ys < self.cv.h)
+        if not ok.any():
+            return
+        keys = np.unique((ys[ok] // self.tile) * self.ntx + xs[ok] // self.tile)
+        self._copy(divmod(int(k), self.ntx) for k in keys)
+
+    def save_spans(self, ys, xl, xr):
+        t = self.tile
+        tx0, n = xl // t, xr // t - xl // t + 1   # плитки отрезка — по его концам, не по пикселям
+        tx = np.arange(int(n.sum())) - np.repeat(np.cumsum(n) - n - tx0, n)
+        keys = np.unique(np.repeat(ys // t, n) * self.ntx + tx)
+        self._copy(divmod(int(k), self.ntx) for k in keys)
+
+    def _diffs(self, rect):
+        """-> [(xa, ya, прежнее, текущее, маска изменённых), ...] по подряд идущим плиткам полос."""
+        t, px, w, h = self.tile, self.cv.px, self.cv.w, self.cv.h
+        rx0, ry0, rx1, ry1 = 0, 0, w, h
+        if rect is not None:
+            rx0, ry0 = max(rect[0], 0), max(rect[1], 0)
+            rx1, ry1 = min(rect[0] + rect[2], w), min(rect[1] + rect[3], h)
+        for ty, txs in _tile_bands(self.tiles):
+            ya, yb = max(ty*t, ry0), min((ty+1)*t, ry1)
+            for tx0, tx1 in txs:   # подряд идущие плитки полосы — одним сравнением
+                xa, xb = max(tx0*t, rx0), min(tx1*t, rx1)
+                if ya >= yb or xa >= xb:
+                    continue
+                old = np.concatenate([self.tiles[ty, tx] for tx in range(tx0, tx1)], axis=1)
+                b = old[ya - ty*t:yb - ty*t, xa - tx0*t:xb - tx0*t]
+                a = px[ya:yb, xa:xb]
+                yield xa, ya, b, a, (a != b).any(axis=2)
+
+    def changes(self, rect=None):
+        """
+        Изменённые пиксели в сохранённых плитках (и в rect = (x, y, w, h), если задан):
+        -> (idx, before, after) — плоский индекс y*w + x (по строкам внутри полосы плиток)
+        и цвета (n, 3) до/после.
+        """
+        idx, before, after = [], [], []
+        for xa, ya, b, a, changed in self._diffs(rect):
+            ys, xs = np.nonzero(changed)
+            if len(ys):
+                idx.append((ys + ya) * self.cv.w + (xs + xa))
+                before.append(b[changed])
+                after.append(a[changed])
+        if not idx:
+            return np.zeros(0, np.int64), np.zeros((0, 3), np.uint8), np.zeros((0, 3), np.uint8)
+        return np.concatenate(idx), np.concatenate(before), np.concatenate(after)
+
+    def count_changed(self, rect=None):
+        """Сколько пикселей изменилось (в rect, если задан)."""
+        return sum(int(changed.sum()) for *_, changed in self._diffs(rect))
+
+def _tile_bands(tiles):
+    """Ключи (ty, tx) -> [(ty, [(tx0, tx1), ...]), ...]: по полосам, подряд идущие плитки вместе."""
+    bands = {}
+    for ty, tx in sorted(tiles):
+        runs = bands.setdefault(ty, [])
+        if runs and runs[-1][1] == tx:
+            runs[-1][1] = tx + 1
+        else:
+            runs.append([tx, tx + 1])
+    return sorted(bands.items())
+
+# -------------------- Рисование линий --------------------
+def bresenham_line(cv, x0, y0, x1, y1, color):
+    xs, ys = [], []
+    dx = abs(x1 - x0)
+    dy = abs(y1 - y0)
+
+    sx = 1 if x1 > x0 else -1
+    sy = 1 if y1 > y0 else -1
+
+    if dy <= dx:
+        d = 2 * dy - dx
+        y = y0
+
+        for x in range(x0, x1 + sx, sx):
+            xs.append(x); ys.append(y)
+
+            if d >= 0:  # if di ≥ 0 then yi+1 = yi + 1
+                y += sy
+                d += 2 * (dy - dx)  # di+1 = di + 2(dy - dx)
+            else:  # if di < 0 then yi+1 = yi
+                d += 2 * dy  # di+1 = di + 2dy
+    else:
+        d = 2 * dx - dy
+        x = x0
+
+        for y in range(y0, y1 + sy, sy):
+            xs.append(x); ys.append(y)
+
+            if d >= 0:  # if di ≥ 0 then xi+1 = xi + 1
+                x += sx
+                d += 2 * (dx - dy)  # di+1 = di + 2(dx - dy)
+            else:  # if di < 0 then xi+1 = xi
+                d += 2 * dx  # di+1 = di + 2dx
+
+    # все пиксели отрезка — одной записью
+    with cv:
+        cv.scatter(xs, ys, color)
+
+def bresenham_pixels(segs, w, h):
+    """
+    Пиксели Брезенхема сразу для пакета отрезков segs (n, 4): x0, y0, x1, y1.
+    Те же пиксели, что у bresenham_line, но без цикла: на шаге i вдоль главной оси
+    смещение по второй оси равно (2*d_min*i + d_maj) // (2*d_maj).
+    Отсечение холстом [0, w) x [0, h): диапазон шагов сужается по главной оси,
+    остальное отбрасывается маской. -> (xs, ys, seg): пиксели в порядке отрезков и номер отрезка.
+    """
+    segs = np.asarray(segs, dtype=np.int64).reshape(-1, 4)
+    x0, y0, x1, y1 = segs.T
+    dx, dy = np.abs(x1 - x0), np.abs(y1 - y0)
+    sx = np.where(x1 > x0, 1, -1)
+    sy = np.where(y1 > y0, 1, -1)
+    xmaj = dy <= dx
+    dmaj = np.where(xmaj, dx, dy)
+    dmin = np.where(xmaj, dy, dx)
+    a0, amax, sa = np.where(xmaj, x0, y0), np.where(xmaj, w, h), np.where(xmaj, sx, sy)
+    b0, bmax, sb = np.where(xmaj, y0, x0), np.where(xmaj, h, w), np.where(xmaj, sy, sx)
+    # шаги i, при которых главная координата a0 + sa*i остаётся на холсте
+    lo = np.maximum(0, np.where(sa > 0, -a0, a0 - (amax - 1)))
+    hi = np.minimum(dmaj, np.where(sa > 0, amax - 1 - a0, a0))
+    n = np.maximum(hi - lo + 1, 0)
+    seg = np.repeat(np.arange(len(segs)), n)
+    i = np.arange(int(n.sum()), dtype=np.int64) - np.repeat(np.cumsum(n) - n - lo, n)
+    a = np.repeat(a0, n) + np.repeat(sa, n)*i
+    b = np.repeat(b0, n) + np.repeat(sb, n)*((np.repeat(2*dmin, n)*i + np.repeat(dmaj, n))
+                                             // np.repeat(np.maximum(2*dmaj, 1), n))
+    ok = (b >= 0) & (b < np.repeat(bmax, n))
+    xm = np.repeat(xmaj, n)
+    return np.where(xm, a, b)[ok], np.where(xm, b, a)[ok], seg[ok]
+
+def bresenham_segments(cv, segs, color):
+    """Нарисовать пакет отрезков одной записью. color — один цвет или (n, 3) по отрезку."""
+    xs, ys, seg = bresenham_pixels(segs, cv.w, cv.h)
+    if isinstance(color, np.ndarray) and color.ndim == 2:
+        color = color[seg]
+    with cv:
+        cv.will_write_points(xs, ys)
+        cv.px[ys, xs] = color
+        cv.touch_points(xs, ys)
+
+def bresenham_polyline(cv, pts, color, closed=False):
+    """Ломаная через точки pts (m, 2); closed=True — соединить последнюю точку с первой."""
+    pts = np.asarray(pts, dtype=np.int64).reshape(-1, 2)
+    if closed and len(pts) > 1:
+        pts = np.vstack([pts, pts[:1]])
+    if len(pts) == 1:
+        pts = np.vstack([pts, pts])
+    bresenham_segments(cv, np.hstack([pts[:-1], pts[1:]]), color)
+
+def wu_line(cv, x0, y0, x1, y1, color):
+    def ipart(x):
+        return int(math.floor(x))
+
+    def fpart(x):
+        return x - math.floor(x)
+
+    def rfpart(x):
+        return 1 - fpart(x)
+
+    def plot(us, vs, a):
+        # пиксели (главная ось, вторая) с покрытиями a — одним чтением и одной записью;
+        # смесь та же, что по пикселю: int(c*(1-a) + color*a)
+        us, vs, a = np.asarray(us, dtype=np.int64), np.asarray(vs, dtype=np.int64), np.asarray(a)
+        xs, ys = (vs, us) if steep else (us, vs)
+        ok = (xs >= 0) & (xs < cv.w) & (ys >= 0) & (ys < cv.h)
+        xs, ys, a = xs[ok], ys[ok], a[ok, None]
+        old = cv.px[ys, xs].astype(np.float64)
+        cv.px[ys, xs] = (old*(1 - a) + np.asarray(color[:3], dtype=np.float64)*a).astype(np.uint8)
+
+    with cv:   # один lock на всю линию
+        cv.touch(math.floor(min(x0, x1)), math.floor(min(y0, y1)),
+                 math.ceil(max(x0, x1)) + 1, math.ceil(max(y0, y1)) + 1)
+        if cv.backups:   # пиксели Ву — не дальше одного шага от пикселей Брезенхема той же линии
+            bx, by, _ = bresenham_pixels([(round(x0) + 1, round(y0) + 1, round(x1) + 1, round(y1) + 1)],
+                                         cv.w + 2, cv.h + 2)
+            bx, by = bx - 1, by - 1
+            cv.will_write_points(np.concatenate([bx + dx for dx in (-1, 0, 1) for dy in (-1, 0, 1)]),
+                                 np.concatenate([by + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)]))
+        steep = abs(y1-y0) > abs(x1-x0)
+        if steep:
+            x0, y0, x1, y1 = y0, x0, y1, x1
+        if x0 > x1:
+            x0, x1, y0, y1 = x1, x0, y1, y0
+
+        dx = x1-x0
+        dy = y1-y0
+        gradient = dy/dx if dx else 0.0
+        xend = round(x0)
+        yend1 = y0 + gradient*(xend-x0)
+        xpxl1 = int(xend)
+        ypxl1 = ipart(yend1)
+        intery = yend1 + gradient
+        xend = round(x1)
+        yend2 = y1 + gradient*(xend-x1)
+        xpxl2 = int(xend)
+        ypxl2 = ipart(yend2)
+        # внутренние шаги: intery копится сложением по шагу, как в цикле (accumulate — подряд,
+        # поэтому и округления те же); у каждого шага два пикселя — ipart и ipart+1
+        n = max(xpxl2 - xpxl1 - 1, 0)
+        inter = np.add.accumulate(np.r_[intery, np.full(max(n - 1, 0), gradient)])[:n]
+        ip = np.floor(inter)
+        fp = inter - ip
+        plot(np.r_[xpxl1, xpxl1, np.repeat(np.arange(xpxl1 + 1, xpxl1 + 1 + n), 2)],
+             np.r_[ypxl1, ypxl1 + 1, np.stack([ip, ip + 1], axis=1).ravel()],
+             np.r_[rfpart(yend1), fpart(yend1), np.stack([1 - fp, fp], axis=1).ravel()])
+        # второй конец — отдельно: у линии в один столбец он ложится на те же пиксели, что первый
+        plot([xpxl2, xpxl2], [ypxl2, ypxl2 + 1], [rfpart(yend2), fpart(yend2)])
+
+def wu_pixels(segs, w, h):
+    """
+    Пиксели и покрытия Ву сразу для пакета отрезков segs (n, 4) (концы могут быть дробными).
+    Формулы те же, что в wu_line (концы — round, без xgap), но y внутренних пикселей
+    считается как y1 + gradient*i, а не накоплением intery += gradient.
+    -> (xs, ys, cov, seg), только пиксели на холсте [0, w) x [0, h).
+    """
+    segs = np.asarray(segs, dtype=np.float64).reshape(-1, 4)
+    x0, y0, x1, y1 = segs.T
+    steep = np.abs(y1 - y0) > np.abs(x1 - x0)
+    u0, v0 = np.where(steep, y0, x0), np.where(steep, x0, y0)   # u — главная ось
+    u1, v1 = np.where(steep, y1, x1), np.where(steep, x1, y1)
+    back = u0 > u1
+    u0, u1 = np.where(back, u1, u0), np.where(back, u0, u1)
+    v0, v1 = np.where(back, v1, v0), np.where(back, v0, v1)
+    du, dv = u1 - u0, v1 - v0
+    gradient = np.divide(dv, du, out=np.zeros_like(du), where=du != 0)
+    up1, up2 = np.rint(u0), np.rint(u1)
+    ve1 = v0 + gradient*(up1 - u0)
+    ve2 = v1 + gradient*(up2 - u1)
+    umax = np.where(steep, h, w)
+
+    # концы: по два пикселя на каждый
+    ends_u = np.concatenate([up1, up2])
+    ends_v = np.concatenate([ve1, ve2])
+    ends_seg = np.tile(np.arange(len(segs)), 2)
+    # внутренние шаги up1+1 .. up2-1, обрезанные по главной оси холста
+    lo = np.maximum(up1 + 1, 0)
+    hi = np.minimum(up2 - 1, umax - 1)
+    n = np.maximum(hi - lo + 1, 0).astype(np.int64)
+    seg = np.repeat(np.arange(len(segs)), n)
+    u = np.arange(int(n.sum()), dtype=np.float64) - np.repeat(np.cumsum(n) - n - lo, n)
+    v = np.repeat(ve1, n) + np.repeat(gradient, n)*(u - np.repeat(up1, n))
+
+    u = np.concatenate([ends_u, u])
+    v = np.concatenate([ends_v, v])
+    seg = np.concatenate([ends_seg, seg])
+    vi = np.floor(v)
+    f = v - vi
+    # пара пикселей на шаг: (u, vi) с покрытием 1-f и (u, vi+1) с покрытием f
+    u = np.concatenate([u, u]).astype(np.int64)
+    v = np.concatenate([vi, vi + 1]).astype(np.int64)
+    cov = np.concatenate([1 - f, f])
+    seg = np.concatenate([seg, seg])
+    st = steep[seg]
+    xs, ys = np.where(st, v, u), np.where(st, u, v)
+    ok = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h) & (cov > 0)
+    return xs[ok], ys[ok], cov[ok], seg[ok]
+
+def wu_segments(cv, segs, color, overlap="max"):
+    """
+    Нарисовать пакет сглаженных отрезков одним смешиванием с холстом.
+    Где отрезки перекрываются, покрытия сначала сводятся на пиксель:
+    overlap="max" — берётся наибольшее (стыки ломаной не темнеют),
+    overlap="sum" — сумма, но не больше 1. Цвет пикселя — среднее цветов отрезков,
+    взвешенное покрытием. color — один цвет или (n, 3) по отрезку.
+    """
+    xs, ys, cov, seg = wu_pixels(segs, cv.w, cv.h)
+    if not len(xs):
+        return
+    idx, inv = np.unique(ys*cv.w + xs, return_inverse=True)
+    wsum = np.bincount(inv, cov, minlength=len(idx))
+    if overlap == "sum":
+        alpha = np.minimum(wsum, 1.0)
+    else:
+        alpha = np.zeros(len(idx))
+        np.maximum.at(alpha, inv, cov)
+    if isinstance(color, np.ndarray) and color.ndim == 2:
+        c = color.astype(np.float64)[seg]
+        src = np.stack([np.bincount(inv, cov*c[:, i], minlength=len(idx)) for i in range(3)], axis=1)
+        src /= wsum[:, None]
+    else:
+        src = np.asarray(color[:3], dtype=np.float64)
+    py, px = np.divmod(idx, cv.w)
+    with cv:
+        old = cv.px[py, px].astype(np.float64)
+        a = alpha[:, None]
+        cv.will_write_points(px, py)
+        cv.px[py, px] = (old*(1 - a) + src*a).astype(np.uint8)   # int(), как в plot
+        cv.touch_points(px, py)
+
+def wu_polyline(cv, pts, color, closed=False, overlap="max"):
+    """Сглаженная ломаная через pts (m, 2); closed=True — замкнуть."""
+    pts = np.asarray(pts, dtype=np.float64).reshape(-1, 2)
+    if closed and len(pts) > 1:
+        pts = np.vstack([pts, pts[:1]])
+    if len(pts) == 1:
+        pts = np.vstack([pts, pts])
+    wu_segments(cv, np.hstack([pts[:-1], pts[1:]]), color, overlap)
+
+# -------------------- Треугольник (градиент) --------------------
+def area2(a,b,c):
+    return (b[0]-a[0])*(c[1]-a[1]) - (c[0]-a[0])*(b[1]-a[1])
+
+def triangle_spans(A, B, C, clip, top_left=False):
+    """
+    Строки треугольника в виде отрезков: (ys, xl, xr), пиксели [xl..xr] на строке ys
+    (пустые строки имеют xr < xl); clip = (x0, y0, x1, y1) — окно отсечения [x0, x1) x [y0, y1).
+    Вместо проверки каждого пикселя bbox границы считаются из трёх рёберных функций
+    area2(P, Q, (x, y)) = k*x + m(y).
+    top_left=True — правило «верхнего-левого ребра»: пиксель ровно на общем ребре
+    достаётся только одному из соседних треугольников (сетки без щелей и двойной записи).
+    """
+    S = area2(A, B, C)
+    ymin = max(clip[1], min(A[1], B[1], C[1]))
+    ymax = min(clip[3]-1, max(A[1], B[1], C[1]))
+    if S == 0 or ymin > ymax:
+        return None
+    ys = np.arange(ymin, ymax+1, dtype=np.int64)
+    xl = np.full(len(ys), max(clip[0], min(A[0], B[0], C[0])), dtype=np.int64)
+    xr = np.full(len(ys), min(clip[2]-1, max(A[0], B[0], C[0])), dtype=np.int64)
+    s = 1 if S > 0 else -1   # приводим к «внутри: E >= 0» для любого обхода
+    for P, Q in ((B, C), (C, A), (A, B)):
+        k = -(Q[1]-P[1]) * s
+        l = (Q[0]-P[0]) * s
+        m = l*(ys - P[1]) - k*P[0]
+        # ребро левое (k > 0) или верхнее (k == 0, внутренность ниже) — включаем E == 0
+        strict = top_left and not (k > 0 or (k == 0 and l > 0))
+        if k > 0:     # x >= -m/k
+            xl = np.maximum(xl, (-m)//k + 1 if strict else -(m//k))
+        elif k < 0:   # x <= m/-k
+            xr = np.minimum(xr, -((-m)//(-k)) - 1 if strict else m//(-k))
+        else:
+            xr = np.where(m > 0 if strict else m >= 0, xr, xl-1)
+    return ys, xl, xr
+
+def span_pixels(ys, xl, xr):
+    """Развернуть отрезки строк в координаты пикселей (xs, ys)."""
+    n = np.maximum(xr - xl + 1, 0)
+    total = int(n.sum())
+    py = np.repeat(ys, n)
+    px = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(n) - n - xl, n)
+    return px, py
+
+def barycentric(A, B, C, xs, ys):
+    """Барицентрические веса (a, b, c) для массивов точек."""
+    S = area2(A, B, C)
+    P = (xs, ys)
+    return area2(B, C, P)/S, area2(C, A, P)/S, area2(A, B, P)/S
+
+def span_weights(A, B, C, ys, xl, xr):
+    """
+    Барицентрические веса пикселей отрезков строк (в порядке span_pixels).
+    Вдоль строки числитель веса растёт на постоянный шаг: E(x) = E(xl) + k*(x - xl),
+    так что area2 считается только на концах отрезков, а дальше — целый шаг (без погрешности).
+    """
+    S = area2(A, B, C)
+    n = np.maximum(xr - xl + 1, 0)
+    dx = np.arange(int(n.sum()), dtype=np.int64) - np.repeat(np.cumsum(n) - n, n)
+    ws = []
+    for P, Q in ((B, C), (C, A), (A, B)):
+        e = np.repeat(area2(P, Q, (xl, ys)), n)
+        e += (P[1] - Q[1]) * dx
+        ws.append(e / S)
+    return ws
+
+def shade(a, b, c, colA, colB, colC):
+    """Градиент по весам: (n, 3) uint8."""
+    cols = np.empty((len(a), 3), dtype=np.uint8)
+    v, tmp = np.empty(len(a)), np.empty(len(a))
+    for i in range(3):
+        np.multiply(a, colA[i], out=v)
+        v += np.multiply(b, colB[i], out=tmp)
+        v += np.multiply(c, colC[i], out=tmp)
+        cols[:, i] = np.clip(v, 0, 255, out=v)   # uint8 отбрасывает дробную часть, как int()
+    return cols
+
+def fill_triangle_barycentric(cv, A, B, C, colA, colB, colC, top_left=False):
+    spans = triangle_spans(A, B, C, (0, 0, cv.w, cv.h), top_left)
+    if spans is None:
+        return
+    ys, xl, xr = spans
+    rows = xr >= xl
+    ys, xl, xr = ys[rows], xl[rows], xr[rows]
+    if not len(ys):
+        return
+    cols = shade(*span_weights(A, B, C, ys, xl, xr), colA, colB, colC)
+    with cv:
+        cv.will_write_spans(ys, xl, xr)
+        px, i = cv.px, 0
+        for y, x0, x1 in zip(ys.tolist(), xl.tolist(), xr.tolist()):
+            j = i + x1 - x0 + 1
+            px[y, x0:x1 + 1] = cols[i:j]   # строка — срезом, без индексов на каждый пиксель
+            i = j
+        cv.touch(xl.min(), ys[0], xr.max(), ys[-1])
+
+# -------------------- Сетка треугольников (пакетный рендер) --------------------
+# Тысячи треугольников за раз: z-буфер, разбиение экрана на тайлы и растеризация
+# тайлов в пуле процессов. Буферы цвета и глубины лежат в shared memory,
+# тайлы не пересекаются — процессы пишут без блокировок.
+MESH_TILE = 128
+
+def load_mesh(path):
+    """
+    OBJ с цветами вершин: строки "v x y z [r g b]" (цвет 0..1 или 0..255) и "f i j k ...".
+    Многоугольники режутся веером на треугольники. -> (verts (n,3), colors (n,3), faces (m,3))
+    """
+    verts, colors, faces = [], [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "v":
+                vals = [float(t) for t in parts[1:]]
+                verts.append(vals[:3])
+                colors.append(vals[3:6] if len(vals) >= 6 else [200.0, 200.0, 200.0])
+            elif parts[0] == "f":
+                # "i", "i/t", "i//n", "i/t/n"; отрицательные индексы — от конца
+                idx = [int(t.split("/")[0]) for t in parts[1:]]
+                idx = [i-1 if i > 0 else len(verts)+i for i in idx]
+                for j in range(1, len(idx)-1):
+                    faces.append((idx[0], idx[j], idx[j+1]))
+    verts = np.array(verts, dtype=np.float64).reshape(-1, 3)
+    colors = np.array(colors, dtype=np.float64).reshape(-1, 3)
+    if len(colors) and colors.max() <= 1.0:
+        colors *= 255
+    return verts, colors, np.array(faces, dtype=np.int64).reshape(-1, 3)
+
+def fit_mesh(verts, w, h, margin=10):
+    """Ортографическая проекция x, y сетки в холст w x h (ось y вниз); z остаётся глубиной."""
+    out = verts.astype(np.float64).copy()
+    lo, hi = verts[:, :2].min(axis=0), verts[:, :2].max(axis=0)
+    size = np.maximum(hi - lo, 1e-12)
+    k = min((w - 2*margin) / size[0], (h - 2*margin) / size[1])
+    out[:, 0] = margin + (verts[:, 0] - lo[0]) * k
+    out[:, 1] = (h - margin) - (verts[:, 1] - lo[1]) * k
+    return out
+
+def _raster_tris(color, depth, rect, tris, cols):
+    """Растеризовать треугольники (экранные x, y, z) в окне rect с z-тестом (ближе — меньше z)."""
+    for (A, B, C), (cA, cB, cC) in zip(tris, cols):
+        zA, zB, zC = A[2], B[2], C[2]
+        A, B, C = (int(A[0]), int(A[1])), (int(B[0]), int(B[1])), (int(C[0]), int(C[1]))
+        spans = triangle_spans(A, B, C, rect, top_left=True)
+        if spans is None:
+            continue
+        xs, ys = span_pixels(*spans)
+        if not len(xs):
+            continue
+        a, b, c = barycentric(A, B, C, xs, ys)
+        z = a*zA + b*zB + c*zC
+        near = z < depth[ys, xs]
+        if not near.all():
+            xs, ys, a, b, c, z = xs[near], ys[near], a[near], b[near], c[near], z[near]
+        depth[ys, xs] = z
+        color[ys, xs] = shade(a, b, c, cA, cB, cC)
+
+def _raster_tile(job):
+    """Задача процесса пула: подключиться к общим буферам и отрисовать свой тайл."""
+    names, (h, w), rect, tris, cols = job
+    cshm = shared_memory.SharedMemory(name=names[0])
+    zshm = shared_memory.SharedMemory(name=names[1])
+    try:
+        color = np.ndarray((h, w, 3), dtype=np.uint8, buffer=cshm.buf)
+        depth = np.ndarray((h, w), dtype=np.float64, buffer=zshm.buf)
+        _raster_tris(color, depth, rect, tris, cols)
+        del color, depth   # до close(): на буфер не должно остаться ссылок
+    finally:
+        cshm.close()
+        zshm.close()
+    return len(tris)
+
+def bin_triangles(tris, w, h, tile=MESH_TILE):
+    """Разложить треугольники по тайлам экрана: {(tx, ty): индексы в исходном порядке}."""
+    xy = np.rint(tris[:, :, :2]).astype(np.int64)
+    lo, hi = xy.min(axis=1), xy.max(axis=1)
+    on = (hi[:, 0] >= 0) & (hi[:, 1] >= 0) & (lo[:, 0] < w) & (lo[:, 1] < h)
+    ntx, nty = (w + tile - 1) // tile, (h + tile - 1) // tile
+    t0 = np.clip(lo // tile, 0, [ntx-1, nty-1])
+    t1 = np.clip(hi // tile, 0, [ntx-1, nty-1])
+    bins = {}
+    for i in np.flatnonzero(on):
+        for ty in range(t0[i, 1], t1[i, 1]+1):
+            for tx in range(t0[i, 0], t1[i, 0]+1):
+                bins.setdefault((tx, ty), []).append(i)
+    return bins
+
+def render_mesh(cv, verts, colors, faces, tile=MESH_TILE, workers=None):
+    """
+    Пакетный рендер сетки поверх холста. verts — экранные (x, y, z), colors — RGB вершин,
+    faces — индексы (m, 3). workers: None — по числу ядер, 0/1 — без пула.
+    Возвращает буфер глубины (h, w) (inf там, где сетки нет).
+    """
+    faces = np.asarray(faces, dtype=np.int64)
+    tris = np.asarray(verts, dtype=np.float64)[faces]
+    tris[:, :, :2] = np.rint(tris[:, :, :2])   # растеризатор работает с целыми вершинами; z не округляем
+    cols = np.asarray(colors, dtype=np.float64)[faces]
+    w, h = cv.w, cv.h
+    bins = bin_triangles(tris, w, h, tile)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(bins) <= 1:
+        depth = np.full((h, w), np.inf)
+        with cv:
+            color = cv.px.copy()
+            for (tx, ty), idx in bins.items():
+                rect = (tx*tile, ty*tile, min(w, (tx+1)*tile), min(h, (ty+1)*tile))
+                _raster_tris(color, depth, rect, tris[idx], cols[idx])
+            cv.will_write(0, 0, w - 1, h - 1)
+            cv.px[...] = color
+            cv.touch(0, 0, w - 1, h - 1)
+        return depth
+
+    cshm = shared_memory.SharedMemory(create=True, size=h*w*3)
+    zshm = shared_memory.SharedMemory(create=True, size=h*w*8)
+    try:
+        color = np.ndarray((h, w, 3), dtype=np.uint8, buffer=cshm.buf)
+        depth = np.ndarray((h, w), dtype=np.float64, buffer=zshm.buf)
+        depth.fill(np.inf)
+        with cv:
+            color[...] = cv.px
+        jobs = [((cshm.name, zshm.name), (h, w),
+                 (tx*tile, ty*tile, min(w, (tx+1)*tile), min(h, (ty+1)*tile)),
+                 tris[idx], cols[idx])
+                for (tx, ty), idx in bins.items()]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(_raster_tile, jobs, chunksize=max(1, len(jobs) // (workers*4))):
+                pass
+        with cv:
+            cv.will_write(0, 0, w - 1, h - 1)
+            cv.px[...] = color
+            cv.touch(0, 0, w - 1, h - 1)
+        out = depth.copy()
+        del color, depth
+    finally:
+        cshm.close()
+        cshm.unlink()
+        zshm.close()
+        zshm.unlink()
+    return out
+
+# -------------------- Индекс областей (для повторных заливок) --------------------
+def _join(n, a, b):
+    """Система непересекающихся множеств на n вершинах с рёбрами (a, b) -> parent: номер корня
+    (наименьшего в своём множестве) для каждой вершины."""
+    parent = np.arange(n)
+    while True:
+        ra, rb = parent[a], parent[b]
+        diff = ra != rb
+        if not diff.any():
+            return parent
+        ra, rb = ra[diff], rb[diff]
+        low = np.minimum(ra, rb)
+        np.minimum.at(parent, ra, low)
+        np.minimum.at(parent, rb, low)
+        while True:
+            up = parent[parent]
+            if (up == parent).all():
+                break
+            parent = up
+
+def label_regions(keys):
+    """
+    Связные (4-соседство) области одного цвета за один векторный проход.
+    keys (h, w) — упакованные цвета. -> (labels (h, w) int32 с номерами 0..n-1,
+    size (n,) — пикселей в области, box (n, 4) — охват [x0, y0, x1, y1] включительно).
+    Строки режутся на прогоны одного цвета; прогоны, соседние по вертикали и одного цвета,
+    склеиваются системой непересекающихся множеств: «подвесить корень к меньшему»
+    + сжатие путей parent = parent[parent] — всё массивами, без цикла по пикселям.
+    """
+    h, w = keys.shape
+    start = np.ones((h, w), dtype=bool)
+    start[:, 1:] = keys[:, 1:] != keys[:, :-1]
+    run = np.cumsum(start.ravel()).reshape(h, w) - 1      # номер прогона каждого пикселя
+    n = int(run[-1, -1]) + 1
+    same = keys[1:] == keys[:-1]
+    a, b = run[1:][same], run[:-1][same]
+    if len(a):
+        pairs = np.unique(a.astype(np.int64)*n + b)
+        a, b = pairs // n, pairs % n
+    parent = _join(n, a, b)
+    roots = parent == np.arange(n)
+    dense = (np.cumsum(roots) - 1)[parent]                # корень -> номер 0..m-1
+    m = int(roots.sum())
+    # охват и размер — по прогонам, а не по пикселям
+    ys, xs = np.nonzero(start)
+    ends = np.r_[xs[1:], 0]
+    ends[np.r_[ys[1:] != ys[:-1], True]] = w
+    lab = dense.astype(np.int32)
+    size = np.bincount(lab, weights=ends - xs, minlength=m).astype(np.int64)
+    box = np.empty((m, 4), dtype=np.int32)
+    box[:, :2] = (w, h)
+    box[:, 2:] = -1
+    np.minimum.at(box[:, 0], lab, xs)
+    np.minimum.at(box[:, 1], lab, ys)
+    np.maximum.at(box[:, 2], lab, ends - 1)
+    np.maximum.at(box[:, 3], lab, ys)
+    return lab[run], size, box
+
+class RegionIndex:
+    """
+    Карта областей холста для заливок без допуска: клик -> готовая маска области.
+        index = RegionIndex(); index.watch(cv)
+        scanline_fill_color(cv, seed, target, repl, index=index)
+    Карта строится label_regions при первом запросе; дальше холст сообщает о каждой
+    записи (Canvas.watchers), и перед следующим запросом пересчитывается только окно
+    правки — расширенное до охвата областей, которые потеряли часть пикселей (могли
+    распасться); части снаружи окна подклеиваются по соседству через его край.
+    Окно больше половины холста — проще разметить заново.
+    """
+    def __init__(self):
+        self.cv = None
+        self.labels = None     # (h, w) int32 — номер области пикселя
+        self.keys = None       # (h, w) int32 — цвета, по которым размечено
+        self.size = None       # по номеру: пикселей (0 — номер свободен)
+        self.box = None        # по номеру: [x0, y0, x1, y1] — охват (может быть шире точного)
+        self.pending = None    # [x0, y0, x1, y1] — изменено с последней разметки
+
+    def watch(self, cv):
+        """Следить за холстом cv (прежний, если был, забывается)."""
+        if self.cv is not None and self._touched in self.cv.watchers:
+            self.cv.watchers.remove(self._touched)
+        self.cv, self.labels, self.pending = cv, None, None
+        cv.watchers.append(self._touched)
+
+    def _touched(self, x0, y0, x1, y1):
+        p = self.pending
+        if p is None:
+            self.pending = [x0, y0, x1, y1]
+        else:
+            p[0], p[1], p[2], p[3] = min(p[0], x0), min(p[1], y0), max(p[2], x1), max(p[3], y1)
+
+    def usable(self, cv, tolerance=0, antialias=False):
+        """Можно ли заливать по индексу: тот же холст, точное совпадение цвета, без сглаживания."""
+        return cv is self.cv and tolerance <= 0 and not antialias
+
+    def build(self):
+        with self.cv:
+            self.keys = self.cv.keys()
+        self.labels, self.size, self.box = label_regions(self.keys)
+        self.pending = None
+
+    def update(self):
+        """Довести карту до текущего холста."""
+        if self.labels is None:
+            self.build()
+            return
+        if self.pending is None:
+            return
+        x0, y0, x1, y1 = self.pending
+        self.pending = None
+        with self.cv:
+            new = Canvas.keys_of(self.cv.px[y0:y1 + 1, x0:x1 + 1])
+        changed = new != self.keys[y0:y1 + 1, x0:x1 + 1]
+        if not changed.any():
+            return
+        lost, cnt = np.unique(self.labels[y0:y1 + 1, x0:x1 + 1][changed], return_counts=True)
+        split = lost[cnt < self.size[lost]]     # потеряли не всё — могли распасться
+        vals = new[changed]
+        if len(lost) == 1 and not len(split) and (vals == vals[0]).all():
+            # обычная заливка: область целиком перекрашена в один цвет
+            self.keys[y0:y1 + 1, x0:x1 + 1][changed] = vals[0]
+            self._recolor(int(lost[0]), int(vals[0]))
+            return
+        if len(split):
+            b = self.box[split]
+            x0, y0 = min(x0, int(b[:, 0].min())), min(y0, int(b[:, 1].min()))
+            x1, y1 = max(x1, int(b[:, 2].max())), max(y1, int(b[:, 3].max()))
+        if (x1 - x0 + 1)*(y1 - y0 + 1)*2 > self.cv.w*self.cv.h:
+            self.build()
+            return
+        self._relabel(x0, y0, x1, y1)
+        live = self.size > 0
+        if len(live) > 4*int(live.sum()) + 4096:
+            # номера освободившихся областей копятся — переномеровать подряд
+            new = (np.cumsum(live) - 1).astype(np.int32)
+            self.labels = new[self.labels]
+            self.size, self.box = self.size[live], self.box[live]
+
+    def _recolor(self, i, key):
+        """Область i сменила цвет на key: подклеить соседние области цвета key."""
+        h, w = self.labels.shape
+        bx0, by0, bx1, by1 = self.box[i].tolist()
+        bx0, by0, bx1, by1 = max(bx0 - 1, 0), max(by0 - 1, 0), min(bx1 + 1, w - 1), min(by1 + 1, h - 1)
+        lab = self.labels[by0:by1 + 1, bx0:bx1 + 1]
+        m = lab == i
+        near = m.copy()
+        near[1:] |= m[:-1];  near[:-1] |= m[1:]
+        near[:, 1:] |= m[:, :-1];  near[:, :-1] |= m[:, 1:]
+        near &= ~m & (self.keys[by0:by1 + 1, bx0:bx1 + 1] == key)
+        for j in np.unique(lab[near]).tolist():
+            jx0, jy0, jx1, jy1 = self.box[j].tolist()
+            sub = self.labels[jy0:jy1 + 1, jx0:jx1 + 1]
+            sub[sub == j] = i
+            self._grow(i, self.box[j])
+            self.size[i] += self.size[j]
+            self.size[j] = 0
+
+    def _relabel(self, x0, y0, x1, y1):
+        h, w = self.labels.shape
+        win = (slice(y0, y1 + 1), slice(x0, x1 + 1))
+        with self.cv:
+            keys = Canvas.keys_of(self.cv.px[win])
+        local, lsize, lbox = label_regions(keys)
+        # старые области окна: остаются только их части снаружи
+        ids, cnt = np.unique(self.labels[win], return_counts=True)
+        self.size[ids] -= cnt
+        # пары (локальная область, старая снаружи) одного цвета через край окна
+        links = []
+        for inner, outer, ok in ((np.s_[:, 0], np.s_[y0:y1 + 1, x0 - 1], x0 > 0),
+                                 (np.s_[:, -1], np.s_[y0:y1 + 1, x1 + 1], x1 < w - 1),
+                                 (np.s_[0, :], np.s_[y0 - 1, x0:x1 + 1], y0 > 0),
+                                 (np.s_[-1, :], np.s_[y1 + 1, x0:x1 + 1], y1 < h - 1)):
+            if ok:
+                same = keys[inner] == self.keys[outer]
+                links.append(np.stack([local[inner][same], self.labels[outer][same]], axis=1))
+        parent = {}
+        def find(v):
+            while parent.get(v, v) != v:
+                v = parent[v]
+            return v
+        if links:
+            for l, o in np.unique(np.concatenate(links), axis=0).tolist():
+                a, b = find(("n", l)), find(("o", o))
+                if a == b:
+                    continue
+                # корень группы со старым номером — старый (меньший из старых)
+                if a[0] == "o" and (b[0] == "n" or a[1] < b[1]):
+                    a, b = b, a
+                parent[a] = b
+        # локальные номера -> глобальные: новые в конец, подклеенные — к старому номеру
+        base = len(self.size)
+        remap = np.arange(base, base + len(lsize), dtype=np.int32)
+        self.size = np.r_[self.size, np.zeros(len(lsize), dtype=np.int64)]
+        self.box = np.r_[self.box, np.zeros((len(lsize), 4), dtype=np.int32)]
+        off = np.array([x0, y0, x0, y0], dtype=np.int32)
+        for i in range(len(lsize)):
+            r = find(("n", i))
+            g = r[1] if r[0] == "o" else base + r[1]
+            remap[i] = g
+            self._grow(g, lbox[i] + off)
+            self.size[g] += lsize[i]
+        self.labels[win] = remap[local]
+        # старые области, склеенные между собой через окно, — под один номер
+        for v in list(parent):
+            keep = find(v)[1]
+            if v[0] != "o" or keep == v[1]:
+                continue
+            bx0, by0, bx1, by1 = self.box[v[1]].tolist()
+            sub = self.labels[by0:by1 + 1, bx0:bx1 + 1]
+            sub[sub == v[1]] = keep
+            self._grow(keep, self.box[v[1]])
+            self.size[keep] += self.size[v[1]]
+            self.size[v[1]] = 0
+        self.keys[win] = keys
+
+    def _grow(self, i, b):
+        # охват области i расширить до b (пустая область — просто b)
+        s = self.box[i]
+        if self.size[i] > 0:
+            s[0], s[1] = min(s[0], b[0]), min(s[1], b[1])
+            s[2], s[3] = max(s[2], b[2]), max(s[3], b[3])
+        else:
+            s[:] = b
+
+    def region(self, seed):
+        """Область под seed = (x, y) -> (x0, y0, маска) — маска в пределах охвата области."""
+        self.update()
+        x, y = seed
+        i = self.labels[y, x]
+        x0, y0, x1, y1 = self.box[i].tolist()
+        return x0, y0, self.labels[y0:y1 + 1, x0:x1 + 1] == i
+
+    def key_at(self, seed):
+        self.update()
+        return int(self.keys[seed[1], seed[0]])
+
+# -------------------- Заливки (scanline) --------------------
+def seed_fill_mask(free, w, h, x0, y0, stop=None):
+    """
+    Span-заливка Хекберта/Смита по плоской маске free (bytearray w*h, 1 — пиксель можно залить).
+    Залитые пиксели обнуляются прямо в free — она же служит маской посещённых.
+    Без рекурсии: явный стек отрезков (y, xl, xr, dy) — «просмотреть строку y в [xl..xr],
+    пришли со строки y-dy». В обратную сторону кладём только выступы за родительский
+    отрезок, поэтому уже залитые строки повторно не перечитываются.
+    Поиск границ отрезков — bytearray.find/rfind (на C), а не цикл по пикселям.
+    stop — threading.Event: выставлен — Cancelled (проверка раз в STOP_EVERY отрезков, там же
+    поток отдаёт GIL).
+    """
+    base = y0*w
+    if not free[base + x0]:
+        return
+    j = free.rfind(0, base, base + x0)
+    l = j + 1 - base if j >= 0 else 0
+    j = free.find(0, base + x0, base + w)
+    r = j - base - 1 if j >= 0 else w - 1
+    free[base + l:base + r + 1] = bytes(r - l + 1)
+    stack = [(y0 - 1, l, r, -1), (y0 + 1, l, r, 1)]
+    pops = 0
+    while stack:
+        y, pl, pr, dy = stack.pop()
+        pops += 1
+        if stop is not None and pops % STOP_EVERY == 0:
+            if stop.is_set():
+                raise Cancelled()
+            time.sleep(0)
+        if not 0 <= y < h:
+            continue
+        base = y*w
+        x = pl
+        while x <= pr:
+            i = free.find(1, base + x, base + pr + 1)
+            if i < 0:
+                break
+            x = i - base
+            l = x
+            if x == pl:   # отрезок может продолжаться левее родительского
+                j = free.rfind(0, base, base + x)
+                l = j + 1 - base if j >= 0 else 0
+            j = free.find(0, base + x, base + w)
+            r = j - base - 1 if j >= 0 else w - 1
+            free[base + l:base + r + 1] = bytes(r - l + 1)
+            stack.append((y + dy, l, r, dy))
+            if l < pl:
+                stack.append((y - dy, l, pl - 1, -dy))
+            if r > pr:
+                stack.append((y - dy, pr + 1, r, -dy))
+            x = r + 2
+
+def region_mask(match, seed, stop=None):
+    """Связная (4-соседство) область от seed внутри булевой маски match (h, w) -> маска (h, w)."""
+    h, w = match.shape
+    x0, y0 = seed
+    free = bytearray(match.tobytes())
+    seed_fill_mask(free, w, h, x0, y0, stop)
+    return match & (np.frombuffer(free, dtype=np.uint8).reshape(h, w) == 0)
+
+def dilate(mask):
+    """Расширение булевой маски на 1 пиксель (8-соседство)."""
+    out = mask.copy()
+    out[1:] |= mask[:-1];  out[:-1] |= mask[1:]
+    row = out.copy()
+    out[:, 1:] |= row[:, :-1];  out[:, :-1] |= row[:, 1:]
+    return out
+
+def composite_fill(cv, mask, match, fill, target, antialias=False, metric="channel"):
+    """
+    Записать заливку в область mask. fill — цвет или текстура (h, w, 3).
+    antialias=True: пиксель считается смесью target и «чужого» цвета с долей target
+    cov = 1 - d/D (d — расстояние до target, D — наибольшее на внешней кайме области),
+    и заменяется только эта доля: new = old + cov*(fill - target).
+    Так сглаженные края (Ву, кисть) и кайма за областью перекрашиваются без ореола.
+    """
+    texture = isinstance(fill, np.ndarray) and fill.ndim == 3
+    if not antialias:
+        cv.will_write_mask(mask)
+        cv.px[mask] = fill[mask] if texture else fill
+        cv.touch_mask(mask)
+        return
+    ring = dilate(mask) & ~match
+    area = mask | ring
+    old = cv.px[area].astype(np.float64)
+    d = color_distance(old, target, metric)
+    D = max(float(d[ring[area]].max()) if ring.any() else 0.0, 1.0)
+    cov = np.clip(1 - d/D, 0, 1)[:, None]
+    src = fill[area] if texture else np.asarray(fill[:3], dtype=np.float64)
+    new = old + cov*(src - np.asarray(target[:3], dtype=np.float64))
+    cv.will_write_mask(area)
+    cv.px[area] = np.clip(np.rint(new), 0, 255).astype(np.uint8)
+    cv.touch_mask(area)
+
+def scanline_fill_color(cv, seed, target, repl, tolerance=0, metric="channel", antialias=False,
+                        index=None):
+    """index — RegionIndex холста: область берётся готовой из карты (если usable)."""
+    if repl == target and tolerance <= 0:
+        return
+    x0, y0 = seed
+    if not cv.in_bounds(x0, y0):
+        return
+    with cv:
+        if index is not None and index.usable(cv, tolerance, antialias):
+            if index.key_at(seed) == pack_rgb(target):
+                bx, by, mask = index.region(seed)
+                cv.block(bx, by, mask, repl[:3])
+            return
+        match = cv.match(target, tolerance, metric)
+        mask = region_mask(match, seed, cv.stop)
+        composite_fill(cv, mask, match, repl, target, antialias, metric)
+
+# Разложенный плиткой рисунок размером с холст (+ один период) — строится один раз на рисунок;
+# для любого якоря нужная текстура — просто срез (view) со сдвигом. Каждая такая плитка — размером
+# с холст, поэтому храним только PATTERN_CACHE последних (окно просмотра и окно изображения под заливку).
+PATTERN_CACHE = 2
+_pattern_tiles = {}
+
+def pattern_pixels(pattern):
+    """Пиксели рисунка (ph, pw, 3): из pygame.Surface или массива (ph, pw, 3|4)."""
+    if isinstance(pattern, np.ndarray):
+        return pattern[..., :3]
+    from pygame import surfarray
+    return surfarray.array3d(pattern).transpose(1, 0, 2)
+
+def pattern_size(pattern):
+    """(pw, ph) рисунка без копирования пикселей (pygame.Surface или массив)."""
+    if isinstance(pattern, np.ndarray):
+        return pattern.shape[1], pattern.shape[0]
+    return pattern.get_size()
+
+def checker_pattern(size=8):
+    """Рисунок по умолчанию: шахматка size x size из двух серых (как при отсутствии pattern.png)."""
+    y, x = np.mgrid[:size, :size]
+    pat = np.empty((size, size, 3), dtype=np.uint8)
+    pat[...] = 180
+    pat[(x + y) % 2 == 0] = 220
+    return pat
+
+def pattern_anchor(seed, size, mode="tile", anchor="center"):
+    """
+    Якорь рисунка для клика seed: "click" — левый верхний угол в точке клика,
+    "center" — рисунок центрирован на клике; mode "tile_fixed" — узор «привязан»
+    к левому верхнему углу холста. size = (pw, ph).
+    """
+    if mode == "tile_fixed":
+        return 0, 0
+    x, y = seed
+    if anchor == "center":
+        return x - size[0] // 2, y - size[1] // 2
+    return x, y
+
+def tiled_pattern(pattern, w, h, anchor):
+    """Текстура (h, w, 3): пиксель (x, y) холста -> pattern[(y-ay) % ph, (x-ax) % pw]."""
+    key = (id(pattern), w, h)
+    cached = _pattern_tiles.pop(key, None)
+    if cached is None or cached[0] is not pattern:
+        pat = pattern_pixels(pattern)
+        ph, pw = pat.shape[:2]
+        big = np.tile(pat, ((h + ph - 1) // ph + 1, (w + pw - 1) // pw + 1, 1))
+        cached = (pattern, big, pw, ph)
+        while len(_pattern_tiles) >= PATTERN_CACHE:
+            del _pattern_tiles[next(iter(_pattern_tiles))]   # самая давно нужная
+    _pattern_tiles[key] = cached
+    _, big, pw, ph = cached
+    ox, oy = (-anchor[0]) % pw, (-anchor[1]) % ph
+    return big[oy:oy + h, ox:ox + w]
+
+def scanline_fill_pattern(cv, seed, target, pattern, anchor, tiled=True,
+                          tolerance=0, metric="channel", antialias=False, index=None):
+    """
+    Заливка рисунком в две фазы:
+    1) маска связной области target от seed (span-заливка по байтовой маске, см. region_mask);
+    2) весь рисунок переносится через маску одной записью из заранее разложенной плитки.
+    tiled=False — «штамп»: красим только пересечение области с одной копией рисунка в anchor.
+    tolerance/metric/antialias/index — как у scanline_fill_color.
+    """
+    x0, y0 = seed
+    if not cv.in_bounds(x0, y0):
+        return
+    with cv:
+        if index is not None and index.usable(cv, tolerance, antialias):
+            if index.key_at(seed) == pack_rgb(target):
+                bx, by, mask = index.region(seed)
+                mh, mw = mask.shape
+                tex = tiled_pattern(pattern, cv.w, cv.h, anchor)[by:by + mh, bx:bx + mw]
+                if not tiled:
+                    ax, ay = anchor
+                    pw, ph = pattern_size(pattern)
+                    stamp = np.zeros_like(mask)
+                    stamp[max(0, ay - by):max(0, ay + ph - by), max(0, ax - bx):max(0, ax + pw - bx)] = True
+                    mask = mask & stamp
+                cv.block(bx, by, mask, tex)
+            return
+        match = cv.match(target, tolerance, metric)
+        mask = region_mask(match, seed, cv.stop)
+        tex = tiled_pattern(pattern, cv.w, cv.h, anchor)
+        if not tiled:
+            ax, ay = anchor
+            pw, ph = pattern_size(pattern)
+            stamp = np.zeros_like(mask)
+            stamp[max(0, ay):max(0, ay + ph), max(0, ax):max(0, ax + pw)] = True
+            mask &= stamp
+        composite_fill(cv, mask, match, tex, target, antialias, metric)
+
+# -------------------- 1в: Выделение границы по клику внутри --------------------
+# Идея: BFS по внутренней области (все пиксели != BORDER_COLOR), параллельно набираем соседей == BORDER_COLOR — это граница.
+
+NBS4 = [(1,0),(-1,0),(0,1),(0,-1)]
+# все пиксели этих цветов считаем НЕДОСТУПНЫМИ (границей)
+BORDER_COLORS = {BORDER_COLOR}
+
+def is_border_color(rgb):
+    return rgb in BORDER_COLORS
+
+def borders_of(cv):
+    """Цвета-границы для холста cv: свой набор фоновой операции или общий BORDER_COLORS."""
+    return BORDER_COLORS if cv.borders is None else cv.borders
+
+def border_mask(cv):
+    """Маска (h, w) пикселей цветов-границ (borders_of(cv))."""
+    return np.isin(cv.keys(), [pack_rgb(c) for c in borders_of(cv)])
+
+def inner_contour_from_inside(cv, seed):
+    """
+    Возвращает список пикселей ВНУТРИ области, прилегающих к ЛЮБОЙ границе из BORDER_COLORS.
+    Каждое последующее применение (после отрисовки) даёт следующее «кольцо».
+    """
+    w, h = cv.w, cv.h
+    sx, sy = seed
+    if not cv.in_bounds(sx, sy):
+        return []
+
+    with cv:
+        rows = cv.key_rows()
+    border = {pack_rgb(c) for c in borders_of(cv)}
+
+    # если кликнули прямо по границе — сместимся в первый внутренний пиксель
+    if rows[sy][sx] in border:
+        for dx, dy in NBS4:
+            nx, ny = sx+dx, sy+dy
+            if 0 <= nx < w and 0 <= ny < h and rows[ny][nx] not in border:
+                sx, sy = nx, ny
+                break
+        else:
+            return []
+
+    q = deque([(sx, sy)])
+    visited = [[False]*w for _ in range(h)]
+    visited[sy][sx] = True
+
+    inner_contour = set()
+
+    pops = 0
+    while q:
+        x, y = q.popleft()
+        pops += 1
+        if pops % STOP_EVERY == 0:
+            cv.check_stop()
+        adj_border = False
+        for dx, dy in NBS4:
+            nx, ny = x+dx, y+dy
+            if 0 <= nx < w and 0 <= ny < h:
+                if rows[ny][nx] in border:
+                    adj_border = True
+                else:
+                    if not visited[ny][nx]:
+                        visited[ny][nx] = True
+                        q.append((nx, ny))
+        if adj_border:
+            inner_contour.add((x, y))
+
+    return list(inner_contour)
+
+# -------------------- 1в: Обход контура (O(периметра)) --------------------
+# Идём от клика влево по строке до первого пикселя границы, затем обходим область
+# «по правилу левой руки» (граница всё время слева), шагая только по 4 соседям:
+# по диагонали через 8-связную линию Брезенхема обход не перескакивает.
+# Край холста тоже считается границей. Если слева от клика оказался «остров»
+# внутри области, обходится контур острова.
+
+DIRS4 = [(0,-1), (1,0), (0,1), (-1,0)]   # N, E, S, W — по часовой (ось y вниз)
+
+def trace_contour(cv, seed):
+    """
+    Упорядоченный замкнутый контур области: список пикселей ВНУТРИ области вдоль её границы,
+    в порядке обхода (первая точка не повторяется в конце). Читает только пиксели у границы.
+    """
+    sx, sy = seed
+    if not cv.in_bounds(sx, sy):
+        return []
+    with cv:
+        borders = borders_of(cv)
+        def inside(x, y):
+            return 0 <= x < cv.w and 0 <= y < cv.h and cv.get(x, y) not in borders
+
+        if not inside(sx, sy):
+            for dx, dy in NBS4:
+                if inside(sx+dx, sy+dy):
+                    sx, sy = sx+dx, sy+dy
+                    break
+            else:
+                return []
+
+        # до первой границы влево по строке клика
+        row = cv.row(sy)
+        border = np.isin(cv.keys_of(row[:sx]), [pack_rgb(c) for c in borders])
+        hits = np.flatnonzero(border)
+        sx = int(hits[-1]) + 1 if len(hits) else 0
+
+        # стоим в (sx, sy), граница слева (на западе) -> смотрим на север.
+        # Состояние обхода — (x, y, направление); первое повторившееся состояние замыкает цикл.
+        x, y, d = sx, sy, 0
+        seen = {}
+        contour = []
+        while (x, y, d) not in seen:
+            if len(contour) % STOP_EVERY == 0:
+                cv.check_stop()
+            seen[(x, y, d)] = len(contour)
+            contour.append((x, y))
+            for turn in (3, 0, 1, 2):          # налево, прямо, направо, назад
+                nd = (d + turn) % 4
+                nx, ny = x + DIRS4[nd][0], y + DIRS4[nd][1]
+                if inside(nx, ny):
+                    x, y, d = nx, ny, nd
+                    break
+            else:
+                return contour                 # одиночный пиксель
+        return contour[seen[(x, y, d)]:]
+
+def simplify_polyline(pts, eps):
+    """Упрощение ломаной Дугласом–Пекером (без рекурсии). Концы сохраняются."""
+    n = len(pts)
+    if n < 3 or eps <= 0:
+        return list(pts)
+    P = np.asarray(pts, dtype=np.float64)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n-1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        a, b = P[i], P[j]
+        q = P[i+1:j]
+        ab = b - a
+        L2 = ab[0]*ab[0] + ab[1]*ab[1]
+        # расстояние до ОТРЕЗКА, а не до прямой: точка за концом отрезка иначе выпала бы
+        # дальше eps; концы совпадают (замкнутая ломаная) — расстояние до точки
+        t = np.zeros(len(q)) if L2 == 0 else np.clip(((q[:, 0]-a[0])*ab[0] + (q[:, 1]-a[1])*ab[1]) / L2, 0, 1)
+        dist = np.hypot(q[:, 0]-a[0]-t*ab[0], q[:, 1]-a[1]-t*ab[1])
+        k = int(dist.argmax())
+        if dist[k] > eps:
+            keep[i+1+k] = True
+            stack.append((i, i+1+k))
+            stack.append((i+1+k, j))
+    return [tuple(map(int, p)) for p in P[keep]]
+
+def contour_polyline(contour, eps=BOUNDARY_SIMPLIFY_EPS):
+    """Замкнутая ломаная по контуру (первая точка повторена в конце), упрощённая с допуском eps."""
+    if not contour:
+        return []
+    return simplify_polyline(list(contour) + [contour[0]], eps)
+
+# -------------------- 1в: Кольца по карте расстояний --------------------
+# Очередное «кольцо» области — это пиксели на L1-расстоянии k от границы. Карта расстояний
+# считается один раз на область; дальше кольцо — пиксели минимального расстояния в той
+# связной части ещё не снятых пикселей, где лежит клик. Пока не снятое связно (это видно
+# заранее по эйлеровой характеристике уровней, см. split_level), кольцо — просто срез
+# пикселей, упорядоченных по расстоянию: клик стоит O(кольца). Дальше части выделяются
+# векторными проходами по bbox части (ring_chain), без BFS в питоне.
+# Кэш сбрасывается, если холст внутри области изменился не нами (Canvas.watchers) или
+# новый цвет-граница встречался в области.
+
+def l1_distance(src):
+    """Точная карта L1-расстояний (4-соседство) до ближайшего True в src; без источников — h+w+1."""
+    h, w = src.shape
+    d = np.where(src, 0, h + w + 1).astype(np.int32)
+    # сепарабельно: 1D-расстояния вдоль строк, затем нижняя огибающая вдоль столбцов
+    for x in range(1, w):
+        np.minimum(d[:, x], d[:, x-1] + 1, out=d[:, x])
+    for x in range(w-2, -1, -1):
+        np.minimum(d[:, x], d[:, x+1] + 1, out=d[:, x])
+    for y in range(1, h):
+        np.minimum(d[y], d[y-1] + 1, out=d[y])
+    for y in range(h-2, -1, -1):
+        np.minimum(d[y], d[y+1] + 1, out=d[y])
+    return d
+
+def split_level(region, dist, far):
+    """
+    Наименьший уровень K, с которого region ∩ {dist ≥ K} может оказаться несвязным (far — никогда).
+    Для 4-связного множества χ = V - E + F (пиксели, пары соседей, квадраты 2x2) = частей - дыр.
+    Дыры при росте K только сливаются (каждый снятый пиксель примыкает к границе), поэтому
+    частей не больше χ(K) + дыр самой области — а их даёт χ всей области (она связна).
+    Все уровни сразу — гистограммы по уровням: пикселя, меньшего из пары, меньшего из квадрата.
+    """
+    n = far + 2
+    hor, ver = region[:, :-1] & region[:, 1:], region[:-1] & region[1:]
+    dh, dv = np.minimum(dist[:, :-1], dist[:, 1:]), np.minimum(dist[:-1], dist[1:])
+    quad = hor[:-1] & hor[1:]
+    chi = (np.bincount(dist[region], minlength=n)
+           - np.bincount(dh[hor], minlength=n) - np.bincount(dv[ver], minlength=n)
+           + np.bincount(np.minimum(dh[:-1], dh[1:])[quad], minlength=n))
+    chi = np.cumsum(chi[::-1])[::-1]          # χ(region ∩ {dist ≥ K})
+    holes = 1 - int(chi[0])
+    bad = np.flatnonzero(chi + holes > 1)
+    return int(bad[0]) if len(bad) else far
+
+class RingCache:
+    def __init__(self):
+        self.cv = None         # холст, за записями в который следим (Canvas.watchers)
+        self.painting = False  # пишем сами — своих записей не замечаем
+        self.reset()
+
+    def reset(self):
+        self.rect = None       # (x0, y0, x1, y1): bbox области + 1 пиксель границы
+        self.dist = None       # L1-расстояние до границы внутри rect
+        self.free = None       # ещё не снятые пиксели области внутри rect
+        self.snapshot = None   # ожидаемое содержимое холста в rect
+        self.borders = None    # цвета-границы, с которыми считалась карта
+        self.colors = None     # упакованные цвета пикселей области при построении
+        self.far = 0           # «нет источников»: у области нет границы, колец нет
+        self.comp = None       # (bx0, by0, маска) — часть, где снималось последнее кольцо (в rect)
+        self.order = None      # пиксели области (плоские индексы в rect) по возрастанию расстояния
+        self.starts = None     # уровень L — order[starts[L]:starts[L+1]]
+        self.level = 0         # не снятое = область ∩ {dist ≥ level}, пока level < split
+        self.split = 0         # с этого уровня не снятое может распасться — дальше ring_chain
+        self.pending = None    # [x0, y0, x1, y1] — чужие записи в self.cv с последнего клика
+
+    def _watch(self, cv):
+        if self.cv is not None and self._touched in self.cv.watchers:
+            self.cv.watchers.remove(self._touched)
+        self.cv, self.pending = cv, None
+        cv.watchers.append(self._touched)
+
+    def _touched(self, x0, y0, x1, y1):
+        if self.painting or self.rect is None:
+            return
+        p = self.pending
+        if p is None:
+            self.pending = [x0, y0, x1, y1]
+        else:
+            p[0], p[1], p[2], p[3] = min(p[0], x0), min(p[1], y0), max(p[2], x1), max(p[3], y1)
+
+    def _valid(self, cv, x, y):
+        if self.rect is None or self.borders != frozenset(borders_of(cv)):
+            return False
+        x0, y0, x1, y1 = self.rect
+        if not (x0 <= x < x1 and y0 <= y < y1):
+            return False
+        if cv is not self.cv:
+            # другой холст (копия у фоновой операции) — сверить снимок целиком и следить уже за ним
+            if not np.array_equal(cv.px[y0:y1, x0:x1], self.snapshot):
+                return False
+            self._watch(cv)
+            return True
+        if self.pending is not None:
+            # сверить только то, куда писали другие (напр. перенос нашего же кольца из фоновой операции)
+            px0, py0 = max(self.pending[0], x0), max(self.pending[1], y0)
+            px1, py1 = min(self.pending[2] + 1, x1), min(self.pending[3] + 1, y1)
+            self.pending = None
+            if px0 < px1 and py0 < py1 and not np.array_equal(
+                    cv.px[py0:py1, px0:px1], self.snapshot[py0-y0:py1-y0, px0-x0:px1-x0]):
+                return False
+        return True
+
+    def _build(self, cv, seed):
+        # между шагами — проверка отмены; прерванное построение не пройдёт _valid (borders — последним)
+        self.reset()
+        keys = cv.keys()
+        border = np.isin(keys, [pack_rgb(c) for c in borders_of(cv)])
+        sx, sy = _inner_seed(cv, lambda x, y: border[y, x], seed)
+        if sx is None:
+            return False
+        region = region_mask(~border, (sx, sy), cv.stop)
+        rows, cols = np.flatnonzero(region.any(axis=1)), np.flatnonzero(region.any(axis=0))
+        x0, x1 = max(0, cols[0]-1), min(cv.w, cols[-1]+2)
+        y0, y1 = max(0, rows[0]-1), min(cv.h, rows[-1]+2)
+        self.rect = (x0, y0, x1, y1)
+        self.free = region[y0:y1, x0:x1].copy()
+        self.colors = set(np.unique(keys[y0:y1, x0:x1][self.free]).tolist())
+        cv.check_stop()
+        self.dist = l1_distance(border[y0:y1, x0:x1])
+        self.far = (y1-y0) + (x1-x0) + 1
+        self.snapshot = cv.px[y0:y1, x0:x1].copy()
+        cv.check_stop()
+        levels = self.dist[self.free]
+        key = levels.astype(np.uint16) if self.far < 1 << 16 else levels
+        self.order = np.flatnonzero(self.free)[np.argsort(key, kind="stable")]
+        self.starts = np.r_[0, np.cumsum(np.bincount(levels, minlength=self.far + 1))]
+        self.level = int(levels.min())
+        cv.check_stop()
+        self.split = split_level(self.free, self.dist, self.far)
+        self.borders = frozenset(borders_of(cv))
+        self._watch(cv)
+        return True
+
+    def _seed(self, cv, seed):
+        """Точка клика (или её внутренний сосед) в координатах rect, если она ещё не снята, иначе None."""
+        x0, y0, x1, y1 = self.rect
+        keys = {pack_rgb(c) for c in self.borders}
+        sx, sy = _inner_seed(cv, lambda x, y: pack_rgb(tuple(int(v) for v in cv.px[y, x])) in keys, seed)
+        if sx is None or not (x0 <= sx < x1 and y0 <= sy < y1) or not self.free[sy-y0, sx-x0]:
+            return None
+        return sx - x0, sy - y0
+
+    def _component(self, sx, sy):
+        """Компонента ещё не снятой части с точкой (sx, sy): (bx0, by0, маска, точка внутри маски)."""
+        x0, y0, x1, y1 = self.rect
+        bx0, by0, bx1, by1 = 0, 0, x1 - x0, y1 - y0
+        if self.comp is not None:   # части только дробятся: новая лежит внутри прежней
+            cx0, cy0, prev = self.comp
+            ch, cw = prev.shape
+            if cx0 <= sx < cx0 + cw and cy0 <= sy < cy0 + ch and prev[sy-cy0, sx-cx0]:
+                bx0, by0, bx1, by1 = cx0, cy0, cx0 + cw, cy0 + ch
+        comp = region_mask(self.free[by0:by1, bx0:bx1], (sx-bx0, sy-by0))
+        rows, cols = np.flatnonzero(comp.any(axis=1)), np.flatnonzero(comp.any(axis=0))
+        comp = comp[rows[0]:rows[-1]+1, cols[0]:cols[-1]+1]
+        self.comp = (bx0 + cols[0], by0 + rows[0], comp)
+        return self.comp + ((sx - self.comp[0], sy - self.comp[1]),)
+
+    def _add_border(self, cv, color):
+        """Как и в режиме "fill": новое кольцо — граница для следующих."""
+        if color != BG:
+            borders_of(cv).add(color)
+        borders = frozenset(borders_of(cv))
+        if self.rect is not None and self.borders != borders:
+            # новый цвет-граница, встречавшийся в области, меняет карту расстояний
+            if not self.borders <= borders or any(pack_rgb(c) in self.colors for c in borders - self.borders):
+                self.reset()
+            else:
+                self.borders = borders
+
+    def _paint(self, cv, band, ring, color):
+        """Снять пиксели band (плоские индексы в rect), нарисовать из них ring."""
+        x0, y0, x1, y1 = self.rect
+        self.free.reshape(-1)[band] = False
+        self.snapshot.reshape(-1, 3)[ring] = color
+        ys, xs = np.divmod(ring, x1 - x0)
+        xs, ys = xs + x0, ys + y0
+        self.painting = True
+        try:
+            cv.will_write_points(xs, ys)
+            cv.px[ys, xs] = color
+            cv.touch_points(xs, ys)
+        finally:
+            self.painting = False
+        return len(ring)
+
+    def peel(self, cv, seed, color, count=1, step=1):
+        """
+        Нарисовать следующие count колец (None — все оставшиеся), беря каждое step-е,
+        и добавить color в цвета-границы (borders_of(cv)). Возвращает число закрашенных пикселей.
+        Кольцо берётся только в той связной части области, где сейчас лежит seed, —
+        ровно как у inner_contour_from_inside, даже когда снятие колец разрезало область.
+        """
+        x, y = seed
+        with cv:
+            if not cv.in_bounds(x, y):
+                return 0
+            total, done, rebuilt = 0, 0, False
+            if not self._valid(cv, x, y) and not self._build(cv, seed):
+                count = 0   # снимать нечего, но цвет, как и в режиме "fill", станет границей
+            while count is None or done < count:
+                cv.check_stop()
+                inner = self._seed(cv, (x, y)) if self.rect is not None else None
+                if inner is None:
+                    # клик (или его внутренний сосед) вне области кэша: остров в bbox, другая область
+                    if rebuilt or not self._build(cv, seed):
+                        break
+                    rebuilt = True
+                    continue
+                rebuilt = False
+                if self.level < self.split:
+                    # не снятое связно: кольцо — срез пикселей по расстоянию, O(кольца)
+                    k, top = self.level, self.level + step - 1
+                    if top >= self.far or self.starts[top] == self.starts[top + 1]:
+                        break
+                    total += self._paint(cv, self.order[self.starts[k]:self.starts[top + 1]],
+                                         self.order[self.starts[top]:self.starts[top + 1]], color)
+                    done += 1
+                    self.level = top + 1
+                    self._add_border(cv, color)
+                    if color == BG:
+                        break
+                    continue
+                self.level = self.split = 0   # дальше по частям
+                bx0, by0, comp, inner = self._component(*inner)
+                dist = self.dist[by0:by0+comp.shape[0], bx0:bx0+comp.shape[1]]
+                rings, more = ring_chain(comp, dist, inner, step,
+                                         None if count is None else count - done, self.far, cv.stop)
+                rw = self.rect[2] - self.rect[0]
+                for (bys, bxs), (ys, xs) in rings:   # пропущенные step-1 колец тоже сняты
+                    total += self._paint(cv, (bys + by0)*rw + bxs + bx0, (ys + by0)*rw + xs + bx0, color)
+                    done += 1
+                self._add_border(cv, color)
+                if not more or color == BG:
+                    break
+
+            self._add_border(cv, color)
+            if color == BG and total:
+                self.reset()   # фоновое кольцо не граница: в режиме "fill" следующий клик снимет его же
+            return total
+
+def _root(parent, ids):
+    r = parent[ids]
+    while True:
+        up = parent[r]
+        if (up == r).all():
+            parent[ids] = r
+            return r
+        r = up
+
+def ring_chain(comp, dist, seed, step, count, far, stop=None):
+    """
+    Кольца связной части comp (маска, dist — расстояния до границы там же), которые
+    снимаются подряд, пока точка seed = (x, y) части ещё не снята (дальше клик уходит
+    к соседу — это решает вызывающий). Кольцо i — пиксели уровня K_i + step - 1, связные
+    с seed внутри comp ∩ {dist ≥ K_i}; K_0 — наименьший уровень части, K_{i+1} = K_i + step.
+    Для колец i ≥ 1 связность считается разом для всех уровней: рёбра между соседями
+    (вес — меньший из двух уровней) сливаются в систему множеств по убыванию веса.
+    -> ([(полоса, кольцо), ...], more): полоса — уровни K_i..K_i + step - 1 (снимаются),
+    кольцо — её последний уровень (рисуется), оба — (ys, xs); more — кольца кончились
+    потому, что снят seed.
+    """
+    h, w = comp.shape
+    sx, sy = seed
+    vals = dist[comp]
+    low, ds = int(vals.min()), int(dist[sy, sx])
+    levels, more = [], False
+    while count is None or len(levels) < count:
+        k = low + len(levels)*step
+        if k > ds:
+            more = True   # seed снят предыдущим кольцом
+            break
+        if k + step - 1 >= far:
+            break
+        levels.append(k)
+    if len(levels) <= 1:   # первая полоса — вся часть до уровня K_0 + step - 1
+        rings = []
+        for k in levels:
+            ring = np.nonzero(comp & (dist == k + step - 1))
+            if not len(ring[0]):
+                return [], False
+            rings.append((np.nonzero(comp & (dist < k + step)) if step > 1 else ring, ring))
+        return rings, more
+
+    # вершины — пиксели части по убыванию уровня: старшие уровни получают меньшие номера,
+    # поэтому корень множества (наименьший номер) не меняется, когда к нему цепляются нижние
+    top = int(vals.max())
+    flat = np.flatnonzero(comp.ravel())
+    lv = dist.ravel()[flat]
+    key = (top - lv).astype(np.uint16 if top < 1 << 16 else np.int64)
+    order = np.argsort(key, kind="stable")
+    flat, lv = flat[order], lv[order]
+    rank = np.full(h*w, -1, np.int64)
+    rank[flat] = np.arange(len(flat))
+    pairs = []
+    for a, b in ((comp[:, :-1] & comp[:, 1:], 1), (comp[:-1] & comp[1:], w)):
+        p = np.flatnonzero(a)
+        if b == 1:
+            p = p // (w-1) * w + p % (w-1)
+        pairs.append((p, p + b))
+    p = np.concatenate([q[0] for q in pairs])
+    q = np.concatenate([q[1] for q in pairs])
+    weight = np.minimum(dist.ravel()[p], dist.ravel()[q])
+    eorder = np.argsort((top - weight).astype(key.dtype), kind="stable")
+    eu, ev, weight = rank[p[eorder]], rank[q[eorder]], -weight[eorder]
+    ks = np.array(levels)
+    ends = np.searchsorted(weight, -ks, "right")                 # рёбра веса ≥ K_i
+    los = np.searchsorted(-lv, -(ks + step - 1), "left")          # вершины уровней K_i + step - 1 ...
+    mids = np.searchsorted(-lv, -(ks + step - 1), "right")
+    his = np.searchsorted(-lv, -ks, "right")                      # ... K_i
+    parent = np.arange(len(flat))
+    a = rank[sy*w + sx]
+    rings, done = [None]*len(levels), 0
+    for i in range(len(levels) - 1, -1, -1):
+        if stop is not None and stop.is_set():
+            raise Cancelled()
+        end, lo, mid, hi = ends[i], los[i], mids[i], his[i]
+        if end > done:
+            # новые рёбра соединяют новые вершины (уровни ≥ K_i) с корнями уже собранных множеств
+            ids, inv = np.unique(np.concatenate([_root(parent, eu[done:end]),
+                                                 _root(parent, ev[done:end])]), return_inverse=True)
+            local = _join(len(ids), inv[:end-done], inv[end-done:])
+            parent[ids] = ids[local]
+            done = end
+        band = lo + np.flatnonzero(_root(parent, np.arange(lo, hi)) == _root(parent, np.array([a]))[0])
+        ring = flat[band[band < mid]]
+        band = flat[band]
+        rings[i] = ((band // w, band % w), (ring // w, ring % w))
+    for i, (_, (ys, xs)) in enumerate(rings):
+        if not len(xs):
+            return rings[:i], False
+    return rings, more
+
+def _inner_seed(cv, is_border, seed):
+    """Клик по границе — в первый внутренний соседний пиксель (как в inner_contour_from_inside)."""
+    sx, sy = seed
+    if not is_border(sx, sy):
+        return sx, sy
+    for dx, dy in NBS4:
+        nx, ny = sx+dx, sy+dy
+        if cv.in_bounds(nx, ny) and not is_border(nx, ny):
+            return nx, ny
+    return None, None
+
+def draw_points(cv, pts, color=(255,0,0)):
+    if not pts:
+        return
+    xs, ys = zip(*pts)
+    with cv:
+        cv.scatter(xs, ys, color)
@@ -0,0 +1,121 @@
+# Сохранение холста (без окна):
+#   save_array(arr, "out.png", png_level=1)   — по расширению: .png | .npy | .rgb (сырые байты) | прочее через pygame
+#   saver = BackgroundSaver("out", "png", naming="numbered"); saver.save(cv)  — снимок сразу, запись в потоке
+# PNG пишется своим кодировщиком (zlib построчно): уровень сжатия выбирается (0 — без сжатия,
+# быстро; 9 — медленно и мелко), pygame в потоке записи не нужен.
+import os, re, time, zlib, struct, queue, threading
+import numpy as np
+
+PNG_LEVEL = 6      # уровень zlib по умолчанию (как у большинства кодировщиков)
+
+def _chunk(f, kind, data):
+    f.write(struct.pack(">I", len(data)) + kind + data)
+    f.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+def write_png(path, rows, w, h, level=PNG_LEVEL):
+    """
+    PNG 8 бит RGB из строк: rows — итератор массивов (n, w, 3) uint8 (полосы по n строк,
+    всего h строк). Строки сжимаются по мере поступления — весь кадр в памяти не нужен.
+    """
+    z = zlib.compressobj(level)
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        _chunk(f, b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+        for band in rows:
+            # фильтр 0 (None) — байт перед каждой строкой
+            data = np.empty((band.shape[0], w*3 + 1), dtype=np.uint8)
+            data[:, 0] = 0
+            data[:, 1:] = band.reshape(band.shape[0], w*3)
+            out = z.compress(data.tobytes())
+            if out:
+                _chunk(f, b"IDAT", out)
+        _chunk(f, b"IDAT", z.flush())
+        _chunk(f, b"IEND", b"")
+
+def save_array(arr, path, png_level=PNG_LEVEL):
+    """Сохранить (h, w, 3) uint8; формат — по расширению path."""
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        np.save(path, arr)
+    elif ext == ".rgb":
+        np.ascontiguousarray(arr).tofile(path)
+    elif ext == ".png":
+        h, w = arr.shape[:2]
+        write_png(path, (arr[y:y + 64] for y in range(0, h, 64)), w, h, png_level)
+    else:
+        import pygame   # прочие форматы (bmp, jpg, tga) — как раньше
+        pygame.image.save(pygame.surfarray.make_surface(arr.transpose(1, 0, 2)), path)
+
+# расширения форматов BackgroundSaver
+FORMATS = {"png": ".png", "npy": ".npy", "raw": ".rgb"}
+
+class BackgroundSaver:
+    """
+    Сохранение в фоне: save(cv) копирует пиксели (единственная задержка для интерфейса)
+    и ставит запись в очередь потока. naming: "fixed" — base.ext (перезапись),
+    "numbered" — base_0001.ext, следующий свободный номер, "timestamp" — base_ГГГГММДД-ЧЧММСС-мс.ext.
+    Сырые кадры (.rgb) получают размер в имени: base_0001_1000x600.rgb.
+    """
+    def __init__(self, base="out", fmt="png", naming="numbered", png_level=PNG_LEVEL):
+        self.base, self.fmt, self.naming, self.png_level = base, fmt, naming, png_level
+        self.counter = None
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._loop, name="canvas-saver", daemon=True)
+        self.thread.start()
+
+    def next_path(self, w, h):
+        ext = FORMATS[self.fmt]
+        name = self.base
+        if self.naming == "numbered":
+            if self.counter is None:
+                # продолжаем нумерацию с уже лежащих файлов
+                d, prefix = os.path.split(self.base)
+                pat = re.compile(re.escape(prefix) + r"_(\d{4,})(_\d+x\d+)?\.\w+$")
+                nums = [int(m.group(1)) for m in map(pat.match, os.listdir(d or ".")) if m]
+                self.counter = max(nums, default=0)
+            self.counter += 1
+            name = f"{self.base}_{self.counter:04d}"
+        elif self.naming == "timestamp":
+            t = time.time()
+            name = f"{self.base}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(t))}-{int(t*1000) % 1000:03d}"
+        if self.fmt == "raw":
+            name += f"_{w}x{h}"
+        return name + ext
+
+    def save(self, cv):
+        """Снимок холста -> в очередь записи. -> путь будущего файла."""
+        with cv:
+            snap = cv.px.copy()
+        path = self.next_path(cv.w, cv.h)
+        self.queue.put((snap, path))
+        return path
+
+    def export(self, image):
+        """Записать в потоке объект с методом export(path, png_level) — напр. TiledImage (без снимка)."""
+        path = self.next_path(image.w, image.h)
+        self.queue.put((image, path))
+        return path
+
+    def _loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            src, path = item
+            t0 = time.perf_counter()
+            try:
+                if isinstance(src, np.ndarray):
+                    save_array(src, path, self.png_level)
+                else:
+                    src.export(path, self.png_level)
+                print(f"Saved to {path} ({(time.perf_counter() - t0)*1000:.0f} ms)")
+            except Exception as e:
+                print(f"Save to {path} failed: {type(e).__name__}: {e}")
+
+    def close(self):
+        """Дописать очередь и остановить поток (перед выходом)."""
+        self.queue.put(None)
+        self.thread.join()
@@ -0,0 +1,5 @@
+# Тесты запускаются из корня: python -m pytest -q
+# Модули проекта лежат в корне репозитория, а не в пакете — добавляем его в sys.path.
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
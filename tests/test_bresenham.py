@@ -0,0 +1,73 @@
+# Пакетный bresenham_pixels против поотрезочного bresenham_line: те же пиксели в том же
+# порядке (после отсечения холстом), на случайных отрезках — внутри холста, за его краями,
+# вертикальных, горизонтальных, диагональных и нулевой длины.
+import random
+import numpy as np
+import pytest
+
+from raster import Canvas, bresenham_line, bresenham_pixels, bresenham_segments
+
+W, H = 64, 48
+
+class Recorder:
+    """Вместо холста: запоминает, что bresenham_line отдал в scatter."""
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def scatter(self, xs, ys, color):
+        self.xs, self.ys = list(xs), list(ys)
+
+def reference_pixels(seg):
+    rec = Recorder()
+    bresenham_line(rec, *seg, (0, 0, 0))
+    return [(x, y) for x, y in zip(rec.xs, rec.ys) if 0 <= x < W and 0 <= y < H]
+
+def random_segments(seed, n=400):
+    rnd = random.Random(seed)
+    def coord(size):   # чаще на холсте, иногда далеко за краем
+        return rnd.randint(-size, 2*size) if rnd.random() < 0.4 else rnd.randrange(size)
+    segs = []
+    for _ in range(n):
+        x0, y0 = coord(W), coord(H)
+        kind = rnd.randrange(5)
+        if kind == 0:
+            x1, y1 = x0, coord(H)             # вертикальный
+        elif kind == 1:
+            x1, y1 = coord(W), y0             # горизонтальный
+        elif kind == 2:
+            x1, y1 = x0, y0                   # нулевой длины
+        elif kind == 3:
+            d = rnd.randint(-W, W)            # диагональ
+            x1, y1 = x0 + d, y0 + rnd.choice((-1, 1))*d
+        else:
+            x1, y1 = coord(W), coord(H)
+        segs.append((x0, y0, x1, y1))
+    return segs
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_bresenham_line(seed):
+    segs = random_segments(seed)
+    xs, ys, seg = bresenham_pixels(segs, W, H)
+    got = list(zip(xs.tolist(), ys.tolist(), seg.tolist()))
+    want = [(x, y, k) for k, s in enumerate(segs) for x, y in reference_pixels(s)]
+    assert got == want
+
+@pytest.mark.parametrize("seg", [
+    (10, 10, 10, 10), (-5, -5, -5, -5), (W, 3, W, 3),     # точки на холсте и вне его
+    (3, -20, 3, H + 20), (-20, 7, W + 20, 7),             # насквозь через холст
+    (-30, -10, -1, -40), (W + 1, 0, W + 50, H),           # целиком за краем
+    (0, 0, W - 1, H - 1), (W - 1, 0, 0, H - 1),           # диагонали в обе стороны
+])
+def test_edge_cases(seg):
+    xs, ys, _ = bresenham_pixels([seg], W, H)
+    assert list(zip(xs.tolist(), ys.tolist())) == reference_pixels(seg)
+
+def test_segments_draw_same_canvas():
+    segs = random_segments(99, n=200)
+    one, batch = Canvas.blank(W, H), Canvas.blank(W, H)
+    for s in segs:
+        bresenham_line(one, *s, (0, 0, 0))
+    bresenham_segments(batch, segs, (0, 0, 0))
+    with one, batch:
+        assert np.array_equal(one.px, batch.px)
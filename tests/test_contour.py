@@ -0,0 +1,94 @@
+# Обход контура (trace_contour) и ломаная по нему: контур замкнут и 4-связен, содержит все
+# пиксели «кольца» inner_contour_from_inside на замкнутом многоугольнике; Дуглас–Пекер
+# сохраняет концы и не отходит от исходной ломаной дальше eps.
+import math
+import random
+import pytest
+
+import raster
+from raster import (Canvas, bresenham_polyline, inner_contour_from_inside, trace_contour,
+                    simplify_polyline, contour_polyline)
+
+W, H = 160, 120
+BLACK = (0, 0, 0)
+
+@pytest.fixture(autouse=True)
+def keep_borders():
+    saved = set(raster.BORDER_COLORS)
+    raster.BORDER_COLORS.clear(); raster.BORDER_COLORS.add(BLACK)
+    yield
+    raster.BORDER_COLORS.clear(); raster.BORDER_COLORS.update(saved)
+
+def star(rnd, n):
+    """Простой (звёздный) многоугольник: вершины по углу с шагом < pi, центр холста всегда внутри."""
+    cx, cy = W // 2, H // 2
+    return [(int(cx + r*math.cos(a)), int(cy + r*math.sin(a)))
+            for a, r in ((2*math.pi*(i + rnd.uniform(0, 0.8))/n, rnd.uniform(15, 55)) for i in range(n))]
+
+def polygon_canvas(seed):
+    rnd = random.Random(seed)
+    cv = Canvas.blank(W, H)
+    bresenham_polyline(cv, star(rnd, rnd.randint(5, 12)), BLACK, closed=True)
+    return cv
+
+def seg_dist(p, a, b):
+    """Расстояние от точки p до отрезка [a, b]."""
+    (px, py), (ax, ay), (bx, by) = p, a, b
+    dx, dy = bx - ax, by - ay
+    L2 = dx*dx + dy*dy
+    t = 0 if L2 == 0 else min(1, max(0, ((px - ax)*dx + (py - ay)*dy) / L2))
+    return math.hypot(px - ax - t*dx, py - ay - t*dy)
+
+def check_simplified(pts, out, eps):
+    """Концы на месте, вершины — подпоследовательность pts, каждая выброшенная точка в eps от своего отрезка."""
+    assert out[0] == tuple(pts[0]) and out[-1] == tuple(pts[-1])
+    at = [0]
+    for v in out[1:]:
+        at.append(next(i for i in range(at[-1] + 1, len(pts)) if tuple(pts[i]) == v))
+    for i, j in zip(at, at[1:]):
+        for p in pts[i + 1:j]:
+            assert seg_dist(p, pts[i], pts[j]) <= eps + 1e-9
+
+@pytest.mark.parametrize("seed", range(40))
+def test_contour_closed_and_covers_ring(seed):
+    cv = polygon_canvas(seed)
+    c = trace_contour(cv, (W // 2, H // 2))
+    assert len(c) > 4
+    for (x0, y0), (x1, y1) in zip(c, c[1:] + c[:1]):           # замкнут, шаги только по 4 соседям
+        assert abs(x1 - x0) + abs(y1 - y0) == 1
+    with cv:
+        assert all(cv.get(x, y) != BLACK for x, y in c)
+    assert set(inner_contour_from_inside(cv, (W // 2, H // 2))) <= set(c)
+
+def test_contour_of_canvas_edge_and_single_pixel():
+    cv = Canvas.blank(6, 4)
+    c = trace_contour(cv, (2, 2))                                  # край холста — тоже граница
+    assert set(c) == {(x, y) for x in range(6) for y in range(4) if x in (0, 5) or y in (0, 3)}
+    cv = Canvas.blank(5, 5)
+    bresenham_polyline(cv, [(1, 1), (3, 1), (3, 3), (1, 3)], BLACK, closed=True)
+    assert trace_contour(cv, (2, 2)) == [(2, 2)]
+
+@pytest.mark.parametrize("eps", [0.5, 1.0, 2.5, 6.0])
+def test_simplify_keeps_ends_within_eps(eps):
+    rnd = random.Random(int(eps*10))
+    for _ in range(30):
+        pts, x, y = [], 0, 0
+        for _ in range(rnd.randint(3, 200)):   # случайное блуждание — много почти прямых участков
+            x, y = x + rnd.randint(-1, 3), y + rnd.randint(-2, 2)
+            pts.append((x, y))
+        check_simplified(pts, simplify_polyline(pts, eps), eps)
+
+def test_simplify_degenerate():
+    assert simplify_polyline([(0, 0), (5, 5)], 1.0) == [(0, 0), (5, 5)]
+    line = [(i, 2*i) for i in range(20)]
+    assert simplify_polyline(line, 0.1) == [(0, 0), (19, 38)]
+    assert simplify_polyline(line, 0) == line
+
+@pytest.mark.parametrize("seed", range(10))
+def test_contour_polyline_closed_within_eps(seed):
+    cv = polygon_canvas(seed)
+    c = trace_contour(cv, (W // 2, H // 2))
+    for eps in (0.5, 1.5, 3.0):
+        poly = contour_polyline(c, eps)
+        assert poly[0] == poly[-1] == c[0] and len(poly) < len(c)
+        check_simplified(c + c[:1], poly, eps)
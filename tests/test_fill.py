@@ -0,0 +1,121 @@
+# Нагрузочная проверка заливки на весь холст 1000x600: змейка-лабиринт и «гребёнка» случайных
+# штрихов. Span-заливка (scanline_fill_color) сравнивается с прежней рекурсивной — по пикселям.
+# Замер до/после:  python tests/test_fill.py   (пиксели/с обеих заливок на каждой сцене)
+import os, sys, time, random, threading
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from raster import Canvas, pack_rgb, bresenham_segments, scanline_fill_color, label_regions
+from bench import scene_maze
+
+W, H = 1000, 600
+WHITE, BLACK, RED = (255, 255, 255), (0, 0, 0), (255, 0, 0)
+
+def scene_comb(w, h, seed=7, teeth=180):
+    """Гребёнка: зубья сверху и снизу случайной длины плюс случайные короткие штрихи."""
+    rnd = random.Random(seed)
+    cv = Canvas.blank(w, h)
+    segs = []
+    for i in range(teeth):
+        x = rnd.randrange(w)
+        if i % 2:
+            segs.append((x, 0, x, rnd.randrange(h*3//4)))
+        else:
+            segs.append((x, h - 1 - rnd.randrange(h*3//4), x, h - 1))
+    for _ in range(teeth):
+        x, y = rnd.randrange(w), rnd.randrange(h)
+        segs.append((x, y, x + rnd.randint(-20, 20), y + rnd.randint(-20, 20)))
+    bresenham_segments(cv, segs, BLACK)
+    return cv
+
+SCENES = {"maze": (scene_maze, (1, 1)), "comb": (scene_comb, None)}
+
+def reference_fill(cv, seed, target, repl):
+    """Прежняя рекурсивная scanline-заливка (рекурсия на каждый отрезок соседней строки)."""
+    x0, y0 = seed
+    with cv:
+        rows = cv.key_rows()
+        _reference_rows(cv, rows, seed, pack_rgb(target), pack_rgb(repl), repl)
+
+def _reference_rows(cv, rows, seed, t, r, repl):
+    x0, y0 = seed
+    row = rows[y0]
+    if row[x0] != t:
+        return
+    xl = x0
+    while xl-1 >= 0 and row[xl-1] == t:
+        xl -= 1
+    xr = x0
+    while xr+1 < cv.w and row[xr+1] == t:
+        xr += 1
+    row[xl:xr+1] = [r] * (xr-xl+1)
+    cv.hspan(y0, xl, xr, repl)
+    for ny in (y0-1, y0+1):
+        if 0 <= ny < cv.h:
+            nrow = rows[ny]
+            x = xl
+            while x <= xr:
+                if nrow[x] == t:
+                    _reference_rows(cv, rows, (x, ny), t, r, repl)
+                    while x <= xr and nrow[x] == r:
+                        x += 1
+                x += 1
+
+def run_deep(fn, *args):
+    """Рекурсивной заливке на весь холст нужен глубокий стек — запускаем в отдельном потоке."""
+    out = {}
+    def work():
+        try:
+            out["result"] = fn(*args)
+        except BaseException as e:
+            out["error"] = e
+    limit = sys.getrecursionlimit()
+    old = threading.stack_size(512 << 20)
+    sys.setrecursionlimit(1 << 20)
+    try:
+        t = threading.Thread(target=work)
+        t.start()
+        t.join()
+    finally:
+        threading.stack_size(old)
+        sys.setrecursionlimit(limit)
+    if "error" in out:
+        raise out["error"]
+    return out.get("result")
+
+def scene(name):
+    make, seed = SCENES[name]
+    cv = make(W, H)
+    if seed is None:   # самая большая белая область сцены
+        keys = cv.keys_of(cv.arr)
+        labels, size, _ = label_regions(keys)
+        size[np.unique(labels[keys != pack_rgb(WHITE)])] = 0
+        ys, xs = np.nonzero(labels == size.argmax())
+        seed = (int(xs[0]), int(ys[0]))
+    return cv, seed
+
+def timed(fn, cv, seed):
+    before = cv.arr.copy()
+    t0 = time.perf_counter()
+    run_deep(fn, cv, seed, WHITE, RED)
+    dt = time.perf_counter() - t0
+    return dt, int((cv.arr != before).any(axis=2).sum())
+
+@pytest.mark.parametrize("name", sorted(SCENES))
+def test_span_fill_matches_recursive_fill(name):
+    new, seed = scene(name)
+    old, _ = scene(name)
+    _, changed = timed(scanline_fill_color, new, seed)
+    timed(reference_fill, old, seed)
+    assert changed > W*H // 4      # заливка действительно на большую часть холста
+    assert np.array_equal(new.arr, old.arr)
+
+if __name__ == "__main__":
+    print(f"{'scene':<6} {'pixels':>8} {'before Mpx/s':>13} {'after Mpx/s':>12} {'speedup':>8}")
+    for name in sorted(SCENES):
+        cv, seed = scene(name)
+        t_old, n = timed(reference_fill, cv, seed)
+        cv, seed = scene(name)
+        t_new, _ = timed(scanline_fill_color, cv, seed)
+        print(f"{name:<6} {n:>8} {n/t_old/1e6:>13.2f} {n/t_new/1e6:>12.2f} {t_old/t_new:>7.1f}x")
@@ -0,0 +1,53 @@
+# Заливка с допуском и сглаживанием: Canvas.match останавливается ровно на пороге в обеих
+# метриках, а composite_fill перекрашивает сглаженный край смесью и не трогает жёсткую границу.
+import math
+import numpy as np
+import pytest
+
+from raster import Canvas, color_distance, scanline_fill_color
+
+WHITE, BLACK, RED = (255, 255, 255), (0, 0, 0), (255, 0, 0)
+
+def gradient(w=60, h=8):
+    """Столбец x — серый 255 - x: до белого по каналам x, по евклиду x*sqrt(3)."""
+    cv = Canvas.blank(w, h)
+    cv.arr[:] = (255 - np.arange(w, dtype=np.uint8))[None, :, None]
+    return cv
+
+@pytest.mark.parametrize("metric, tolerance, last", [
+    ("channel", 0, 0), ("channel", 10, 10), ("channel", 10.5, 10), ("channel", 37, 37),
+    ("euclid", math.sqrt(3*10**2), 10), ("euclid", math.sqrt(3*10**2) - 1e-6, 9), ("euclid", 50, 28),
+])
+def test_tolerance_stops_at_threshold(metric, tolerance, last):
+    cv = gradient()
+    with cv:
+        m = cv.match(WHITE, tolerance, metric)
+        assert (m == (color_distance(cv.px, WHITE, metric) <= tolerance)).all()
+        assert m[0].tolist() == [x <= last for x in range(cv.w)]
+    scanline_fill_color(cv, (0, 4), WHITE, RED, tolerance, metric)
+    filled = (cv.arr == RED).all(axis=2)
+    assert filled.all(axis=0).tolist() == [x <= last for x in range(cv.w)]
+
+def framed_edge():
+    """Белая область в чёрной рамке; вдоль левого края — пиксели Ву с покрытием 50% (серый 128)."""
+    cv = Canvas.blank(40, 30)
+    cv.arr[5, 5:35] = cv.arr[24, 5:35] = BLACK
+    cv.arr[5:25, 5] = cv.arr[5:25, 34] = BLACK
+    cv.arr[6:24, 6] = 128
+    return cv
+
+@pytest.mark.parametrize("metric", ["channel", "euclid"])
+def test_antialias_blends_edge_keeps_border(metric):
+    cv = framed_edge()
+    before = cv.arr.copy()
+    scanline_fill_color(cv, (20, 15), WHITE, RED, 0, metric, antialias=True)
+    assert (cv.arr[6:24, 7:34] == RED).all()          # область — чистый цвет заливки
+    assert (cv.arr[6:24, 6] == (128, 0, 0)).all()     # 50% края: половина белого стала красной
+    inside = np.zeros(cv.arr.shape[:2], dtype=bool)
+    inside[6:24, 6:34] = True
+    assert (cv.arr[~inside] == before[~inside]).all()  # жёсткая рамка и всё за ней — как было
+
+def test_no_antialias_leaves_edge():
+    cv = framed_edge()
+    scanline_fill_color(cv, (20, 15), WHITE, RED)
+    assert (cv.arr[6:24, 7:34] == RED).all() and (cv.arr[6:24, 6] == 128).all()
@@ -0,0 +1,84 @@
+# Отмена без копии холста: History.begin открывает Backup, прежние пиксели сохраняются
+# плитками при первой записи. Запись каждой операции должна совпасть с разницей «полная
+# копия до — холст после», а undo/redo — возвращать холст точно.
+import random
+import numpy as np
+import pytest
+
+import raster
+from raster import (Canvas, Backup, RingCache, bresenham_line, bresenham_segments, wu_line,
+                    wu_segments, fill_triangle_barycentric, scanline_fill_color,
+                    scanline_fill_pattern, checker_pattern, draw_points, trace_contour)
+from history import Delta, History
+from bench import scene_maze
+
+W, H = 300, 200
+
+def random_op(rnd, rings):
+    c = tuple(rnd.randrange(256) for _ in range(3))
+    x, y = rnd.randrange(W), rnd.randrange(H)
+    p = lambda: (rnd.randint(-40, W + 40), rnd.randint(-40, H + 40))
+    ops = [
+        lambda cv: bresenham_line(cv, *p(), *p(), c),
+        lambda cv: bresenham_segments(cv, [(*p(), *p()) for _ in range(5)], c),
+        lambda cv: wu_line(cv, *p(), *p(), c),
+        lambda cv: wu_segments(cv, [(*p(), *p()) for _ in range(5)], c),
+        lambda cv: fill_triangle_barycentric(cv, p(), p(), p(), c, (0, 255, 0), (0, 0, 255)),
+        lambda cv: scanline_fill_color(cv, (x, y), _at(cv, x, y), c, rnd.choice((0, 40)),
+                                       antialias=rnd.random() < 0.5),
+        lambda cv: scanline_fill_pattern(cv, (x, y), _at(cv, x, y), checker_pattern(), (x, y)),
+        lambda cv: rings.peel(cv, (x, y), c),
+        lambda cv: draw_points(cv, trace_contour(cv, (x, y)), c),
+    ]
+    return rnd.choice(ops)
+
+def _at(cv, x, y):
+    with cv:
+        return cv.get(x, y)
+
+@pytest.mark.parametrize("seed", range(4))
+def test_lazy_backup_matches_full_copy(seed):
+    rnd = random.Random(seed)
+    saved = set(raster.BORDER_COLORS)
+    try:
+        cv, hist, rings = scene_maze(W, H), History(), RingCache()
+        states = [cv.arr.copy()]
+        for _ in range(40):
+            op = random_op(rnd, rings)
+            before, n = cv.arr.copy(), len(hist.undos)
+            hist.begin(cv)
+            op(cv)
+            hist.end(cv)
+            full = Delta.between(before, cv.arr, (0, 0, W, H))
+            if full is None:   # пиксели не менялись — запись разве что о смене BORDER_COLORS
+                assert len(hist.undos) == n or not len(hist.undos[-1].starts)
+            else:
+                got = hist.undos[-1]
+                order = np.argsort(_expand(got))
+                assert np.array_equal(_expand(got)[order], _expand(full))
+                assert np.array_equal(got.before[order], full.before)
+                assert np.array_equal(got.after[order], full.after)
+                assert got.rect == full.rect
+            states.append(cv.arr.copy())
+        n = len(hist.undos)
+        for k in range(n):
+            hist.undo(cv)
+        assert np.array_equal(cv.arr, states[0])
+        for k in range(n):
+            hist.redo(cv)
+        assert np.array_equal(cv.arr, states[-1])
+    finally:
+        raster.BORDER_COLORS.clear(); raster.BORDER_COLORS.update(saved)
+
+def _expand(d):
+    offs = np.repeat(d.starts - np.r_[0, np.cumsum(d.lengths)[:-1]], d.lengths)
+    return offs + np.arange(int(d.lengths.sum()))
+
+def test_backup_copies_only_touched_tiles():
+    cv = Canvas.blank(1000, 600)
+    b = Backup(cv)
+    bresenham_line(cv, 10, 10, 20, 12, (0, 0, 0))
+    b.close()
+    assert list(b.tiles) == [(0, 0)]
+    bresenham_line(cv, 500, 500, 600, 590, (0, 0, 0))   # после close — не сохраняется
+    assert list(b.tiles) == [(0, 0)] and not cv.backups
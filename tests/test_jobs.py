@@ -0,0 +1,97 @@
+# CanvasJob: отмена прерывает сам счёт (поток сразу отпускает _serial), а цвета-границы
+# операции попадают в общий BORDER_COLORS только из commit законченной операции.
+# process=True: тот же результат, что в потоке, и та же отмена.
+import time
+import pytest
+
+import raster
+import jobs
+from raster import (Canvas, RingCache, borders_of, bresenham_polyline, draw_points,
+                    inner_contour_from_inside, scanline_fill_color)
+from jobs import CanvasJob
+
+RED = (255, 0, 0)
+
+@pytest.fixture(autouse=True)
+def keep_borders():
+    saved = set(raster.BORDER_COLORS)
+    yield
+    raster.BORDER_COLORS.clear(); raster.BORDER_COLORS.update(saved)
+
+def boundary(cv, seed, color):
+    draw_points(cv, inner_contour_from_inside(cv, seed), color)
+    borders_of(cv).add(color)
+
+def wait(job, timeout=10.0):
+    t0 = time.perf_counter()
+    while not job.commit(budget=1.0):
+        assert time.perf_counter() - t0 < timeout
+        time.sleep(0.001)
+
+def released(timeout):
+    """Отпустил ли поток операции _serial за timeout секунд."""
+    if jobs._serial.acquire(timeout=timeout):
+        jobs._serial.release()
+        return True
+    return False
+
+def framed(w, h):
+    cv = Canvas.blank(w, h)
+    bresenham_polyline(cv, [(0, 0), (w - 1, 0), (w - 1, h - 1), (0, h - 1)], (0, 0, 0), closed=True)
+    return cv
+
+@pytest.mark.parametrize("fn, args, process", [
+    (boundary, ((600, 600), RED), False),                           # BFS по миллиону пикселей
+    (boundary, ((600, 600), RED), True),                            # он же в процессе
+    (lambda cv, *a: RingCache().peel(cv, *a), ((600, 600), RED, None), False),   # все 600 колец
+])
+def test_cancel_stops_computation(fn, args, process):
+    cv = framed(1200, 1200)
+    jobs.start_processes()
+    t0 = time.perf_counter()
+    full = CanvasJob("probe", cv, fn, args, process=process)
+    wait(full)
+    total = time.perf_counter() - t0
+    raster.BORDER_COLORS.discard(RED)
+
+    job = CanvasJob("boundary", cv, fn, args, process=process)
+    time.sleep(min(0.05, total / 4))
+    job.cancel()
+    assert released(total / 4), f"worker still busy after cancel (full run {total:.2f} s)"
+    assert job.commit() and job.work is None
+    assert RED not in raster.BORDER_COLORS
+
+def test_borders_applied_on_commit_only():
+    cv = Canvas.blank(200, 150)
+    job = CanvasJob("boundary", cv, boundary, ((100, 75), RED))
+    while not job.ready:
+        time.sleep(0.001)
+    assert RED not in raster.BORDER_COLORS     # посчитано, но не перенесено
+    job.cancel()
+    assert RED not in raster.BORDER_COLORS
+
+    job = CanvasJob("boundary", cv, boundary, ((100, 75), RED))
+    wait(job)
+    assert RED in raster.BORDER_COLORS
+
+def test_cancelled_fill_leaves_canvas():
+    cv = Canvas.blank(200, 150)
+    before = cv.arr.copy()
+    job = CanvasJob("fill", cv, scanline_fill_color, ((5, 5), (255, 255, 255), RED))
+    while not job.ready:
+        time.sleep(0.001)
+    job.commit(budget=0.0)                      # одна полоса уже на холсте
+    job.cancel()
+    assert (cv.arr == before).all()
+
+def test_process_matches_thread():
+    results = []
+    for process in (False, True):
+        cv = framed(300, 200)
+        bresenham_polyline(cv, [(150, 0), (150, 120)], (0, 0, 0))
+        job = CanvasJob("boundary", cv, boundary, ((60, 60), RED), process=process)
+        wait(job)
+        results.append((cv.arr, job.rect, set(raster.BORDER_COLORS)))
+        raster.BORDER_COLORS.discard(RED)
+    (a, ra, ba), (b, rb, bb) = results
+    assert (a == b).all() and ra == rb and ba == bb and RED in bb
@@ -0,0 +1,157 @@
+# Журнал сессии: каждое действие переживает запись и чтение без потерь, restore собирает
+# тот же холст, что был живым, а недописанная последняя запись (падение) просто отбрасывается.
+import os
+import random
+import numpy as np
+import pytest
+import pygame
+
+import raster
+from raster import BG, Canvas, RingCache, checker_pattern
+from journal import (ACTIONS, KEYFRAME, Journal, apply_action, decode, read_journal, restore,
+                     METRICS, BOUNDARY_MODES)
+
+W, H = 160, 120
+PATTERN = checker_pattern(8)
+SAMPLE = {   # поля каждого действия: крайние значения форматов
+    "dot":        (5, -3, 255, 0, 17),
+    "stroke":     (-40, 7, 32767, -32768, 1, 2, 3),
+    "bresenham":  (0, 0, W - 1, H - 1, 0, 0, 0),
+    "wu":         (3, 110, 150, 4, 10, 20, 30),
+    "triangle":   (10, 10, 150, 20, 40, 110, 255, 0, 0, 0, 255, 0, 0, 0, 255),
+    "fill_color": (80, 60, 255, 128, 0, 12.5, 1, True),
+    "fill_img":   (80, 60, -4, -4, False, 0.0, 0, False),
+    "boundary":   (80, 60, 255, 0, 0, 2, -1, 3),
+    "clear":      (255, 255, 255),
+}
+
+@pytest.fixture(autouse=True)
+def keep_borders():
+    saved = set(raster.BORDER_COLORS)
+    yield
+    raster.BORDER_COLORS.clear(); raster.BORDER_COLORS.update(saved)
+
+def surface_canvas():
+    return Canvas(pygame.Surface((W, H)))
+
+def pixels(cv):
+    with cv:
+        return cv.px.copy()
+
+def test_every_action_round_trips(tmp_path):
+    assert set(SAMPLE) == set(ACTIONS)
+    path = str(tmp_path / "j")
+    borders = {(0, 0, 0), (255, 0, 0), (1, 2, 3)}
+    j = Journal(path, W, H)
+    j.keyframe(Canvas.blank(W, H), PATTERN)
+    for name, fields in SAMPLE.items():
+        j.record(name, fields, borders)
+    starts, lengths = np.array([5, 400]), np.array([3, 2])
+    colors = np.arange(15, dtype=np.uint8).reshape(5, 3)
+    j.record("patch", (starts, lengths, colors), set())
+    j.close()
+
+    w, h, recs, end = read_journal(path, everything=True)
+    assert (w, h) == (W, H) and end == os.path.getsize(path)
+    got = [decode(kind, data, w, h) for kind, data in recs]
+    name, (frame, pattern), _ = got[0]
+    assert name == "keyframe" and (frame == BG).all() and (pattern == PATTERN).all()
+    for (name, fields), (gname, gfields, gborders) in zip(SAMPLE.items(), got[1:]):
+        assert (gname, tuple(gfields), gborders) == (name, fields, borders)
+    name, (s, l, c), b = got[-1]
+    assert name == "patch" and (s == starts).all() and (l == lengths).all() and (c == colors).all() and b == set()
+
+def random_session(rnd, n):
+    """Действия интерфейса со случайными полями (как их пишет main.py)."""
+    p = lambda: (rnd.randrange(W), rnd.randrange(H))
+    c = lambda: rnd.choice([(0, 0, 0), (255, 0, 0), (0, 128, 255), (40, 200, 40)])
+    for _ in range(n):
+        name = rnd.choice(["dot", "stroke", "bresenham", "wu", "triangle", "fill_color",
+                           "fill_img", "boundary", "boundary", "patch"])
+        if name == "dot":
+            yield name, (*p(), *c())
+        elif name in ("stroke", "bresenham", "wu"):
+            yield name, (*p(), *p(), *c())
+        elif name == "triangle":
+            yield name, (*p(), *p(), *p(), *c(), *c(), *c())
+        elif name == "fill_color":
+            yield name, (*p(), *c(), rnd.choice([0.0, 30.0]), rnd.randrange(len(METRICS)), rnd.random() < 0.3)
+        elif name == "fill_img":
+            yield name, (*p(), *p(), rnd.random() < 0.7, 0.0, 0, False)
+        elif name == "boundary":
+            yield name, (*p(), *c(), rnd.randrange(len(BOUNDARY_MODES)), rnd.choice([1, 2, -1]), 1)
+        else:   # отмена/повтор — готовые пиксели прямоугольника
+            x, y = p()
+            w, h = rnd.randint(1, 30), rnd.randint(1, 20)
+            w, h = min(w, W - x), min(h, H - y)
+            starts = (np.arange(y, y + h)*W + x).astype(np.int32)
+            lengths = np.full(h, w, np.int32)
+            colors = np.array([c()]*(w*h), np.uint8)
+            yield name, (starts, lengths, colors)
+
+def live_session(path, seed, n=60, keyframe_every=7):
+    """Сессия на живом холсте с журналом. -> снимки холста и BORDER_COLORS после каждого действия."""
+    rnd = random.Random(seed)
+    cv = surface_canvas()
+    with cv:
+        cv.px[...] = BG
+    raster.BORDER_COLORS.clear(); raster.BORDER_COLORS.add((0, 0, 0))
+    rings = RingCache()
+    j = Journal(path, W, H, keyframe_every)
+    j.keyframe(cv, PATTERN)
+    states = []
+    for name, fields in random_session(rnd, n):
+        apply_action(cv, name, fields, PATTERN, rings)
+        j.record(name, fields, raster.BORDER_COLORS)
+        if j.due():
+            j.keyframe(cv, PATTERN)
+        states.append((pixels(cv), set(raster.BORDER_COLORS)))
+    j.close()
+    return states
+
+@pytest.mark.parametrize("seed", range(4))
+def test_restore_matches_live(tmp_path, seed):
+    path = str(tmp_path / "j")
+    frame, borders = live_session(path, seed)[-1]
+    raster.BORDER_COLORS.clear()
+    cv = surface_canvas()
+    assert restore(path, cv) == os.path.getsize(path)
+    assert (pixels(cv) == frame).all() and raster.BORDER_COLORS == borders
+
+def test_torn_tail_dropped(tmp_path):
+    path = str(tmp_path / "j")
+    states = live_session(path, 11, n=30, keyframe_every=1000)   # один снимок — весь хвост
+    with open(path, "rb") as f:
+        whole = f.read()
+    _, _, recs, _ = read_journal(path)
+    last = len(recs[-1][1]) + 10                                 # последняя запись с заголовком и хвостом
+    for tail in (whole[:-1], whole[:-last // 2], whole[:-last + 1], whole[:-last] + b"\x15garbage"):
+        with open(path, "wb") as f:
+            f.write(tail)
+        cv = surface_canvas()
+        assert restore(path, cv) == len(whole) - last
+        frame, borders = states[-2]
+        assert (pixels(cv) == frame).all() and raster.BORDER_COLORS == borders
+
+def test_restart_rewrites_journal(tmp_path):
+    # как при запуске main.py: восстановить, начать журнал заново с одного снимка
+    path = str(tmp_path / "j")
+    frame, borders = live_session(path, 5, n=40, keyframe_every=9)[-1]
+    with open(path, "rb") as f:
+        old = f.read()
+    cv = surface_canvas()
+    restore(path, cv)
+    j = Journal(path, W, H)
+    with open(path, "rb") as f:
+        assert f.read() == old            # до снимка прежний журнал цел
+    j.keyframe(cv, PATTERN)
+    j.record("dot", (3, 3, 255, 0, 0), raster.BORDER_COLORS)
+    j.close()
+    assert not os.path.exists(path + ".new")
+    _, _, recs, _ = read_journal(path, everything=True)
+    assert [kind for kind, _ in recs] == [KEYFRAME, ACTIONS["dot"][0]]
+    assert os.path.getsize(path) < len(old)
+    apply_action(cv, "dot", (3, 3, 255, 0, 0), PATTERN, RingCache())
+    again = surface_canvas()
+    restore(path, again)
+    assert (pixels(again) == pixels(cv)).all() and raster.BORDER_COLORS == borders
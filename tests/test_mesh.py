@@ -0,0 +1,57 @@
+# Пакетный рендер сетки (render_mesh): пул процессов по тайлам даёт те же буферы цвета
+# и глубины, что и рендер без пула, а z-тест оставляет ближний треугольник при любом
+# порядке подачи треугольников.
+import random
+import numpy as np
+import pytest
+
+from raster import BG, Canvas, render_mesh
+
+W, H = 160, 120
+TILE = 32   # несколько тайлов на холсте — иначе пул не включается
+RED, BLUE = (255, 0, 0), (0, 0, 255)
+
+def random_mesh(seed, n=150):
+    """Случайные треугольники, часть за краями холста, с перекрытиями и разной глубиной вершин."""
+    rnd = random.Random(seed)
+    verts, colors = [], []
+    for _ in range(n):
+        cx, cy = rnd.uniform(-20, W + 20), rnd.uniform(-20, H + 20)
+        for _ in range(3):
+            verts.append((cx + rnd.uniform(-40, 40), cy + rnd.uniform(-40, 40), rnd.uniform(0, 100)))
+            colors.append((rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    faces = np.arange(3*n).reshape(n, 3)
+    return np.array(verts), np.array(colors, dtype=np.float64), faces
+
+def rendered(verts, colors, faces, workers):
+    cv = Canvas.blank(W, H)
+    depth = render_mesh(cv, verts, colors, faces, tile=TILE, workers=workers)
+    return cv.arr.copy(), depth
+
+@pytest.mark.parametrize("seed", range(3))
+def test_pool_matches_single_process(seed):
+    mesh = random_mesh(seed)
+    color1, depth1 = rendered(*mesh, workers=1)
+    color2, depth2 = rendered(*mesh, workers=2)
+    assert np.isfinite(depth1).mean() > 0.5
+    assert (color1 == color2).all()
+    assert np.array_equal(depth1, depth2)
+    assert (color1[np.isinf(depth1)] == BG).all()   # где сетки нет — холст как был
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_nearer_triangle_wins_in_any_order(workers):
+    # два пересекающихся по площади треугольника: красный на z=1, синий на z=5
+    verts = np.array([(10, 10, 1), (150, 20, 1), (60, 110, 1),
+                      (20, 100, 5), (140, 5, 5), (150, 110, 5)], dtype=np.float64)
+    colors = np.array([RED]*3 + [BLUE]*3, dtype=np.float64)
+    results = []
+    for faces in ([(0, 1, 2), (3, 4, 5)], [(3, 4, 5), (0, 1, 2)]):
+        results.append(rendered(verts, colors, faces, workers))
+    (c1, d1), (c2, d2) = results
+    assert (c1 == c2).all() and np.array_equal(d1, d2)
+    near, far = np.isclose(d1, 1), np.isclose(d1, 5)
+    assert near.any() and far.any() and not (near & far).any()
+    # цвет сплошной, но веса в сумме дают 1 лишь с точностью до округления: 255 -> 254 допустимо
+    assert (np.abs(c1[near].astype(int) - RED) <= 1).all() and (np.abs(c1[far].astype(int) - BLUE) <= 1).all()
+    only_red = np.isfinite(rendered(verts, colors, [(0, 1, 2)], workers)[1])
+    assert (near == only_red).all()   # ближний красный нигде не перекрыт синим
@@ -0,0 +1,51 @@
+# OpProfiler: тронутые пиксели — по плиткам Backup, журнал — пачками, а не на каждую операцию;
+# отменённые и упавшие операции — только в журнал, с пометкой.
+import json, time
+import pytest
+
+from raster import Cancelled, bresenham_line, scanline_fill_color
+from profiler import OpProfiler
+from bench import scene_maze
+
+def test_counts_changed_pixels(tmp_path):
+    cv = scene_maze(300, 200)
+    prof = OpProfiler(log_path=str(tmp_path / "ops.jsonl"))
+    for op, draw in (("bresenham", lambda: bresenham_line(cv, -10, 5, 250, 190, (255, 0, 0))),
+                     ("fill", lambda: scanline_fill_color(cv, (1, 1), (255, 255, 255), (0, 0, 255)))):
+        before = cv.arr.copy()
+        with prof.op(op, cv):
+            draw()
+        assert prof.last["pixels"] == int((cv.arr != before).any(axis=2).sum()) > 0
+        assert not cv.backups
+
+def test_log_is_batched(tmp_path):
+    path = tmp_path / "ops.jsonl"
+    cv = scene_maze(100, 80)
+    prof = OpProfiler(log_path=str(path), log_batch=10)
+    for i in range(25):
+        with prof.op("bresenham", cv, x=i):
+            bresenham_line(cv, i, 0, i, 79, (i, 0, 0))
+    assert len(path.read_text().splitlines()) == 20
+    prof.flush()
+    lines = path.read_text().splitlines()
+    assert [json.loads(l)["x"] for l in lines] == list(range(25))
+
+def test_unfinished_ops_marked(tmp_path):
+    path = tmp_path / "ops.jsonl"
+    cv = scene_maze(100, 80)
+    prof = OpProfiler(log_path=str(path))
+    with prof.op("bresenham", cv):
+        bresenham_line(cv, 0, 0, 99, 79, (255, 0, 0))
+    done = prof.last
+    for exc, status in ((Cancelled, "cancelled"), (ValueError, "error")):
+        with pytest.raises(exc):
+            with prof.op("fill", cv):
+                bresenham_line(cv, 0, 79, 99, 0, (0, 0, 255))
+                time.sleep(0.02)            # дольше готовой — но самой медленной не станет
+                raise exc()
+    assert prof.count == 1 and prof.last is done and prof.slowest is done
+    assert all(done["op"] in line for line in prof.lines()[1:])
+    prof.flush()
+    recs = [json.loads(l) for l in path.read_text().splitlines()]
+    assert [r.get("status") for r in recs] == [None, "cancelled", "error"]
+    assert recs[1]["pixels"] > 0
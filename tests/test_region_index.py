@@ -0,0 +1,122 @@
+# RegionIndex: заливка по карте областей (index=) должна давать ровно то же, что обычная
+# span-заливка, — на случайных сессиях из линий, треугольников и заливок цветом и рисунком.
+# Отдельно — переномерация, когда освободившихся номеров становится много, и штамп рисунком.
+import random
+import numpy as np
+import pytest
+import pygame
+
+from raster import (BG, Canvas, RegionIndex, bresenham_line, wu_line, fill_triangle_barycentric,
+                    scanline_fill_color, scanline_fill_pattern, checker_pattern, pattern_anchor,
+                    label_regions)
+
+PALETTE = [(0, 0, 0), (255, 0, 0), (0, 160, 0), (0, 0, 255), BG, (255, 200, 0)]
+PATTERNS = [checker_pattern(8), checker_pattern(3)]
+
+def same_partition(a, b):
+    """Разбиения пикселей на области совпадают (номера могут быть любыми)."""
+    pairs = np.unique(a.astype(np.int64)*(int(b.max()) + 1) + b)
+    return len(pairs) == len(np.unique(a)) == len(np.unique(b))
+
+def check_partition(index, cv):
+    index.update()
+    with cv:
+        assert (index.keys == cv.keys()).all()
+    assert same_partition(index.labels, label_regions(index.keys)[0])
+
+def fill(cv, op, index=None):
+    kind, seed, color, pat, tiled = op
+    with cv:
+        target = cv.get(*seed)
+    if kind == "color":
+        scanline_fill_color(cv, seed, target, color, index=index)
+    else:
+        anchor = pattern_anchor(seed, pat.shape[1::-1], "tile", "center")
+        scanline_fill_pattern(cv, seed, target, pat, anchor, tiled, index=index)
+
+def random_op(rnd, w, h):
+    p = lambda: (rnd.randrange(w), rnd.randrange(h))
+    kind = rnd.choice(["line", "line", "wu", "tri", "color", "color", "pattern"])
+    return kind, p(), p(), p(), rnd.choice(PALETTE), rnd.choice(PATTERNS), rnd.random() < 0.7
+
+def apply(cv, op, index=None):
+    kind, a, b, c, color, pat, tiled = op
+    with cv:
+        if kind == "line":
+            bresenham_line(cv, *a, *b, color)
+        elif kind == "wu":
+            wu_line(cv, *a, *b, color)
+        elif kind == "tri":
+            # чаще сплошной цвет (области сливаются), иногда градиент (много мелких областей)
+            cols = (color, color, color) if tiled else (color, PALETTE[0], PALETTE[3])
+            fill_triangle_barycentric(cv, a, b, c, *cols)
+        else:
+            fill(cv, (kind, a, color, pat, tiled), index)
+
+@pytest.mark.parametrize("session", range(60))
+def test_index_fill_matches_plain(session):
+    rnd = random.Random(session)
+    w, h = rnd.choice([(64, 48), (120, 80), (97, 61)])
+    plain, indexed = Canvas.blank(w, h), Canvas.blank(w, h)
+    index = RegionIndex()
+    index.watch(indexed)
+    for step in range(30):
+        op = random_op(rnd, w, h)
+        apply(plain, op)
+        apply(indexed, op, index)
+        assert (plain.arr == indexed.arr).all(), f"step {step}: {op[0]}"
+    check_partition(index, indexed)
+
+def test_freed_labels_compacted():
+    # окно 60x60 попеременно становится шахматкой 1x1 (3600 областей) и сплошным квадратом:
+    # номера шахматки освобождаются, их становится больше 4*живых + 4096 — переномерация
+    cv = Canvas.blank(200, 200)
+    with cv:
+        for x0, x1 in ((40, 101), (130, 191)):   # рамки-квадраты: окно правки меньше половины холста
+            for x, y, u, v in ((x0, x0, x1, x0), (x1, x0, x1, x1), (x1, x1, x0, x1), (x0, x1, x0, x0)):
+                bresenham_line(cv, x, y, u, v, PALETTE[0])
+    plain = Canvas(cv.arr.copy())
+    index = RegionIndex()
+    index.watch(cv)
+    builds = []
+    build = index.build
+    index.build = lambda: (builds.append(1), build())
+    lengths = []
+    pat = checker_pattern(2)   # клетки 1x1
+    for i in range(8):
+        x, y = (41, 41) if i % 2 == 0 else (131, 131)
+        color = PALETTE[i % 4 + 1]
+        for c, ix in ((cv, index), (plain, None)):
+            fill(c, ("pattern", (x, y), None, pat, True), ix)
+            if ix is not None:
+                ix.update()   # карта видит шахматку до того, как её закроют
+            # сплошной квадрат поверх шахматки — двумя треугольниками
+            apply(c, ("tri", (x, y), (x + 59, y), (x + 59, y + 59), color, None, True))
+            apply(c, ("tri", (x, y), (x + 59, y + 59), (x, y + 59), color, None, True))
+            fill(c, ("color", (5, 5), PALETTE[i % 3 + 1], None, True), ix)
+        assert (cv.arr == plain.arr).all()
+        lengths.append(len(index.size))
+    assert len(builds) == 1, "окно правки должно пересчитываться, а не размечаться заново"
+    assert max(lengths) > 4096 and any(b < a for a, b in zip(lengths, lengths[1:])), lengths
+    live = index.size > 0
+    assert len(index.size) <= 4*int(live.sum()) + 4096
+    check_partition(index, cv)
+
+@pytest.mark.parametrize("surface", [False, True])
+def test_stamp_covers_one_copy(surface):
+    # неквадратный рисунок 7x3: перепутанные ширина и высота сразу видны по краю штампа
+    pat = np.zeros((3, 7, 3), np.uint8)
+    pat[..., 0] = np.arange(7)*30 + 10
+    pattern = pat
+    if surface:
+        pattern = pygame.Surface((7, 3))
+        pygame.surfarray.blit_array(pattern, pat.transpose(1, 0, 2))
+    for index in (None, RegionIndex()):
+        cv = Canvas.blank(40, 30)
+        if index is not None:
+            index.watch(cv)
+        scanline_fill_pattern(cv, (12, 14), BG, pattern, (10, 13), tiled=False, index=index)
+        stamp = np.zeros((30, 40), bool)
+        stamp[13:16, 10:17] = True
+        assert (cv.arr[stamp] == pat.reshape(-1, 3)).all()
+        assert (cv.arr[~stamp] == BG).all()
@@ -0,0 +1,139 @@
+# Режим "rings" (RingCache.peel) против режима "fill" (inner_contour_from_inside):
+# после каждого клика холсты совпадают по пикселям, в том числе когда снятие колец
+# разрезает область на части и клик приходится на уже закрашенное кольцо.
+import random
+import numpy as np
+import pytest
+
+import raster
+from raster import (Canvas, RingCache, bresenham_polyline, fill_triangle_barycentric,
+                    inner_contour_from_inside, draw_points, border_mask, l1_distance,
+                    label_regions, split_level)
+
+W, H = 240, 180
+BLACK = (0, 0, 0)
+
+def scene_split():
+    """Внешний четырёхугольник, полый треугольник и сплошной чёрный треугольник внутри."""
+    cv = Canvas.blank(W, H)
+    bresenham_polyline(cv, [(5, 5), (230, 12), (220, 170), (10, 160)], BLACK, closed=True)
+    bresenham_polyline(cv, [(120, 20), (200, 40), (150, 90)], BLACK, closed=True)
+    fill_triangle_barycentric(cv, (40, 100), (110, 70), (90, 150), BLACK, BLACK, BLACK)
+    return cv
+
+def scene_random(seed):
+    rnd = random.Random(seed)
+    cv = Canvas.blank(W, H)
+    bresenham_polyline(cv, [(2, 2), (W-3, 2), (W-3, H-3), (2, H-3)], BLACK, closed=True)
+    for _ in range(rnd.randint(2, 6)):
+        pts = [(rnd.randrange(10, W-10), rnd.randrange(10, H-10)) for _ in range(3)]
+        if rnd.random() < 0.5:
+            fill_triangle_barycentric(cv, *pts, BLACK, BLACK, BLACK)
+        else:
+            bresenham_polyline(cv, pts, BLACK, closed=True)
+    return cv
+
+def ring_color(i):
+    return (10 + i % 200, 40 + (7*i) % 200, 90)
+
+def click_fill(cv, seed, color):
+    draw_points(cv, inner_contour_from_inside(cv, seed), color)
+    raster.BORDER_COLORS.add(color)
+
+def compare(make, clicks):
+    """
+    clicks — [(x, y), ...]; одинаковые сцены ведутся обоими режимами клик за кликом.
+    Вместо клика может стоять f(cv) — чужая запись в оба холста между кликами.
+    """
+    saved = set(raster.BORDER_COLORS)
+    try:
+        fill_cv, rings_cv, cache = make(), make(), RingCache()
+        fill_borders = set(raster.BORDER_COLORS)
+        rings_borders = set(raster.BORDER_COLORS)
+        for i, seed in enumerate(clicks):
+            if callable(seed):
+                seed(fill_cv), seed(rings_cv)
+                continue
+            color = ring_color(i)
+            raster.BORDER_COLORS.clear(); raster.BORDER_COLORS.update(fill_borders)
+            click_fill(fill_cv, seed, color)
+            fill_borders = set(raster.BORDER_COLORS)
+            raster.BORDER_COLORS.clear(); raster.BORDER_COLORS.update(rings_borders)
+            cache.peel(rings_cv, seed, color)
+            rings_borders = set(raster.BORDER_COLORS)
+            with fill_cv, rings_cv:
+                diff = np.argwhere((fill_cv.px != rings_cv.px).any(axis=2))
+            assert not len(diff), f"click {i} at {seed}: {len(diff)} px differ, first (y, x) {diff[0]}"
+    finally:
+        raster.BORDER_COLORS.clear(); raster.BORDER_COLORS.update(saved)
+
+def test_split_region():
+    compare(scene_split, [(50, 50)] * 40)
+
+@pytest.mark.parametrize("seed", range(8))
+def test_random_clicks(seed):
+    rnd = random.Random(100 + seed)
+    clicks = []
+    for _ in range(40):   # серии кликов в одну точку вперемешку с кликами по всей картинке
+        p = (rnd.randrange(W), rnd.randrange(H))
+        clicks += [p] * rnd.randint(1, 6)
+    compare(lambda: scene_random(seed), clicks)
+
+@pytest.mark.parametrize("step", [1, 3])
+@pytest.mark.parametrize("seed", range(4))
+def test_many_rings_per_click(seed, step):
+    """peel(count=n) и peel(count=None) — то же, что n кликов по одному кольцу."""
+    rnd = random.Random(200 + seed)
+    clicks = [((rnd.randrange(W), rnd.randrange(H)), rnd.choice([2, 5, None])) for _ in range(12)]
+    saved = set(raster.BORDER_COLORS)
+    try:
+        one_cv, many_cv = scene_random(seed), scene_random(seed)
+        one, many = RingCache(), RingCache()
+        for i, (p, count) in enumerate(clicks):
+            color = ring_color(i)
+            n = 0
+            while count is None or n < count:
+                if not one.peel(one_cv, p, color, 1, step):
+                    break
+                n += 1
+            many.peel(many_cv, p, color, count, step)
+            with one_cv, many_cv:
+                diff = np.argwhere((one_cv.px != many_cv.px).any(axis=2))
+            assert not len(diff), f"click {i} at {p}: {len(diff)} px differ, first (y, x) {diff[0]}"
+    finally:
+        raster.BORDER_COLORS.clear(); raster.BORDER_COLORS.update(saved)
+
+def scene_box():
+    cv = Canvas.blank(W, H)
+    bresenham_polyline(cv, [(0, 0), (W-1, 0), (W-1, H-1), (0, H-1)], BLACK, closed=True)
+    return cv
+
+def test_foreign_writes_between_clicks():
+    """Чужая запись в область (линия, пятно) между кликами — кэш это видит и пересчитывает."""
+    line = lambda cv: bresenham_polyline(cv, [(20, 150), (220, 120)], BLACK)
+    dot = lambda cv: fill_triangle_barycentric(cv, (60, 80), (70, 80), (65, 90), BLACK, BLACK, BLACK)
+    seed = (W // 2, H // 2)
+    compare(scene_box, [seed] * 5 + [line] + [seed] * 5 + [dot] + [seed] * 30)
+
+@pytest.mark.parametrize("seed", range(6))
+def test_split_level_is_safe(seed):
+    """Ниже split_level не снятое ∩ {dist ≥ K} — одна связная часть (полный перебор уровней)."""
+    cv = scene_random(seed)
+    with cv:
+        border = border_mask(cv)
+    labels, _, _ = label_regions(border.astype(np.int32))
+    x = W // 2 + int(np.argmin(border[H // 2, W // 2:]))   # первый не граничный пиксель правее центра
+    region = labels == labels[H // 2, x]
+    dist = l1_distance(border)
+    far = W + H + 1
+    split = split_level(region, dist, far)
+    for k in range(int(dist[region].min()), min(split, int(dist[region].max()) + 1)):
+        sub = np.where(region & (dist >= k), 1, 0).astype(np.int32)
+        labels, _, _ = label_regions(sub)
+        assert len(np.unique(labels[sub == 1])) <= 1, f"level {k} split below split_level {split}"
+
+def test_plain_box_never_splits():
+    cv = scene_box()
+    with cv:
+        border = border_mask(cv)
+    assert split_level(~border, l1_distance(border), W + H + 1) == W + H + 1
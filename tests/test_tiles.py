@@ -0,0 +1,51 @@
+# region_window: окно под область за окном просмотра растёт, пока область упирается в его край,
+# но не дальше предела — открытая область большого изображения в память целиком не читается.
+# tiled_pattern: кэш разложенных рисунков (каждый — размером с холст) ограничен.
+import numpy as np
+
+import raster
+from raster import BG, Canvas, tiled_pattern, checker_pattern
+from tiles import TiledImage, region_window
+
+BLACK = (0, 0, 0)
+
+def passable(cv):
+    return cv.match(BG, 0, "channel")
+
+def boxed(path, size, box):
+    """Изображение size x size с чёрной рамкой box = (x0, y0, x1, y1)."""
+    img = TiledImage(str(path), size, size)
+    x0, y0, x1, y1 = box
+    frame = Canvas.blank(x1 - x0 + 1, y1 - y0 + 1)
+    with frame:
+        frame.px[[0, -1], :] = BLACK
+        frame.px[:, [0, -1]] = BLACK
+    img.write(x0, y0, frame.arr)
+    return img
+
+def test_window_grows_to_enclosed_region(tmp_path):
+    img = boxed(tmp_path / "a.tiles", 4096, (100, 100, 1500, 1100))
+    rect, win = region_window(img, (300, 300), passable, (0, 0, 512, 512), limit=2048*2048)
+    x, y, w, h = rect
+    assert x <= 100 and y <= 100 and x + w > 1500 and y + h > 1100
+    assert w*h <= 2048*2048 and win.arr.shape[:2] == (h, w)
+
+def test_open_region_refused(tmp_path):
+    img = boxed(tmp_path / "b.tiles", 4096, (100, 100, 1500, 1100))
+    assert region_window(img, (2000, 2000), passable, (1800, 1800, 512, 512),
+                         limit=2048*2048) == (None, None)
+
+def test_window_grows_by_tiles_near_limit(tmp_path):
+    # вдвое (1024 -> 2048) уже не влезает, а на плитку по краю — да
+    img = boxed(tmp_path / "c.tiles", 4096, (0, 0, 1100, 1100))
+    rect, _ = region_window(img, (500, 500), passable, (0, 0, 1024, 1024), limit=1300*1300)
+    assert rect == (0, 0, 1280, 1280)
+
+def test_pattern_cache_bounded():
+    pat = checker_pattern(8)
+    raster._pattern_tiles.clear()
+    for w, h in [(300, 200), (640, 480), (1000, 600), (300, 200)]:
+        tex = tiled_pattern(pat, w, h, (3, 5))
+        y, x = np.mgrid[:h, :w]
+        assert (tex == pat[(y - 5) % 8, (x - 3) % 8]).all()
+        assert len(raster._pattern_tiles) <= raster.PATTERN_CACHE
@@ -0,0 +1,86 @@
+# Построчная растеризация треугольника против старого попиксельного цикла (оракул)
+# и правило «верхнего-левого ребра» на сетке треугольников: без щелей и без двойной записи.
+import random
+import numpy as np
+import pytest
+
+from raster import Canvas, area2, fill_triangle_barycentric, triangle_spans, span_pixels
+
+W, H = 120, 90
+COLORS = ((255, 0, 0), (0, 255, 0), (0, 128, 255))
+
+def reference_triangle(cv, A, B, C, colA, colB, colC):
+    """Прежняя реализация: барицентрические веса для каждого пикселя bbox."""
+    S = area2(A, B, C)
+    if S == 0:
+        return
+    xmin = max(0, min(A[0], B[0], C[0]))
+    xmax = min(cv.w-1, max(A[0], B[0], C[0]))
+    ymin = max(0, min(A[1], B[1], C[1]))
+    ymax = min(cv.h-1, max(A[1], B[1], C[1]))
+    for y in range(ymin, ymax+1):
+        for x in range(xmin, xmax+1):
+            P = (x, y)
+            a = area2(B, C, P)/S
+            b = area2(C, A, P)/S
+            c = area2(A, B, P)/S
+            if a >= 0 and b >= 0 and c >= 0:
+                r = int(colA[0]*a + colB[0]*b + colC[0]*c)
+                g = int(colA[1]*a + colB[1]*b + colC[1]*c)
+                bcol = int(colA[2]*a + colB[2]*b + colC[2]*c)
+                cv.arr[y, x] = (max(0, min(255, r)), max(0, min(255, g)), max(0, min(255, bcol)))
+
+def triangles(seed, n, lo, hi):
+    rnd = random.Random(seed)
+    p = lambda: (rnd.randint(lo[0], hi[0]), rnd.randint(lo[1], hi[1]))
+    return [(p(), p(), p()) for _ in range(n)]
+
+def degenerate():
+    return [((10, 10), (10, 10), (10, 10)),           # точка
+            ((5, 5), (50, 50), (95, 95)),             # на одной прямой
+            ((0, 20), (119, 20), (60, 20)),           # горизонтальный отрезок
+            ((30, -5), (30, 40), (30, 100)),          # вертикальный, за краями
+            ((10, 10), (11, 10), (10, 11)),           # площадь 1/2
+            ((-50, -50), (-10, -60), (-30, -10))]     # целиком вне холста
+
+@pytest.mark.parametrize("case, tris", [
+    ("inside", triangles(1, 150, (0, 0), (W - 1, H - 1))),
+    ("clipped", triangles(2, 150, (-60, -60), (W + 60, H + 60))),
+    ("degenerate", degenerate()),
+])
+def test_matches_per_pixel_reference(case, tris):
+    for A, B, C in tris:
+        for order in ((A, B, C), (A, C, B)):       # обе ориентации
+            got, ref = Canvas.blank(W, H), Canvas.blank(W, H)
+            fill_triangle_barycentric(got, *order, *COLORS)
+            reference_triangle(ref, *order, *COLORS)
+            assert np.array_equal(got.arr, ref.arr), (case, order)
+
+def grid_mesh(seed, step=13, jitter=4):
+    """Сетка с дрожанием внутренних узлов, с запасом за краями холста; два треугольника на ячейку."""
+    rnd = random.Random(seed)
+    xs = list(range(-2*step, W + 2*step, step))
+    ys = list(range(-2*step, H + 2*step, step))
+    pts = {(i, j): (x + rnd.randint(-jitter, jitter), y + rnd.randint(-jitter, jitter))
+           for i, x in enumerate(xs) for j, y in enumerate(ys)}
+    tris = []
+    for i in range(len(xs) - 1):
+        for j in range(len(ys) - 1):
+            a, b, c, d = pts[i, j], pts[i + 1, j], pts[i + 1, j + 1], pts[i, j + 1]
+            splits = [[(a, b, c), (a, c, d)], [(a, b, d), (b, c, d)]]
+            # только диагональ, при которой оба треугольника одной ориентации (сетка без складок)
+            splits = [sp for sp in splits if all(area2(*t) > 0 for t in sp)]
+            tris += rnd.choice(splits)
+    return tris
+
+@pytest.mark.parametrize("seed", range(5))
+def test_top_left_shared_edges(seed):
+    count = np.zeros((H, W), dtype=np.int32)
+    for A, B, C in grid_mesh(seed):
+        spans = triangle_spans(A, B, C, (0, 0, W, H), top_left=True)
+        if spans is None:
+            continue
+        xs, ys = span_pixels(*spans)
+        np.add.at(count, (ys, xs), 1)
+    assert count.min() == 1, "щель между треугольниками"
+    assert count.max() == 1, "пиксель записан двумя треугольниками"
@@ -0,0 +1,56 @@
+# Пакетные сглаженные отрезки (wu_segments) против поотрезочного wu_line и правила перекрытия:
+# "max" — стык ломаной не темнее одиночного отрезка, "sum" — покрытие не больше 1,
+# одиночный отрезок совпадает с wu_line с точностью до 1 на канал.
+import random
+import numpy as np
+import pytest
+
+from raster import Canvas, wu_line, wu_segments, wu_polyline
+
+W, H = 64, 48
+BLACK, ORANGE = (0, 0, 0), (200, 100, 50)
+
+def random_segments(seed, n=300):
+    rnd = random.Random(seed)
+    def coord(size):   # чаще на холсте, иногда за краем
+        return rnd.randint(-size // 2, size + size // 2) if rnd.random() < 0.3 else rnd.randrange(size)
+    segs = [(coord(W), coord(H), coord(W), coord(H)) for _ in range(n)]
+    segs += [(5, 5, 5, 5), (3, 10, 40, 10), (20, 2, 20, 40), (0, 0, 47, 47), (60, 1, 2, 45)]
+    return segs
+
+def drawn(segs, color=BLACK, overlap="max"):
+    cv = Canvas.blank(W, H)
+    wu_segments(cv, np.array(segs, dtype=np.float64).reshape(-1, 4), color, overlap)
+    return cv.arr.astype(int)
+
+@pytest.mark.parametrize("seed", range(3))
+def test_single_segment_matches_wu_line(seed):
+    for seg in random_segments(seed):
+        ref = Canvas.blank(W, H)
+        wu_line(ref, *seg, ORANGE)
+        got = drawn([seg], ORANGE)
+        assert np.abs(got - ref.arr.astype(int)).max() <= 1, seg
+
+@pytest.mark.parametrize("pts", [
+    [(5, 40), (30, 8), (58, 40)],          # острый угол
+    [(4, 4), (40, 9), (44, 44), (6, 30)],  # тупые углы
+    [(4, 20), (60, 25), (4, 31)],          # почти разворот
+])
+def test_max_joint_not_darker(pts):
+    # в режиме max каждый пиксель ломаной — как у самого тёмного из её отрезков по отдельности
+    singles = np.min([drawn([(*a, *b)]) for a, b in zip(pts, pts[1:])], axis=0)
+    cv = Canvas.blank(W, H)
+    wu_polyline(cv, pts, BLACK)
+    assert (cv.arr == singles).all()
+    summed = drawn([(*a, *b) for a, b in zip(pts, pts[1:])], overlap="sum")
+    assert (summed <= singles).all() and (summed < singles).any()   # а сумма на стыке темнее
+
+def test_sum_coverage_clamped():
+    # тот же отрезок трижды: сумма покрытий > 1, но цвет не «перелетает» за цвет линии
+    seg = (3, 7, 58, 31)
+    once = drawn([seg], ORANGE, "sum")
+    thrice = drawn([seg]*3, ORANGE, "sum")
+    assert ((thrice >= ORANGE) & (thrice <= 255)).all()             # между фоном и цветом линии
+    assert (thrice <= once).all()
+    hit = (once != 255).any(axis=2)
+    assert (thrice[hit] == ORANGE).all(axis=1).mean() > 0.5   # большинство пикселей — чистый цвет
@@ -0,0 +1,128 @@
+# Большие изображения плитками (без окна):
+#   img = TiledImage("canvas.tiles", 16384, 16384)     — файл плиток 256x256 в memmap
+#   arr = img.read((x, y, w, h)); ...; img.write(x, y, arr, sub)  — окно в массив и обратно
+#   rect = region_window(img, seed, passable, rect0)  — окно, в которое целиком влезает область заливки
+#                                                       (не больше REGION_MAX пикселей, иначе (None, None))
+#   img.export("big.png")                             — запись полосами по строке плиток
+# Инструменты работают как обычно — над Canvas из окна (read), изменённое пишется обратно (write).
+# Плитка, в которую ни разу не писали, в файле не существует (файл разреженный) и читается как фон,
+# поэтому память и диск заняты только рабочим набором, а не всем изображением.
+import os
+import numpy as np
+
+from raster import BG, Canvas, region_mask
+from saver import write_png, PNG_LEVEL
+
+TILE = 256
+REGION_MAX = 4096 * 4096   # пикселей в окне region_window: окно в памяти целиком (холст + маски)
+
+class TiledImage:
+    def __init__(self, path, w, h, bg=BG, tile=TILE):
+        self.path, self.w, self.h, self.bg, self.tile = path, w, h, tuple(bg[:3]), tile
+        self.ny, self.nx = -(-h // tile), -(-w // tile)
+        shape = (self.ny, self.nx, tile, tile, 3)
+        self.map_path = path + ".map.npy"
+        if os.path.exists(path) and os.path.exists(self.map_path) and \
+                os.path.getsize(path) == int(np.prod(shape)):
+            # продолжение прошлой сессии: плитки и карта заполненности
+            self.tiles = np.memmap(path, dtype=np.uint8, mode="r+", shape=shape)
+            self.present = np.load(self.map_path)
+        else:
+            self.tiles = np.memmap(path, dtype=np.uint8, mode="w+", shape=shape)
+            self.present = np.zeros((self.ny, self.nx), dtype=bool)
+
+    def _spans(self, x, y, w, h):
+        # плитки, задетые прямоугольником: (ty, tx, срез в плитке, срез в прямоугольнике)
+        t = self.tile
+        for ty in range(y // t, (y + h - 1) // t + 1):
+            y0, y1 = max(y, ty*t), min(y + h, (ty + 1)*t)
+            for tx in range(x // t, (x + w - 1) // t + 1):
+                x0, x1 = max(x, tx*t), min(x + w, (tx + 1)*t)
+                yield (ty, tx, (slice(y0 - ty*t, y1 - ty*t), slice(x0 - tx*t, x1 - tx*t)),
+                       (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x)))
+
+    def clip(self, rect):
+        x, y, w, h = rect
+        x0, y0 = max(int(x), 0), max(int(y), 0)
+        return x0, y0, max(0, min(int(x + w), self.w) - x0), max(0, min(int(y + h), self.h) - y0)
+
+    def read(self, rect):
+        """Копия окна rect = (x, y, w, h) (в пределах изображения) -> (h, w, 3) uint8."""
+        x, y, w, h = rect
+        out = np.empty((h, w, 3), dtype=np.uint8)
+        if w and h:
+            for ty, tx, src, dst in self._spans(x, y, w, h):
+                out[dst] = self.tiles[ty, tx][src] if self.present[ty, tx] else self.bg
+        return out
+
+    def write(self, x, y, arr, sub=None):
+        """Записать arr, лежащий в изображении с углом (x, y); sub = (sx, sy, sw, sh) — только эту часть arr."""
+        sx, sy, sw, sh = sub or (0, 0, arr.shape[1], arr.shape[0])
+        if not (sw and sh):
+            return
+        for ty, tx, dst, src in self._spans(x + sx, y + sy, sw, sh):
+            if not self.present[ty, tx]:
+                self.tiles[ty, tx] = self.bg
+                self.present[ty, tx] = True
+            self.tiles[ty, tx][dst] = arr[sy:sy + sh, sx:sx + sw][src]
+
+    def flush(self):
+        self.tiles.flush()
+        np.save(self.map_path, self.present)
+
+    def bands(self):
+        """Изображение сверху вниз полосами по строке плиток."""
+        for y in range(0, self.h, self.tile):
+            yield self.read((0, y, self.w, min(self.tile, self.h - y)))
+
+    def export(self, path, png_level=PNG_LEVEL):
+        """Сохранить целиком, не собирая в памяти: .png — потоковый кодировщик, .npy/.rgb — полосами."""
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".png":
+            write_png(path, self.bands(), self.w, self.h, png_level)
+        elif ext == ".npy":
+            out = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(self.h, self.w, 3))
+            for i, band in enumerate(self.bands()):
+                out[i*self.tile:i*self.tile + len(band)] = band
+            out.flush()
+            del out
+        elif ext == ".rgb":
+            with open(path, "wb") as f:
+                for band in self.bands():
+                    f.write(band.tobytes())
+        else:
+            raise ValueError(f"unsupported export format: {ext!r}")
+
+def region_window(img, seed, passable, rect, cv=None, limit=REGION_MAX):
+    """
+    Окно изображения, целиком содержащее связную область от seed (координаты изображения).
+    passable(canvas) -> маска (h, w) пикселей, по которым идёт область (как match у заливки).
+    Начинаем с rect (cv — уже загруженный Canvas этого окна, чтобы не читать повторно);
+    пока область упирается в сторону окна, не совпадающую с краем изображения, окно
+    на этой стороне расширяется вдвое, а у предела limit (пикселей) — на одну плитку.
+    -> (rect, Canvas окна) или (None, None), если области нужно окно больше limit
+    (открытая область большого изображения целиком в память не читается).
+    """
+    while True:
+        x, y, w, h = rect
+        if cv is None:
+            cv = Canvas(img.read(rect))
+        with cv:
+            mask = region_mask(passable(cv), (seed[0] - x, seed[1] - y))
+        grow_l = x > 0 and mask[:, 0].any()
+        grow_r = x + w < img.w and mask[:, -1].any()
+        grow_t = y > 0 and mask[0].any()
+        grow_b = y + h < img.h and mask[-1].any()
+        if not (grow_l or grow_r or grow_t or grow_b):
+            return rect, cv
+        for dw, dh in ((w, h), (img.tile, img.tile)):
+            grown = img.clip((x - dw*grow_l, y - dh*grow_t,
+                              w + dw*(grow_l + grow_r), h + dh*(grow_t + grow_b)))
+            if grown[2]*grown[3] <= limit:
+                break
+        else:
+            return None, None
+        rect, cv = grown, None